@@ -3,14 +3,13 @@ from db import db
 from bson import ObjectId
 from datetime import datetime
 import math
-from collections import defaultdict
+from truck_ledger import ledger_totals, record_confirmed_payment, record_confirmed_payments
+from bulk_confirm import parse_items, confirm_many, MAX_BATCH
 
 admin_truck_payments_bp = Blueprint("admin_truck_payments", __name__)
 
 truck_payments_col = db["truck_payments"]
 clients_col = db["clients"]
-truck_orders_col = db["truck_orders"]
-truck_expenses_col = db["truck_expenses"]
 
 @admin_truck_payments_bp.route("/admin/truck_payments")
 def admin_view_truck_payments():
@@ -18,52 +17,37 @@ def admin_view_truck_payments():
     per_page = 10
     skip = (page - 1) * per_page
 
-    # Load orders
-    orders = list(truck_orders_col.find())
-    total_debt = 0
-    debt_map = defaultdict(float)
-
-    for order in orders:
-        amount = float(order.get("total_debt", 0))
-        client_key = str(order.get("client_id"))
-        total_debt += amount
-        debt_map[client_key] += amount
-
-    # Total order count
-    total_orders = len(orders)
-
-    # Load expenses
-    expenses = list(truck_expenses_col.find())
-    total_expense = sum(float(e.get("amount", 0)) for e in expenses)
-
-    # Load confirmed payments
-    confirmed_payments_cursor = truck_payments_col.find({"status": "confirmed"})
-    payments_map = defaultdict(float)
-    total_paid = 0
+    # Paginated payments for display
+    total_count = truck_payments_col.count_documents({})
+    total_pages = math.ceil(total_count / per_page)
+    page_docs = list(truck_payments_col.find().sort("date", -1).skip(skip).limit(per_page))
 
-    for p in confirmed_payments_cursor:
-        amount = float(p.get("amount", 0))
-        client_key = str(p.get("client_id"))
-        payments_map[client_key] += amount
-        total_paid += amount
+    # Running totals (truck_ledger) for the fleet and the clients on this page
+    fleet, per_client = ledger_totals({str(p.get("client_id")) for p in page_docs})
+    total_debt = fleet["total_debt"]
+    total_paid = fleet["total_paid"]
+    total_expense = fleet["total_expense"]
+    total_orders = int(fleet["order_count"])
 
     # Collection Efficiency (%)
     collection_efficiency = (total_paid / total_debt * 100) if total_debt > 0 else 0
     total_settled = total_debt - total_expense
 
-    # Paginated payments for display
-    total_count = truck_payments_col.count_documents({})
-    total_pages = math.ceil(total_count / per_page)
-    payments_cursor = truck_payments_col.find().sort("date", -1).skip(skip).limit(per_page)
+    # One query for the clients on this page
+    client_oids = [p["client_id"] if isinstance(p.get("client_id"), ObjectId) else ObjectId(p["client_id"])
+                   for p in page_docs if ObjectId.is_valid(str(p.get("client_id")))]
+    clients_map = {
+        str(c["_id"]): c for c in clients_col.find({"_id": {"$in": client_oids}}, {"name": 1, "phone": 1})
+    }
 
     payments = []
-    for p in payments_cursor:
-        client_id_raw = p.get("client_id")
-        client_id_str = str(client_id_raw)
-        client_info = clients_col.find_one({"_id": ObjectId(client_id_raw)}) if ObjectId.is_valid(client_id_str) else None
+    for p in page_docs:
+        client_id_str = str(p.get("client_id"))
+        client_info = clients_map.get(client_id_str)
 
-        total_debt_for_client = debt_map.get(client_id_str, 0)
-        total_paid_for_client = payments_map.get(client_id_str, 0)
+        totals = per_client.get(client_id_str, {})
+        total_debt_for_client = totals.get("total_debt", 0)
+        total_paid_for_client = totals.get("total_paid", 0)
         amount_left = total_debt_for_client - total_paid_for_client
 
         last4 = p.get("account_last4", "")
@@ -98,8 +82,28 @@ def admin_view_truck_payments():
 
 @admin_truck_payments_bp.route("/admin/truck_payments/confirm/<payment_id>", methods=["POST"])
 def confirm_truck_payment(payment_id):
-    truck_payments_col.update_one(
-        {"_id": ObjectId(payment_id)},
-        {"$set": {"status": "confirmed"}}
+    # Only a pending -> confirmed transition counts towards the running totals
+    payment = truck_payments_col.find_one_and_update(
+        {"_id": ObjectId(payment_id), "status": {"$ne": "confirmed"}},
+        {"$set": {"status": "confirmed"}},
+        projection={"client_id": 1, "amount": 1}
     )
+    if payment:
+        record_confirmed_payment(payment)
     return jsonify({"success": True})
+
+@admin_truck_payments_bp.route("/admin/truck_payments/confirm", methods=["POST"])
+def confirm_truck_payments():
+    """Confirm many truck payments in one bulk_write; ledger totals get one $inc per client."""
+    try:
+        items = parse_items(request)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if not items:
+        return jsonify({"success": False, "error": "No payment ids given."}), 400
+    if len(items) > MAX_BATCH:
+        return jsonify({"success": False, "error": f"At most {MAX_BATCH} payments per request."}), 400
+
+    results, confirmed = confirm_many(truck_payments_col, items, {"client_id": 1, "amount": 1})
+    record_confirmed_payments(confirmed)
+    return jsonify({"success": True, "confirmed": len(confirmed), "results": results})
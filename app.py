@@ -12,6 +12,7 @@ from orders import orders_bp
 from payments import payments_bp
 from debtors import debtors_bp
 from bank_profile import bank_profile_bp  # ✅ NEW
+from bank_reconcile import bank_reconcile_bp
 from bdc import bdc_bp
 from home import home_bp
 from shareholders import shareholders_bp
@@ -64,6 +65,7 @@ app.register_blueprint(truck_bp)
 app.register_blueprint(truck_debtors_bp)  # ✅ Registered
 app.register_blueprint(admin_truck_payments_bp)  # ✅ Registered
 app.register_blueprint(bank_profile_bp)  # ✅ Register bank profile route
+app.register_blueprint(bank_reconcile_bp)
 
 # Admin
 app.register_blueprint(admin_dashboard_bp, url_prefix='/admin')
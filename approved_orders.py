@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, session, redirect, url_for, flash
 from db import db
 from bson import ObjectId
+from pricing import compute_pricing, to_py
 
 approved_orders_bp = Blueprint('approved_orders', __name__, template_folder='templates')
 
@@ -22,7 +23,8 @@ def view_approved_orders():
 
     orders = list(orders_collection.find({'status': 'approved'}).sort('date', -1))
 
-    for order in orders:
+    priced = compute_pricing(orders)
+    for i, order in enumerate(orders):
         try:
             client = clients_collection.find_one({'_id': ObjectId(order.get('client_id'))})
         except:
@@ -35,12 +37,8 @@ def view_approved_orders():
             order['client_name'] = 'Unknown'
             order['client_mongo_id'] = '#'
 
-        try:
-            margin = float(order.get('margin', 0))
-            quantity = float(order.get('quantity', 0))
-            order['returns'] = round(margin * quantity, 2)
-        except (TypeError, ValueError):
-            order['returns'] = 0.0
+        # margin × quantity (see pricing.compute_pricing)
+        order['returns'] = to_py(priced['margin_returns'][i], nan=0.0)
 
         try:
             order['tax'] = float(order.get('tax', 0))
@@ -0,0 +1,237 @@
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+from bson import ObjectId
+from dateutil.relativedelta import relativedelta
+from datetime import datetime
+from collections import defaultdict
+import sys
+
+from db import db
+
+# 📦 Collections
+orders_col    = db["orders"]
+payments_col  = db["payments"]
+snapshots_col = db["client_balance_snapshots"]
+
+# One row per client per closed month; period_end is the first instant of the next month
+snapshots_col.create_index([("client_id", ASCENDING), ("period_end", DESCENDING)], unique=True)
+snapshots_col.create_index([("period_end", ASCENDING)])
+
+# ---------- Helpers ----------
+def _to_f(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _num(field):
+    """Aggregation twin of _to_f: non-numeric values count as 0 instead of failing the pipeline."""
+    return {"$convert": {"input": field, "to": "double", "onError": 0.0, "onNull": 0.0}}
+
+def _month_start(year, month):
+    return datetime(year, month, 1)
+
+def _window_activity(since, until, client_id=None):
+    """
+    Debt and confirmed payments per client with since <= date < until (since=None: no lower bound).
+    `client_id` may be a single id or a list of ids.
+    Mirrors the statement rules: approved orders only, and a payment counts when it is
+    linked (order_id / order_ref, ObjectId or short code) to an approved order of the
+    same client dated before `until`.
+    Returns {client_id: {"debt": float, "paid": float}}.
+    """
+    date_q = {"$lt": until}
+    if since:
+        date_q["$gte"] = since
+
+    out = defaultdict(lambda: {"debt": 0.0, "paid": 0.0})
+    client_q = {"$in": client_id} if isinstance(client_id, list) else client_id
+
+    order_match = {"status": "approved", "date": date_q}
+    if client_id is not None:
+        order_match["client_id"] = client_q
+    for r in orders_col.aggregate([
+        {"$match": order_match},
+        {"$group": {"_id": "$client_id", "debt": {"$sum": _num("$total_debt")}}}
+    ]):
+        out[r["_id"]]["debt"] += _to_f(r.get("debt"))
+
+    pay_match = {"status": "confirmed", "date": date_q}
+    if client_id is not None:
+        pay_match["client_id"] = client_q
+    pays = list(payments_col.find(pay_match, {"client_id": 1, "order_id": 1, "order_ref": 1, "amount": 1}))
+    if not pays:
+        return dict(out)
+
+    # Resolve the orders those payments point at in one query
+    oids, refs = set(), set()
+    for p in pays:
+        for key in ("order_id", "order_ref"):
+            v = p.get(key)
+            if isinstance(v, ObjectId):
+                oids.add(v)
+            elif v:
+                refs.add(v)
+
+    key_owner = {}
+    for o in orders_col.find({
+        "status": "approved",
+        "date": {"$lt": until},
+        "$or": [{"_id": {"$in": list(oids)}}, {"order_id": {"$in": list(refs)}}]
+    }, {"client_id": 1, "order_id": 1}):
+        key_owner[o["_id"]] = o.get("client_id")
+        if o.get("order_id"):
+            key_owner[o["order_id"]] = o.get("client_id")
+
+    for p in pays:
+        for key in ("order_id", "order_ref"):
+            owner = key_owner.get(p.get(key))
+            if owner is not None and owner == p.get("client_id"):
+                out[owner]["paid"] += _to_f(p.get("amount"))
+                break
+
+    return dict(out)
+
+# ---------- Reads ----------
+def latest_snapshot(client_id, before):
+    """Most recent snapshot whose period_end is on or before `before`."""
+    return snapshots_col.find_one(
+        {"client_id": client_id, "period_end": {"$lte": before}},
+        sort=[("period_end", -1)]
+    )
+
+def full_opening_balance(client_id, start_dt):
+    """Opening balance recomputed over the client's entire history (the slow path)."""
+    act = _window_activity(None, start_dt, client_id).get(client_id, {"debt": 0.0, "paid": 0.0})
+    return round(act["debt"] - act["paid"], 2)
+
+def opening_balance(client_id, start_dt):
+    """Opening balance = latest snapshot before start_dt + activity between it and start_dt."""
+    snap = latest_snapshot(client_id, start_dt)
+    if not snap:
+        return full_opening_balance(client_id, start_dt)
+
+    act = _window_activity(snap["period_end"], start_dt, client_id).get(client_id, {"debt": 0.0, "paid": 0.0})
+    return round(_to_f(snap.get("closing_balance")) + act["debt"] - act["paid"], 2)
+
+# ---------- Writes ----------
+def invalidate_snapshots(client_id, since):
+    """Drop a client's snapshots closed after `since` (late approvals / confirmations change them)."""
+    if client_id is None or not isinstance(since, datetime):
+        return 0
+    return snapshots_col.delete_many({"client_id": client_id, "period_end": {"$gt": since}}).deleted_count
+
+def close_month(year, month):
+    """
+    Write the closing balance of every client for year/month.
+    Chains from the previous month's snapshots when they exist, so only the
+    month's own activity is scanned; otherwise falls back to a full recompute.
+    Returns the number of snapshots written.
+    """
+    period_start = _month_start(year, month)
+    period_end = period_start + relativedelta(months=1)
+
+    prev = {s["client_id"]: s for s in snapshots_col.find({"period_end": period_start})}
+    if prev:
+        activity = _window_activity(period_start, period_end)
+        # Clients without a previous snapshot (new, or invalidated) need their full history
+        missing = [cid for cid in activity if cid not in prev]
+        if missing:
+            activity.update(_window_activity(None, period_end, missing))
+    else:
+        activity = _window_activity(None, period_end)
+
+    now = datetime.utcnow()
+    ops = []
+    for cid in set(prev) | set(activity):
+        act = activity.get(cid, {"debt": 0.0, "paid": 0.0})
+        p = prev.get(cid, {})
+        total_debt = _to_f(p.get("total_debt")) + act["debt"]
+        total_paid = _to_f(p.get("total_paid")) + act["paid"]
+        ops.append(ReplaceOne(
+            {"client_id": cid, "period_end": period_end},
+            {
+                "client_id": cid,
+                "year": year,
+                "month": month,
+                "period_end": period_end,
+                "total_debt": round(total_debt, 2),
+                "total_paid": round(total_paid, 2),
+                "closing_balance": round(total_debt - total_paid, 2),
+                "computed_at": now
+            },
+            upsert=True
+        ))
+
+    if ops:
+        snapshots_col.bulk_write(ops, ordered=False)
+    return len(ops)
+
+def backfill_snapshots(through_year=None, through_month=None):
+    """Close every month from the first order up to (and including) through_year/through_month."""
+    now = datetime.utcnow()
+    if not through_year or not through_month:
+        last = _month_start(now.year, now.month) - relativedelta(months=1)
+        through_year, through_month = last.year, last.month
+
+    first = next(orders_col.find({"status": "approved"}, {"date": 1}).sort("date", 1).limit(1), None)
+    if not first or not isinstance(first.get("date"), datetime):
+        return []
+
+    cursor = _month_start(first["date"].year, first["date"].month)
+    stop = _month_start(through_year, through_month)
+    written = []
+    while cursor <= stop:
+        written.append((cursor.year, cursor.month, close_month(cursor.year, cursor.month)))
+        cursor += relativedelta(months=1)
+    return written
+
+# ---------- Consistency check ----------
+def verify_snapshots(year=None, month=None, tolerance=0.01):
+    """
+    Recompute closing balances from full history and compare with the stored snapshots.
+    Returns a list of {client_id, period_end, stored, expected, drift} for mismatches.
+    """
+    q = {}
+    if year and month:
+        q["period_end"] = _month_start(year, month) + relativedelta(months=1)
+
+    drifts = []
+    for period_end in sorted(snapshots_col.distinct("period_end", q)):
+        expected = _window_activity(None, period_end)
+        for s in snapshots_col.find({"period_end": period_end}):
+            act = expected.get(s["client_id"], {"debt": 0.0, "paid": 0.0})
+            exp = round(act["debt"] - act["paid"], 2)
+            stored = _to_f(s.get("closing_balance"))
+            if abs(stored - exp) > tolerance:
+                drifts.append({
+                    "client_id": s["client_id"],
+                    "period_end": period_end,
+                    "stored": stored,
+                    "expected": exp,
+                    "drift": round(stored - exp, 2)
+                })
+    return drifts
+
+
+if __name__ == "__main__":
+    # Usage: python balance_snapshots.py close|backfill|verify [YYYY-MM]
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "close"
+    y = m = None
+    if len(sys.argv) > 2:
+        y, m = (int(x) for x in sys.argv[2].split("-"))
+
+    if cmd == "close":
+        if not y:
+            last = _month_start(datetime.utcnow().year, datetime.utcnow().month) - relativedelta(months=1)
+            y, m = last.year, last.month
+        print(f"✅ Closed {y}-{m:02d}: {close_month(y, m)} client snapshots.")
+    elif cmd == "backfill":
+        for yy, mm, n in backfill_snapshots(y, m):
+            print(f"✅ Closed {yy}-{mm:02d}: {n} client snapshots.")
+    elif cmd == "verify":
+        drifts = verify_snapshots(y, m)
+        for d in drifts:
+            print(f"❌ {d['client_id']} @ {d['period_end']:%Y-%m-%d}: stored {d['stored']:.2f}, expected {d['expected']:.2f}")
+        print("✅ Snapshots consistent." if not drifts else f"⚠️ {len(drifts)} snapshot(s) drifted.")
+    else:
+        print("Usage: python balance_snapshots.py close|backfill|verify [YYYY-MM]")
@@ -1,13 +1,16 @@
 from flask import Blueprint, render_template, request
 from db import db
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+from bank_receipts import daily_receipts
 
 bank_profile_bp = Blueprint("bank_profile", __name__, template_folder="templates")
 
 accounts_col = db["bank_accounts"]
 payments_col = db["payments"]
 
+BANK_PAYMENTS_PER_PAGE = 50
+
 @bank_profile_bp.route("/bank-profile/<bank_id>")
 def bank_profile(bank_id):
     bank = accounts_col.find_one({"_id": ObjectId(bank_id)})
@@ -15,28 +18,65 @@ def bank_profile(bank_id):
         return "Bank not found", 404
 
     bank_name = bank.get("bank_name")
-    last4 = bank.get("account_number")[-4:]
+    last4 = (bank.get("account_number") or "")[-4:]
 
-    # Time filtering
+    # Time filtering (end date inclusive)
     start_str = request.args.get("start_date")
     end_str = request.args.get("end_date")
+    start_date = end_date = None
+    try:
+        if start_str:
+            start_date = datetime.strptime(start_str, "%Y-%m-%d")
+        if end_str:
+            end_date = datetime.strptime(end_str, "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        start_date = end_date = None  # Ignore if invalid format
+
+    # Totals and chart from the daily receipts rollup
+    days = daily_receipts(bank_name, last4, start_date, end_date)
+    total_received = sum(d["total"] for d in days)
+    total_payments = sum(d["count"] for d in days)
+    chart = {
+        "labels": [d["day"].strftime("%Y-%m-%d") for d in days],
+        "totals": [round(d["total"], 2) for d in days]
+    }
 
+    # One page of payments via the (bank_name, account_last4, status, date) index
     query = {
         "bank_name": bank_name,
         "account_last4": last4,
         "status": "confirmed"
     }
+    if start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = start_date
+        if end_date:
+            query["date"]["$lt"] = end_date
 
-    if start_str and end_str:
-        try:
-            start_date = datetime.strptime(start_str, "%Y-%m-%d")
-            end_date = datetime.strptime(end_str, "%Y-%m-%d")
-            query["date"] = {"$gte": start_date, "$lte": end_date}
-        except ValueError:
-            pass  # Ignore if invalid format
-
-    payments = list(payments_col.find(query).sort("date", -1))
-
-    total_received = sum(float(p.get("amount", 0)) for p in payments)
+    try:
+        page = max(int(request.args.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    total_pages = max((total_payments + BANK_PAYMENTS_PER_PAGE - 1) // BANK_PAYMENTS_PER_PAGE, 1)
+    page = min(page, total_pages)
+    payments = list(
+        payments_col.find(query, {"date": 1, "amount": 1, "account_last4": 1, "proof_url": 1})
+        .sort("date", -1)
+        .skip((page - 1) * BANK_PAYMENTS_PER_PAGE)
+        .limit(BANK_PAYMENTS_PER_PAGE)
+    )
 
-    return render_template("partials/bank_profile.html", bank=bank, payments=payments, total_received=total_received, start_date=start_str, end_date=end_str)
+    return render_template(
+        "partials/bank_profile.html",
+        bank=bank,
+        payments=payments,
+        total_received=total_received,
+        total_payments=total_payments,
+        chart=chart,
+        start_date=start_str,
+        end_date=end_str,
+        current_page=page,
+        total_pages=total_pages,
+        per_page=BANK_PAYMENTS_PER_PAGE
+    )
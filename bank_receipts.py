@@ -0,0 +1,147 @@
+from pymongo import UpdateOne, ReplaceOne, ASCENDING, DESCENDING
+from collections import defaultdict
+from datetime import datetime
+
+from db import db
+
+# 📦 Collections
+payments_col = db["payments"]
+receipts_col = db["bank_daily_receipts"]  # one document per (bank_name, account_last4, day)
+
+receipts_col.create_index([("bank_name", ASCENDING), ("account_last4", ASCENDING), ("day", ASCENDING)], unique=True)
+# Confirmed payments for one account, newest first (bank_profile listing)
+payments_col.create_index([
+    ("bank_name", ASCENDING), ("account_last4", ASCENDING), ("status", ASCENDING), ("date", DESCENDING)
+])
+
+SYNC_ID = "synced"  # marker document written by rebuild_receipts
+RECEIPT_PROJECTION = {"bank_name": 1, "account_last4": 1, "amount": 1, "date": 1}  # fields record_receipts needs
+
+# ---------- Helpers ----------
+def _to_f(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _day(d):
+    return datetime(d.year, d.month, d.day)
+
+def _num(field):
+    return {"$convert": {"input": field, "to": "double", "onError": 0.0, "onNull": 0.0}}
+
+# ---------- Incremental updates ----------
+def record_receipts(payments):
+    """
+    Add newly confirmed payments (read with bank_name, account_last4, amount, date)
+    to the rollup: one upserted $inc per account and day.
+    """
+    days = defaultdict(lambda: [0.0, 0])
+    for p in payments:
+        if not isinstance(p.get("date"), datetime):
+            continue
+        key = (p.get("bank_name") or "", str(p.get("account_last4") or ""), _day(p["date"]))
+        days[key][0] += _to_f(p.get("amount"))
+        days[key][1] += 1
+    if not days:
+        return 0
+    receipts_col.bulk_write([
+        UpdateOne(
+            {"bank_name": bank, "account_last4": last4, "day": day},
+            {"$inc": {"total": total, "count": count}},
+            upsert=True
+        )
+        for (bank, last4, day), (total, count) in days.items()
+    ], ordered=False)
+    return len(days)
+
+# ---------- Reads ----------
+def _synced():
+    return receipts_col.find_one({"_id": SYNC_ID}) is not None
+
+def _source_days(bank_name, last4, start=None, end=None):
+    """Daily totals straight from confirmed payments (used until the rollup is rebuilt once)."""
+    match = {"bank_name": bank_name, "account_last4": last4, "status": "confirmed"}
+    if start or end:
+        match["date"] = {}
+        if start:
+            match["date"]["$gte"] = start
+        if end:
+            match["date"]["$lt"] = end
+    return [
+        {"day": r["_id"], "total": _to_f(r["total"]), "count": r["count"]}
+        for r in payments_col.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {"$dateFromParts": {"year": {"$year": "$date"}, "month": {"$month": "$date"}, "day": {"$dayOfMonth": "$date"}}},
+                "total": {"$sum": _num("$amount")},
+                "count": {"$sum": 1}
+            }},
+            {"$sort": {"_id": 1}}
+        ])
+    ]
+
+def daily_receipts(bank_name, last4, start=None, end=None):
+    """
+    [{day, total, count}] oldest first for one account; `end` is exclusive.
+    Reads the rollup (one index range scan) once rebuild_receipts has run.
+    """
+    if not _synced():
+        return _source_days(bank_name, last4, start, end)
+    q = {"bank_name": bank_name, "account_last4": last4}
+    if start or end:
+        q["day"] = {}
+        if start:
+            q["day"]["$gte"] = _day(start)
+        if end:
+            q["day"]["$lt"] = end
+    return [
+        {"day": d["day"], "total": _to_f(d.get("total")), "count": d.get("count", 0)}
+        for d in receipts_col.find(q, {"_id": 0, "day": 1, "total": 1, "count": 1}).sort("day", 1)
+    ]
+
+# ---------- Rebuild ----------
+def rebuild_receipts():
+    """
+    Recompute the rollup from every confirmed payment and mark it synced (run while
+    no confirmations are in flight). Returns the number of account-days written.
+    """
+    now = datetime.utcnow()
+    written, ops = 0, []
+    for r in payments_col.aggregate([
+        {"$match": {"status": "confirmed", "date": {"$type": "date"}}},
+        {"$group": {
+            "_id": {
+                "bank_name": {"$ifNull": ["$bank_name", ""]},
+                "account_last4": {"$toString": {"$ifNull": ["$account_last4", ""]}},
+                "day": {"$dateFromParts": {"year": {"$year": "$date"}, "month": {"$month": "$date"}, "day": {"$dayOfMonth": "$date"}}}
+            },
+            "total": {"$sum": _num("$amount")},
+            "count": {"$sum": 1}
+        }}
+    ], allowDiskUse=True):
+        key = r["_id"]
+        ops.append(ReplaceOne(
+            {"bank_name": key["bank_name"], "account_last4": key["account_last4"], "day": key["day"]},
+            dict(key, total=_to_f(r["total"]), count=r["count"], updated_at=now),
+            upsert=True
+        ))
+        written += 1
+        if len(ops) >= 1000:
+            receipts_col.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        receipts_col.bulk_write(ops, ordered=False)
+
+    # Drop days that no longer have confirmed payments
+    receipts_col.delete_many({
+        "_id": {"$ne": SYNC_ID},
+        "$or": [{"updated_at": {"$lt": now}}, {"updated_at": {"$exists": False}}]
+    })
+    receipts_col.replace_one({"_id": SYNC_ID}, {"synced_at": now}, upsert=True)
+    return written
+
+
+if __name__ == "__main__":
+    # Rebuild after deploying, or whenever the rollup is suspected to have drifted: python bank_receipts.py
+    print(f"✅ Rebuilt {rebuild_receipts()} account-day receipt totals.")
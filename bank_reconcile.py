@@ -0,0 +1,279 @@
+from flask import Blueprint, render_template, request, jsonify
+from bson import ObjectId
+from datetime import datetime, timedelta
+from functools import lru_cache
+import csv, io, re
+
+from db import db
+from bulk_confirm import confirm_many, MAX_BATCH
+from payments import after_confirm, CONFIRM_PROJECTION
+from truck_ledger import record_confirmed_payments
+
+bank_reconcile_bp = Blueprint("bank_reconcile", __name__)
+
+# 📦 Collections
+accounts_col = db["bank_accounts"]
+payments_col = db["payments"]
+truck_payments_col = db["truck_payments"]
+clients_col = db["clients"]
+
+truck_payments_col.create_index([("status", 1), ("date", -1)])
+
+SOURCES = {"payments": payments_col, "truck_payments": truck_payments_col}
+MAX_TOLERANCE_DAYS = 3
+REPORT_LIMIT = 500  # unmatched lines / payments listed in full; the rest are only counted
+
+# Statement header aliases (lowercased, trimmed)
+DATE_COLUMNS = ("date", "transaction date", "trans date", "value date", "posting date", "txn date")
+CREDIT_COLUMNS = ("credit", "credit amount", "deposit", "deposits", "cr", "money in")
+AMOUNT_COLUMNS = ("amount", "transaction amount")
+ACCOUNT_COLUMNS = ("account", "account number", "account no", "account_number", "acct no")
+REF_COLUMNS = ("reference", "description", "narration", "details", "remarks", "particulars")
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d-%b-%Y", "%d %b %Y", "%d-%b-%y", "%Y/%m/%d", "%d.%m.%Y", "%m/%d/%Y")
+
+# ---------- Parsing ----------
+def _to_cents(x):
+    s = re.sub(r"[^\d.\-]", "", str(x or "").replace("GHS", ""))
+    if s in ("", "-", ".", "-."):
+        return None
+    try:
+        return int(round(float(s) * 100))
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=4096)
+def _parse_date(value):
+    """Statement date -> date. Cached: a statement repeats the same few hundred dates."""
+    s = (value or "").strip()
+    for candidate in (s, s.split(" ")[0], s.split("T")[0]):
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, fmt).date()
+            except ValueError:
+                continue
+    return None
+
+def _last4(value):
+    digits = re.sub(r"\D", "", str(value or ""))
+    return digits[-4:] if len(digits) >= 4 else None
+
+def _pick(fieldnames, aliases):
+    for name in fieldnames:
+        if (name or "").strip().lower() in aliases:
+            return name
+    return None
+
+def _columns(fieldnames):
+    cols = {
+        "date": _pick(fieldnames, DATE_COLUMNS),
+        "credit": _pick(fieldnames, CREDIT_COLUMNS),
+        "amount": _pick(fieldnames, AMOUNT_COLUMNS),
+        "account": _pick(fieldnames, ACCOUNT_COLUMNS),
+        "ref": _pick(fieldnames, REF_COLUMNS)
+    }
+    if not cols["date"] or not (cols["credit"] or cols["amount"]):
+        raise ValueError("Statement needs a date column and a credit or amount column.")
+    return cols
+
+# ---------- Pending payment index ----------
+class PendingIndex:
+    """
+    Pending payments from payments and truck_payments, hashed by
+    (account_last4, amount in pesewas, day), and by (amount, day) alone for
+    statement lines whose account is unknown. Each payment can be matched once.
+    """
+
+    def __init__(self, bank_name=None, last4=None):
+        self.buckets = {}
+        self.by_amount = {}
+        self.size = 0
+        query = {"status": "pending"}
+        if bank_name:
+            query["bank_name"] = bank_name
+        if last4:
+            query["account_last4"] = last4
+        projection = {"client_id": 1, "amount": 1, "bank_name": 1, "account_last4": 1, "date": 1}
+        for source, col in SOURCES.items():
+            for p in col.find(query, projection):
+                cents = _to_cents(p.get("amount"))
+                if cents is None or not isinstance(p.get("date"), datetime):
+                    continue
+                p["source"] = source
+                p["taken"] = False
+                day = p["date"].date()
+                self.buckets.setdefault((str(p.get("account_last4") or "").strip(), cents, day), []).append(p)
+                self.by_amount.setdefault((cents, day), []).append(p)
+                self.size += 1
+        for candidates in list(self.buckets.values()) + list(self.by_amount.values()):
+            candidates.sort(key=lambda p: p["date"])
+
+    def take(self, last4, cents, day, tolerance):
+        """
+        Pop the best pending payment for a statement credit: same day first, then ±1, ±2 ...
+        An empty last4 (no account column, no account chosen) matches on amount and day only.
+        """
+        for offset in [0] + [d for n in range(1, tolerance + 1) for d in (-n, n)]:
+            d = day + timedelta(days=offset)
+            candidates = self.buckets.get((last4, cents, d)) if last4 else self.by_amount.get((cents, d))
+            while candidates:
+                p = candidates.pop(0)
+                if not p["taken"]:  # the other index may have handed it out already
+                    p["taken"] = True
+                    self.size -= 1
+                    return p
+        return None
+
+    def remaining(self, start, end):
+        """Unmatched pending payments dated within [start, end]."""
+        for (_, day), candidates in self.by_amount.items():
+            if start <= day <= end:
+                yield from (p for p in candidates if not p["taken"])
+
+# ---------- Matching ----------
+def reconcile_statement(stream, bank_name=None, last4=None, tolerance=1):
+    """
+    Stream a statement CSV (binary file object) line by line and match each credit to
+    a pending payment. Only the pending-payment index and the matches are held in memory.
+    Returns a report dict: matches, unmatched lines, unmatched pending payments, counts.
+    """
+    index = PendingIndex(bank_name, last4)
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline=""))
+    cols = _columns(reader.fieldnames or [])
+
+    matches, unmatched = [], []
+    counts = {"lines": 0, "credits": 0, "matched": 0, "unmatched": 0, "skipped": 0}
+    first_day = last_day = None
+
+    for line_no, row in enumerate(reader, start=2):
+        counts["lines"] += 1
+        day = _parse_date(row.get(cols["date"]))
+        if cols["credit"]:
+            cents = _to_cents(row.get(cols["credit"]))
+        else:
+            cents = _to_cents(row.get(cols["amount"]))
+        if not day or not cents or cents <= 0:
+            counts["skipped"] += 1  # debits, blanks, balance / header lines
+            continue
+
+        counts["credits"] += 1
+        first_day = min(first_day or day, day)
+        last_day = max(last_day or day, day)
+        line_last4 = (_last4(row.get(cols["account"])) if cols["account"] else None) or last4 or ""
+        ref = (row.get(cols["ref"]) or "").strip()[:200] if cols["ref"] else ""
+
+        payment = index.take(line_last4, cents, day, tolerance)
+        if payment:
+            counts["matched"] += 1
+            matches.append({
+                "line": line_no,
+                "source": payment["source"],
+                "payment_id": str(payment["_id"]),
+                "client_id": str(payment.get("client_id")),
+                "amount": cents / 100,
+                "payment_date": payment["date"].strftime("%Y-%m-%d %H:%M"),
+                "statement_date": day.isoformat(),
+                "reference": ref
+            })
+        else:
+            counts["unmatched"] += 1
+            if len(unmatched) < REPORT_LIMIT:
+                unmatched.append({"line": line_no, "date": day.isoformat(), "amount": cents / 100,
+                                  "account_last4": line_last4, "reference": ref})
+
+    pending_left = []
+    pending_left_count = 0
+    if first_day:
+        window = timedelta(days=tolerance)
+        for p in index.remaining(first_day - window, last_day + window):
+            pending_left_count += 1
+            if len(pending_left) < REPORT_LIMIT:
+                pending_left.append({
+                    "source": p["source"],
+                    "payment_id": str(p["_id"]),
+                    "client_id": str(p.get("client_id")),
+                    "amount": _to_cents(p.get("amount")) / 100,
+                    "bank_name": p.get("bank_name", ""),
+                    "account_last4": p.get("account_last4", ""),
+                    "date": p["date"].strftime("%Y-%m-%d %H:%M")
+                })
+
+    _attach_client_names(matches + pending_left)
+    counts["pending_unmatched"] = pending_left_count
+    return {
+        "counts": counts,
+        "period": [first_day.isoformat(), last_day.isoformat()] if first_day else None,
+        "matches": matches,
+        "unmatched_lines": unmatched,
+        "unmatched_payments": pending_left
+    }
+
+def _attach_client_names(rows):
+    oids = {ObjectId(r["client_id"]) for r in rows if ObjectId.is_valid(r["client_id"])}
+    names = {str(c["_id"]): c.get("name", "") for c in clients_col.find({"_id": {"$in": list(oids)}}, {"name": 1})}
+    for r in rows:
+        r["client_name"] = names.get(r["client_id"], "Unknown")
+
+def apply_matches(matches):
+    """Confirm matched payments with one bulk_write per source (per MAX_BATCH ids) and update derived totals."""
+    now = datetime.now()
+    applied = {}
+    for source, col in SOURCES.items():
+        ids = [{"id": m["payment_id"]} for m in matches if m["source"] == source]
+        for i in range(0, len(ids), MAX_BATCH):
+            if source == "payments":
+                results, confirmed = confirm_many(
+                    col, ids[i:i + MAX_BATCH], CONFIRM_PROJECTION,
+                    {"confirmed_at": now, "confirmed_via": "bank_statement"}
+                )
+                after_confirm(confirmed)
+            else:
+                results, confirmed = confirm_many(
+                    col, ids[i:i + MAX_BATCH], {"client_id": 1, "amount": 1},
+                    {"confirmed_at": now, "confirmed_via": "bank_statement"}
+                )
+                record_confirmed_payments(confirmed)
+            applied.update(results)
+    return applied
+
+# ---------- Routes ----------
+@bank_reconcile_bp.route("/bank-reconcile")
+def reconcile_page():
+    accounts = list(accounts_col.find({}, {"bank_name": 1, "account_number": 1}).sort("bank_name", 1))
+    return render_template("partials/bank_reconcile.html", accounts=accounts, max_tolerance=MAX_TOLERANCE_DAYS)
+
+@bank_reconcile_bp.route("/bank-reconcile/upload", methods=["POST"])
+def upload_statement():
+    """
+    Form fields: statement (CSV file), account_id (optional bank_accounts id the statement
+    belongs to), tolerance (days, default 1), apply (1 = confirm matches straight away).
+    """
+    file = request.files.get("statement")
+    if not file or not file.filename:
+        return jsonify({"success": False, "error": "Choose a statement CSV to upload."}), 400
+
+    bank_name = last4 = None
+    account_id = (request.form.get("account_id") or "").strip()
+    if account_id:
+        account = accounts_col.find_one({"_id": ObjectId(account_id)}, {"bank_name": 1, "account_number": 1}) \
+            if ObjectId.is_valid(account_id) else None
+        if not account:
+            return jsonify({"success": False, "error": "Bank account not found."}), 404
+        bank_name, last4 = account.get("bank_name"), _last4(account.get("account_number"))
+
+    try:
+        tolerance = max(0, min(int(request.form.get("tolerance", 1)), MAX_TOLERANCE_DAYS))
+    except ValueError:
+        tolerance = 1
+
+    try:
+        report = reconcile_statement(file.stream, bank_name, last4, tolerance)
+    except (ValueError, csv.Error) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    if request.form.get("apply") in ("1", "true", "on"):
+        results = apply_matches(report["matches"])
+        for m in report["matches"]:
+            m["outcome"] = results.get(m["payment_id"])
+        report["applied"] = sum(1 for r in results.values() if r == "confirmed")
+
+    return jsonify(dict(report, success=True))
@@ -3,10 +3,21 @@ from db import db
 from datetime import datetime
 from bson import ObjectId
 
+from bdc_balances import initial_totals, deposit_inc, current_balance, apply_update, balances_for, TOTALS_PROJECTION
+from bdc_payments import bdc_payments_col, record_payment
+from client_summaries import refresh_client_summary
+
 # 📦 Collections
 bdc_col = db["bdc"]
 bdc_txn_col = db["bdc_transactions"]
 
+BDC_PAYMENTS_PER_PAGE = 50
+BDC_SORTS = {
+    "name": (lambda b: (b.get("name") or "").lower(), False),
+    "balance": (lambda b: b["balance"], False),        # lowest first: accounts running low
+    "balance_desc": (lambda b: b["balance"], True),
+}
+
 # 🔹 Blueprint Declaration
 bdc_bp = Blueprint('bdc', __name__)
 
@@ -19,52 +30,23 @@ def _to_f(x):
     except Exception:
         return 0.0
 
-def _compute_current_balance(bdc_id: ObjectId):
-    """
-    Balance = SUM(bdc_transactions.amount where type == 'deposit')
-              - (SUM 'from account' + SUM 'credit' in bdc.payment_details)
-    Returns a dict with component totals.
-    """
-    oid = ObjectId(bdc_id)
-
-    # 1) Total deposits from transactions (type == 'deposit')
-    deposits_total = 0.0
-    for r in bdc_txn_col.aggregate([
-        {"$match": {"bdc_id": oid, "type": "deposit"}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ]):
-        deposits_total = _to_f(r.get("total"))
-
-    # 2) Totals from BDC payment_details (manual/legacy)
-    bdc_doc = bdc_col.find_one({"_id": oid}, {"payment_details": 1}) or {}
-    from_account_total = 0.0
-    credit_total = 0.0
-
-    for p in bdc_doc.get("payment_details", []):
-        ptype = (p.get("payment_type") or "").strip().lower()
-        amt = _to_f(p.get("amount"))
-        if ptype == "from account":
-            from_account_total += amt
-        elif ptype == "credit":
-            credit_total += amt
-        # 'cash' is ignored
-
-    balance = round(deposits_total - (from_account_total + credit_total), 2)
-
-    return {
-        "deposits_total": round(deposits_total, 2),
-        "from_account_total": round(from_account_total, 2),
-        "credit_total": round(credit_total, 2),
-        "balance": balance
-    }
-
-# 📄 View All BDCs
+# 📄 View All BDCs (with balances; ?sort=name|balance|balance_desc)
 @bdc_bp.route('/bdc')
 def bdc_list():
-    bdcs = list(bdc_col.find().sort("name", 1))
-    return render_template("partials/bdc.html", bdcs=bdcs)
+    sort = request.args.get("sort", "name")
+    if sort not in BDC_SORTS:
+        sort = "name"
+
+    bdcs = list(bdc_col.find({}, dict(TOTALS_PROJECTION, name=1, phone=1, location=1)))
+    balances = balances_for(bdcs)
+    for b in bdcs:
+        b.update(balances[b["_id"]])
+
+    key, reverse = BDC_SORTS[sort]
+    bdcs.sort(key=key, reverse=reverse)
+    return render_template("partials/bdc.html", bdcs=bdcs, sort=sort)
 
-# ➕ Add New BDC (no stored balance; we compute on read)
+# ➕ Add New BDC (balance comes from the running totals, see bdc_balances)
 @bdc_bp.route('/bdc/add', methods=['POST'])
 def add_bdc():
     data = request.json
@@ -86,9 +68,9 @@ def add_bdc():
         "location": location,
         "rep_name": rep_name,
         "rep_phone": rep_phone,
-        # 🔴 no 'balance' field; not used anymore
-        "payment_details": [],
-        "date_created": datetime.utcnow()
+        # 🔴 no 'balance' field; not used anymore (payments live in bdc_payments)
+        "date_created": datetime.utcnow(),
+        **initial_totals()
     })
 
     return jsonify({"status": "success"})
@@ -118,14 +100,14 @@ def add_transaction(bdc_id):
             "timestamp": datetime.utcnow()
         })
 
-        # Return freshly computed balance (not stored)
-        comp = _compute_current_balance(ObjectId(bdc_id))
+        # Bump the running deposit total and return the new balance
+        comp = apply_update(bdc_id, {"$inc": deposit_inc(amount)})
         return jsonify({"status": "success", "new_balance": comp["balance"]})
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-# 🧾 Record BDC Payment (cash / from account / credit) — no balance math/storage here
+# 🧾 Record BDC Payment (cash / from account / credit)
 @bdc_bp.route('/bdc/payment/<bdc_id>', methods=['POST'])
 def record_bdc_payment(bdc_id):
     try:
@@ -145,9 +127,6 @@ def record_bdc_payment(bdc_id):
         if payment_type not in ["cash", "from account", "credit"] or amount <= 0:
             return jsonify({"status": "error", "message": "Invalid payment type or amount"}), 400
 
-        if not bdc_col.find_one({"_id": ObjectId(bdc_id)}):
-            return jsonify({"status": "error", "message": "BDC not found"}), 404
-
         payment_entry = {
             "payment_type": payment_type,
             "amount": amount,
@@ -162,16 +141,16 @@ def record_bdc_payment(bdc_id):
             "date": datetime.utcnow()
         }
 
-        bdc_col.update_one({"_id": ObjectId(bdc_id)}, {"$push": {"payment_details": payment_entry}})
-
-        # Return computed balance (not stored)
-        comp = _compute_current_balance(ObjectId(bdc_id))
+        # Store the payment and bump the running total
+        comp = record_payment(bdc_id, payment_entry)
+        if comp is None:
+            return jsonify({"status": "error", "message": "BDC not found"}), 404
         return jsonify({"status": "success", "new_balance": comp["balance"]})
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-# 👤 BDC Profile Page (always uses computed balance)
+# 👤 BDC Profile Page (balance from the running totals)
 @bdc_bp.route('/bdc/profile/<bdc_id>')
 def bdc_profile(bdc_id):
     bdc = bdc_col.find_one({"_id": ObjectId(bdc_id)})
@@ -197,11 +176,26 @@ def bdc_profile(bdc_id):
 
     transactions = list(bdc_txn_col.find(query).sort("timestamp", -1))
 
-    payment_details = bdc.get("payment_details", [])
-    payment_details.sort(key=lambda x: x.get("date", datetime.min), reverse=True)
+    # Payments: one page from bdc_payments via the (bdc_id, date) index
+    pay_query = {"bdc_id": ObjectId(bdc_id)}
+    if "timestamp" in query:
+        pay_query["date"] = query["timestamp"]
+    try:
+        page = max(int(request.args.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    total_payments = bdc_payments_col.count_documents(pay_query)
+    total_pages = max((total_payments + BDC_PAYMENTS_PER_PAGE - 1) // BDC_PAYMENTS_PER_PAGE, 1)
+    page = min(page, total_pages)
+    payment_details = list(
+        bdc_payments_col.find(pay_query)
+        .sort("date", -1)
+        .skip((page - 1) * BDC_PAYMENTS_PER_PAGE)
+        .limit(BDC_PAYMENTS_PER_PAGE)
+    )
 
-    # Compute authoritative balance/components for the header
-    comp = _compute_current_balance(ObjectId(bdc_id))
+    # Balance/components for the header
+    comp = current_balance(bdc)
 
     return render_template(
         "partials/bdc_profile.html",
@@ -212,6 +206,8 @@ def bdc_profile(bdc_id):
         deposits_total=comp["deposits_total"],
         from_account_total=comp["from_account_total"],
         credit_total=comp["credit_total"],
+        current_page=page,
+        total_pages=total_pages,
         dashboard_url=dashboard_url
     )
 
@@ -220,34 +216,31 @@ def bdc_profile(bdc_id):
 def update_delivery_status(bdc_id):
     try:
         data = request.json
-        index = data.get("index")
+        payment_id = data.get("payment_id")
         status = (data.get("status") or "").strip()
 
-        if index is None or not status:
-            return jsonify({"status": "error", "message": "Missing index or status"}), 400
-
-        bdc = bdc_col.find_one({"_id": ObjectId(bdc_id)})
-        if not bdc:
-            return jsonify({"status": "error", "message": "BDC not found"}), 404
-
-        payments = bdc.get("payment_details", [])
-        if index >= len(payments):
-            return jsonify({"status": "error", "message": "Invalid payment index"}), 400
+        if not payment_id or not status:
+            return jsonify({"status": "error", "message": "Missing payment_id or status"}), 400
 
-        # Update delivery status in the BDC document
-        bdc_col.update_one(
-            {"_id": ObjectId(bdc_id)},
-            {"$set": {f"payment_details.{index}.delivery_status": status}}
+        # Single indexed update on the payment document
+        entry = bdc_payments_col.find_one_and_update(
+            {"_id": ObjectId(payment_id), "bdc_id": ObjectId(bdc_id)},
+            {"$set": {"delivery_status": status}},
+            projection={"order_id": 1}
         )
+        if not entry:
+            return jsonify({"status": "error", "message": "Payment not found"}), 404
 
         # Mirror to order if an order_id exists
-        entry = payments[index]
         order_id = entry.get("order_id")
         if order_id:
-            db["orders"].update_one(
+            order = db["orders"].find_one_and_update(
                 {"_id": ObjectId(order_id)},
-                {"$set": {"delivery_status": status}}
+                {"$set": {"delivery_status": status}},
+                projection={"client_id": 1}
             )
+            if order:
+                refresh_client_summary(order.get("client_id"))
 
         return jsonify({"status": "success"})
 
@@ -0,0 +1,171 @@
+from pymongo import UpdateOne, ReturnDocument
+from bson import ObjectId
+from datetime import datetime
+import sys
+
+from db import db
+
+# 📦 Collections
+bdc_col = db["bdc"]
+bdc_txn_col = db["bdc_transactions"]
+bdc_payments_col = db["bdc_payments"]
+
+# Running totals kept on each BDC document (balance = deposits - (from account + credit))
+TOTAL_FIELDS = ("deposits_total", "from_account_total", "credit_total")
+TOTALS_PROJECTION = {k: 1 for k in TOTAL_FIELDS + ("totals_synced_at",)}
+_PAYMENT_FIELD = {"from account": "from_account_total", "credit": "credit_total"}  # 'cash' is not counted
+
+# ---------- Helpers ----------
+def _to_f(x):
+    try:
+        if isinstance(x, str):
+            x = x.replace("GHS", "").replace(",", "").strip()
+        return float(x)
+    except Exception:
+        return 0.0
+
+def initial_totals():
+    """Fields for a new BDC document: zeroed totals, marked as in sync."""
+    return dict({k: 0.0 for k in TOTAL_FIELDS}, totals_synced_at=datetime.utcnow())
+
+def deposit_inc(amount):
+    """$inc for a deposit recorded in bdc_transactions."""
+    return {"deposits_total": _to_f(amount)}
+
+def payment_inc(payment_type, amount):
+    """$inc for a BDC payment ({} for cash)."""
+    field = _PAYMENT_FIELD.get((payment_type or "").strip().lower())
+    return {field: _to_f(amount)} if field else {}
+
+# ---------- Reads ----------
+def _components(deposits_total, from_account_total, credit_total):
+    return {
+        "deposits_total": round(deposits_total, 2),
+        "from_account_total": round(from_account_total, 2),
+        "credit_total": round(credit_total, 2),
+        "balance": round(deposits_total - (from_account_total + credit_total), 2)
+    }
+
+def compute_from_source(bdc_id):
+    """
+    Balance = SUM(bdc_transactions.amount where type == 'deposit')
+              - (SUM 'from account' + SUM 'credit' in bdc_payments)
+    Full recompute; used for BDCs whose totals were never synced. Same pipeline
+    (and amount conversion) as balances_from_source.
+    """
+    oid = ObjectId(bdc_id)
+    return balances_from_source([oid]).get(oid) or _components(0.0, 0.0, 0.0)
+
+def current_balance(bdc_doc):
+    """O(1) balance from the running totals on a BDC document (needs TOTALS_PROJECTION fields)."""
+    if not bdc_doc.get("totals_synced_at"):
+        return compute_from_source(bdc_doc["_id"])
+    return _components(*(_to_f(bdc_doc.get(k)) for k in TOTAL_FIELDS))
+
+def apply_update(bdc_id, update):
+    """
+    Apply `update` (e.g. {"$inc": deposit_inc(...)}) atomically and
+    return the new balance components, or None if the BDC does not exist.
+    An empty update just reads the current totals.
+    """
+    if not update:
+        doc = bdc_col.find_one({"_id": ObjectId(bdc_id)}, TOTALS_PROJECTION)
+    else:
+        doc = bdc_col.find_one_and_update(
+            {"_id": ObjectId(bdc_id)}, update,
+            projection=TOTALS_PROJECTION, return_document=ReturnDocument.AFTER
+        )
+    return current_balance(doc) if doc else None
+
+def _num(field):
+    """Aggregation twin of _to_f (what the running totals are incremented with): strips "GHS" and commas."""
+    cleaned = {"$trim": {"input": {"$replaceAll": {
+        "input": {"$replaceAll": {"input": field, "find": "GHS", "replacement": ""}},
+        "find": ",", "replacement": ""
+    }}}}
+    return {"$convert": {
+        "input": {"$cond": [{"$eq": [{"$type": field}, "string"]}, cleaned, field]},
+        "to": "double", "onError": 0.0, "onNull": 0.0
+    }}
+
+def balances_from_source(bdc_ids=None):
+    """
+    Balance components for many BDCs in one grouped aggregation:
+    deposits from bdc_transactions $unionWith payments from bdc_payments.
+    Returns {bdc_id: components}; BDCs with no records are absent.
+    """
+    scope = {"bdc_id": {"$in": [ObjectId(b) for b in bdc_ids]}} if bdc_ids is not None else {}
+    ptype = {"$toLower": {"$trim": {"input": {"$ifNull": ["$payment_type", ""]}}}}
+    pipeline = [
+        {"$match": dict(scope, type="deposit")},
+        {"$project": {"bdc_id": 1, "dep": _num("$amount"), "fa": {"$literal": 0.0}, "cr": {"$literal": 0.0}}},
+        {"$unionWith": {"coll": bdc_payments_col.name, "pipeline": [
+            {"$match": scope},
+            {"$project": {
+                "bdc_id": 1,
+                "dep": {"$literal": 0.0},
+                "fa": {"$cond": [{"$eq": [ptype, "from account"]}, _num("$amount"), 0.0]},
+                "cr": {"$cond": [{"$eq": [ptype, "credit"]}, _num("$amount"), 0.0]}
+            }}
+        ]}},
+        {"$group": {"_id": "$bdc_id", "dep": {"$sum": "$dep"}, "fa": {"$sum": "$fa"}, "cr": {"$sum": "$cr"}}}
+    ]
+    return {r["_id"]: _components(r["dep"], r["fa"], r["cr"]) for r in bdc_txn_col.aggregate(pipeline)}
+
+def balances_for(bdc_docs):
+    """
+    {bdc_id: components} for BDC documents read with TOTALS_PROJECTION: synced BDCs
+    use their running totals, the rest share one balances_from_source call.
+    """
+    out, unsynced = {}, []
+    for b in bdc_docs:
+        if b.get("totals_synced_at"):
+            out[b["_id"]] = current_balance(b)
+        else:
+            unsynced.append(b["_id"])
+    if unsynced:
+        source = balances_from_source(unsynced)
+        for bdc_id in unsynced:
+            out[bdc_id] = source.get(bdc_id) or _components(0.0, 0.0, 0.0)
+    return out
+
+# ---------- Reconciliation ----------
+def reconcile(fix=False, tolerance=0.005):
+    """
+    Recompute every BDC's totals from source and compare with the stored counters.
+    Returns [(bdc_id, name, field, stored, actual)] for each drift; with fix=True the
+    stored totals are overwritten (run while no BDC writes are in flight).
+    """
+    drift, ops = [], []
+    source = balances_from_source()
+    for b in bdc_col.find({}, dict(TOTALS_PROJECTION, name=1)):
+        actual = source.get(b["_id"]) or _components(0.0, 0.0, 0.0)
+        synced = bool(b.get("totals_synced_at"))
+        drifted = False
+        for field in TOTAL_FIELDS:
+            stored = _to_f(b.get(field))
+            if not synced or abs(stored - actual[field]) > tolerance:
+                drift.append((b["_id"], b.get("name", ""), field, stored if synced else None, actual[field]))
+                drifted = True
+        if fix and drifted:
+            ops.append(UpdateOne({"_id": b["_id"]}, {"$set": dict(
+                {k: actual[k] for k in TOTAL_FIELDS}, totals_synced_at=datetime.utcnow()
+            )}))
+    if ops:
+        bdc_col.bulk_write(ops, ordered=False)
+    return drift
+
+
+if __name__ == "__main__":
+    # Usage: python bdc_balances.py [--fix]
+    fix = "--fix" in sys.argv[1:]
+    rows = reconcile(fix=fix)
+    for bdc_id, name, field, stored, actual in rows:
+        shown = "unsynced" if stored is None else f"{stored:,.2f}"
+        print(f"⚠️ {name or bdc_id}: {field} stored {shown}, actual {actual:,.2f}")
+    if not rows:
+        print("✅ All BDC totals match their source records.")
+    elif fix:
+        print(f"✅ Fixed {len({r[0] for r in rows})} BDC(s).")
+    else:
+        print("Run with --fix to overwrite the stored totals.")
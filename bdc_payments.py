@@ -0,0 +1,88 @@
+from pymongo import InsertOne, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from collections import defaultdict
+
+from db import db
+from bdc_balances import payment_inc, apply_update
+
+# 📦 Collections
+bdc_col = db["bdc"]
+bdc_payments_col = db["bdc_payments"]  # one document per BDC payment (was bdc.payment_details)
+
+bdc_payments_col.create_index([("bdc_id", ASCENDING), ("date", DESCENDING)])
+bdc_payments_col.create_index("order_id", sparse=True)
+
+# ---------- Writes ----------
+def record_payment(bdc_id, payment_entry):
+    """
+    Store one BDC payment, then bump the BDC's running total (the row goes in
+    first, so a failed insert leaves the totals alone and an unsynced BDC's
+    recomputed balance includes it). Returns the new balance components,
+    or None if the BDC does not exist.
+    """
+    bdc_id = ObjectId(bdc_id)
+    inserted = bdc_payments_col.insert_one(dict(payment_entry, bdc_id=bdc_id)).inserted_id
+    inc = payment_inc(payment_entry.get("payment_type"), payment_entry.get("amount"))
+    comp = apply_update(bdc_id, {"$inc": inc} if inc else {})
+    if comp is None:
+        bdc_payments_col.delete_one({"_id": inserted})
+    return comp
+
+def record_payments(entries):
+    """
+    Batched record_payment for [(bdc_id, payment_entry)] (BDCs known to exist):
+    one bulk insert, then one bulk $inc covering only the rows that were stored.
+    """
+    if not entries:
+        return
+    error, failed = None, set()
+    try:
+        bdc_payments_col.bulk_write(
+            [InsertOne(dict(entry, bdc_id=ObjectId(bdc_id))) for bdc_id, entry in entries], ordered=False
+        )
+    except BulkWriteError as e:
+        error, failed = e, {err["index"] for err in e.details.get("writeErrors", [])}
+
+    incs = defaultdict(lambda: defaultdict(float))
+    for i, (bdc_id, entry) in enumerate(entries):
+        if i in failed:
+            continue
+        for field, amt in payment_inc(entry.get("payment_type"), entry.get("amount")).items():
+            incs[ObjectId(bdc_id)][field] += amt
+    if incs:
+        bdc_col.bulk_write(
+            [UpdateOne({"_id": bdc_id}, {"$inc": dict(inc)}) for bdc_id, inc in incs.items()], ordered=False
+        )
+    if error:
+        raise error
+
+# ---------- Migration ----------
+def migrate_payment_details(batch_size=1000):
+    """
+    Move every bdc.payment_details array into bdc_payments, then drop the arrays.
+    Idempotent: entries are upserted on (bdc_id, legacy_index). Totals are unchanged.
+    Returns the number of entries moved.
+    """
+    moved = 0
+    for b in bdc_col.find({"payment_details": {"$exists": True}}, {"payment_details": 1}):
+        ops = []
+        for i, entry in enumerate(b.get("payment_details") or []):
+            ops.append(UpdateOne(
+                {"bdc_id": b["_id"], "legacy_index": i},
+                {"$setOnInsert": dict(entry, bdc_id=b["_id"], legacy_index=i)},
+                upsert=True
+            ))
+            if len(ops) >= batch_size:
+                bdc_payments_col.bulk_write(ops, ordered=False)
+                moved += len(ops)
+                ops = []
+        if ops:
+            bdc_payments_col.bulk_write(ops, ordered=False)
+            moved += len(ops)
+        bdc_col.update_one({"_id": b["_id"]}, {"$unset": {"payment_details": ""}})
+    return moved
+
+
+if __name__ == "__main__":
+    print(f"✅ Moved {migrate_payment_details()} BDC payments to bdc_payments.")
@@ -0,0 +1,82 @@
+from pymongo import UpdateOne
+from bson import ObjectId
+
+MAX_BATCH = 1000  # ids per request
+
+# ---------- Helpers ----------
+def parse_items(req):
+    """
+    Items to confirm from a request: JSON {"payments": [{"id", "feedback"}, ...]}
+    or {"ids": [...], "feedback": "..."}; form posts may repeat `ids`.
+    Returns [{"id", "feedback"}] de-duplicated, in request order.
+    Raises ValueError for a malformed body (callers answer 400).
+    """
+    data = req.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise ValueError("Body must be a JSON object.")
+    if "payments" in data:
+        if not isinstance(data["payments"], list):
+            raise ValueError('"payments" must be a list.')
+        raw = [(i.get("id"), i.get("feedback")) for i in data["payments"] if isinstance(i, dict)]
+    else:
+        ids = data.get("ids") or req.form.getlist("ids")
+        if not isinstance(ids, list):
+            raise ValueError('"ids" must be a list.')
+        feedback = data.get("feedback", req.form.get("feedback"))
+        raw = [(i, feedback) for i in ids]
+
+    items, seen = [], set()
+    for pid, feedback in raw:
+        if feedback is not None and not isinstance(feedback, str):
+            raise ValueError("feedback must be a string.")
+        pid = str(pid or "").strip()
+        if pid in seen:
+            continue
+        seen.add(pid)
+        items.append({"id": pid, "feedback": (feedback or "").strip()})
+    return items
+
+# ---------- Bulk confirmation ----------
+def confirm_many(col, items, projection, extra_fields=None):
+    """
+    Confirm many payments in one bulk_write. Only pending -> confirmed transitions
+    apply; each write stamps a batch token so one follow-up _id query tells exactly
+    which documents this call confirmed, even with concurrent single confirmations.
+
+    Returns (results, confirmed_docs): results maps each id to "confirmed",
+    "already_confirmed", "not_found" or "invalid_id"; confirmed_docs are the newly
+    confirmed payments read with `projection`.
+    """
+    token = ObjectId()
+    results, ops, oids = {}, [], []
+    for item in items:
+        if not ObjectId.is_valid(item["id"]):
+            results[item["id"]] = "invalid_id"
+            continue
+        oid = ObjectId(item["id"])
+        fields = dict(extra_fields or {}, status="confirmed", confirm_batch=token)
+        if item.get("feedback"):
+            fields["feedback"] = item["feedback"]
+        ops.append(UpdateOne({"_id": oid, "status": {"$ne": "confirmed"}}, {"$set": fields}))
+        oids.append(oid)
+
+    if ops:
+        col.bulk_write(ops, ordered=False)
+
+    found = {
+        d["_id"]: d
+        for d in col.find({"_id": {"$in": oids}}, dict(projection, confirm_batch=1))
+    }
+    confirmed = []
+    for oid in oids:
+        doc = found.get(oid)
+        if not doc:
+            results[str(oid)] = "not_found"
+        elif doc.get("confirm_batch") == token:
+            results[str(oid)] = "confirmed"
+            confirmed.append(doc)
+        else:
+            results[str(oid)] = "already_confirmed"
+    return results, confirmed
@@ -1,9 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
 from datetime import datetime
-from bson import ObjectId, Regex
+from bson import ObjectId
 from db import db
-import random, string
 from pymongo.errors import DuplicateKeyError
+from product_prices import get_product
+from order_codes import next_order_code
+from client_summaries import refresh_client_summary
 
 client_order_bp = Blueprint('client_order', __name__, template_folder='templates')
 
@@ -26,9 +28,8 @@ def _maybe_oid(val):
     except Exception:
         return val  # fall back to raw string if not a valid ObjectId
 
-def _generate_order_id():
-    """Return a random 5-char uppercase alphanumeric code."""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
+# Allocated codes are unique; retries only cover a clash with a legacy random code
+MAX_CODE_ATTEMPTS = 3
 
 @client_order_bp.route('/submit_order', methods=['GET', 'POST'])
 def submit_order():
@@ -53,10 +54,7 @@ def submit_order():
         truck = trucks_collection.find_one({"truck_number": selected_truck_number})
 
         # Optional: snapshot the current product s_price into the order for future reference
-        prod_doc = products_collection.find_one(
-            {"name": Regex(f"^{product}$", "i")},
-            {"s_price": 1, "p_price": 1, "name": 1}
-        )
+        prod_doc = get_product(product, fresh=True)
         snapshot_s_price = (prod_doc or {}).get("s_price")
         snapshot_p_price = (prod_doc or {}).get("p_price")
 
@@ -78,9 +76,10 @@ def submit_order():
         if truck:
             base_order["truck_id"] = truck["_id"]
 
-        # Insert with a unique 5-char order_id; retry on rare collisions
-        while True:
-            code = _generate_order_id()
+        # Insert with a pre-allocated unique 5-char order_id (see order_codes.py)
+        order_mongo_id = None
+        for _ in range(MAX_CODE_ATTEMPTS):
+            code = next_order_code()
             doc = dict(base_order)
             doc["order_id"] = code
             try:
@@ -88,7 +87,11 @@ def submit_order():
                 order_mongo_id = result.inserted_id
                 break
             except DuplicateKeyError:
-                continue  # try another code
+                continue  # code already taken by a legacy random order_id
+        if not order_mongo_id:
+            flash("Could not submit your order. Please try again.", "danger")
+            return redirect(url_for('client_order.submit_order'))
+        refresh_client_summary(base_order["client_id"])
 
         # If truck was selected, create entry in truck_orders for admin approval
         if truck:
@@ -131,10 +134,7 @@ def client_product_price():
     if not name:
         return jsonify({"success": False, "error": "Missing product name"}), 400
 
-    product = products_collection.find_one(
-        {"name": Regex(f"^{name}$", "i")},
-        {"s_price": 1, "p_price": 1}
-    )
+    product = get_product(name)
     if not product:
         return jsonify({"success": False, "error": "Product not found"}), 404
 
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, session, url_for, flash
+from flask import Blueprint, render_template, request, redirect, session, url_for, flash, jsonify
 from db import db
 from datetime import datetime
 from bson import ObjectId
@@ -10,12 +10,76 @@ truck_payments_col = db["truck_payments"]
 orders_col = db["orders"]
 bank_accounts_col = db["bank_accounts"]
 
+HISTORY_PAGE_SIZE = 20
+
+# Payment history per client, newest first (both payment kinds)
+payments_col.create_index([("client_id", 1), ("date", -1)])
+truck_payments_col.create_index([("client_id", 1), ("date", -1)])
+
 def _to_f(x):
     try:
         return float(x)
     except (TypeError, ValueError):
         return 0.0
 
+def _num(field):
+    """Aggregation twin of _to_f: non-numeric amounts count as 0 instead of failing the pipeline."""
+    return {"$convert": {"input": field, "to": "double", "onError": 0.0, "onNull": 0.0}}
+
+def _client_keys(client_id):
+    """(client_match for orders, client_id as stored on payments) - orders may hold ObjectId or str."""
+    oid = ObjectId(client_id) if ObjectId.is_valid(client_id) else None
+    client_match = {"$in": ([oid, str(client_id)] if oid else [str(client_id)])}
+    return client_match, (oid or client_id)
+
+def _confirmed_paid_by_order(client_for_payments, order_oids):
+    """Confirmed-paid totals for many orders in one grouped aggregation: {order_oid: paid}."""
+    if not order_oids:
+        return {}
+    return {
+        r["_id"]: _to_f(r["paid"])
+        for r in payments_col.aggregate([
+            {"$match": {
+                "client_id": client_for_payments,
+                "status": "confirmed",
+                "order_id": {"$in": order_oids}
+            }},
+            {"$group": {"_id": "$order_id", "paid": {"$sum": _num("$amount")}}}
+        ])
+    }
+
+def _history_page(client_for_payments, page, page_size=HISTORY_PAGE_SIZE):
+    """
+    One page of order + truck payment history, newest first: both collections are
+    read through their (client_id, date) index in a single $unionWith aggregation.
+    Returns (rows, has_more).
+    """
+    fields = {"_id": 0, "date": 1, "amount": 1, "bank_name": 1, "account_last4": 1,
+              "proof_url": 1, "status": 1, "feedback": 1}
+    docs = list(payments_col.aggregate([
+        {"$match": {"client_id": client_for_payments}},
+        {"$project": dict(fields, type={"$literal": "Order"})},
+        {"$unionWith": {"coll": truck_payments_col.name, "pipeline": [
+            {"$match": {"client_id": client_for_payments}},
+            {"$project": dict(fields, type={"$literal": "Truck"})}
+        ]}},
+        {"$sort": {"date": -1}},
+        {"$skip": (page - 1) * page_size},
+        {"$limit": page_size + 1}
+    ]))
+
+    rows = [{
+        "type": p.get("type"),
+        "date": (p.get("date") or datetime.min).strftime("%Y-%m-%d %H:%M:%S"),
+        "amount": _to_f(p.get("amount")),
+        "bank_name": p.get("bank_name", "-"),
+        "account_last4": p.get("account_last4", ""),
+        "proof_url": p.get("proof_url", "#"),
+        "status": p.get("status", "pending"),
+        "feedback": p.get("feedback", "")
+    } for p in docs[:page_size]]
+    return rows, len(docs) > page_size
+
 @client_payment_bp.route("/payment", methods=["GET", "POST"])
 def client_payment():
     client_id = session.get("client_id")
@@ -26,9 +90,7 @@ def client_payment():
         return redirect(url_for("login.login"))
 
     # Support both storage styles in orders: ObjectId or string
-    oid = ObjectId(client_id) if ObjectId.is_valid(client_id) else None
-    client_match = {"$in": ([oid, str(client_id)] if oid else [str(client_id)])}
-    client_for_payments = (oid or client_id)
+    client_match, client_for_payments = _client_keys(client_id)
 
     if request.method == "POST":
         payment_type = (request.form.get("payment_type") or "").strip().lower()  # "order" or "truck"
@@ -89,28 +151,21 @@ def client_payment():
     # -------------------------
     # GET: Build “orders with debt”
     # -------------------------
-    orders = list(
-        orders_col.find({"client_id": client_match}).sort("date", -1)
-    )
+    orders = list(orders_col.find(
+        # total_debt may be stored as a string: compare it converted, like _to_f below
+        {"client_id": client_match, "$expr": {"$gt": [_num("$total_debt"), 0]}},
+        {"order_id": 1, "product": 1, "date": 1, "total_debt": 1}
+    ).sort("date", -1))
 
-    # Map: order_id -> confirmed paid total
-    def confirmed_paid_for(order_oid):
-        cur = payments_col.find({
-            "client_id": client_for_payments,
-            "order_id": order_oid,
-            "status": "confirmed"
-        })
-        return sum(_to_f(p.get("amount")) for p in cur)
+    # Map: order_id -> confirmed paid total (one aggregation for all orders)
+    paid_map = _confirmed_paid_by_order(client_for_payments, [o["_id"] for o in orders])
 
     orders_with_debt = []
     full_outstanding_total = 0.0
 
     for o in orders:
         total_debt = _to_f(o.get("total_debt"))
-        if total_debt <= 0:
-            continue
-
-        paid = confirmed_paid_for(o["_id"])
+        paid = paid_map.get(o["_id"], 0.0)
         outstanding = round(max(total_debt - paid, 0.0), 2)
         if outstanding > 0:
             orders_with_debt.append({
@@ -130,48 +185,33 @@ def client_payment():
     # Build a small map for front-end auto-fill (order -> outstanding)
     order_balance_map = {row["_id"]: row["outstanding"] for row in orders_with_debt}
 
-    # ✅ Fetch and combine both payment types (history)
-    order_payments = list(payments_col.find({"client_id": client_for_payments}).sort("date", -1))
-    truck_payments = list(truck_payments_col.find({"client_id": client_for_payments}).sort("date", -1))
-
-    combined_payments = []
-    for p in order_payments:
-        combined_payments.append({
-            "type": "Order",
-            "date": (p.get("date") or datetime.min).strftime("%Y-%m-%d %H:%M:%S"),
-            "amount": _to_f(p.get("amount")),
-            "bank_name": p.get("bank_name", "-"),
-            "account_last4": p.get("account_last4", ""),
-            "proof_url": p.get("proof_url", "#"),
-            "status": p.get("status", "pending"),
-            "feedback": p.get("feedback", "")
-        })
-    for p in truck_payments:
-        combined_payments.append({
-            "type": "Truck",
-            "date": (p.get("date") or datetime.min).strftime("%Y-%m-%d %H:%M:%S"),
-            "amount": _to_f(p.get("amount")),
-            "bank_name": p.get("bank_name", "-"),
-            "account_last4": p.get("account_last4", ""),
-            "proof_url": p.get("proof_url", "#"),
-            "status": p.get("status", "pending"),
-            "feedback": p.get("feedback", "")
-        })
-
-    # Sort history by date string (safe because YYYY-MM-DD HH:MM:SS)
-    combined_payments.sort(key=lambda x: x["date"], reverse=True)
-
     # ✅ Load available bank accounts
     bank_accounts = list(bank_accounts_col.find({}, {
         "bank_name": 1, "account_name": 1, "account_number": 1, "_id": 0
     }).sort("bank_name"))
 
+    # Payment history is loaded on demand from /client/payment/history
     return render_template(
         "client/client_payment.html",
-        payments=combined_payments,
         # For the UI dropdown and “Full payment” auto-fill:
         orders_with_debt=orders_with_debt,
         full_outstanding_total=round(full_outstanding_total, 2),
         order_balance_map=order_balance_map,
         bank_accounts=bank_accounts
     )
+
+@client_payment_bp.route("/payment/history")
+def client_payment_history():
+    """One page of the logged-in client's payment history as rendered rows."""
+    client_id = session.get("client_id")
+    if not client_id:
+        return jsonify({"success": False, "error": "Session expired."}), 401
+
+    try:
+        page = max(int(request.args.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    _, client_for_payments = _client_keys(client_id)
+    rows, has_more = _history_page(client_for_payments, page)
+    html = render_template("client/payment_history_rows.html", payments=rows)
+    return jsonify({"success": True, "html": html, "count": len(rows), "has_more": has_more, "page": page})
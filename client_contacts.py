@@ -0,0 +1,95 @@
+from pymongo import UpdateOne, ASCENDING
+import re
+
+from db import db
+
+# 📦 Collections
+clients_col = db["clients"]
+
+_GH_DEFAULT_CC = "233"  # Ghana (change if needed)
+PHONE_FIELDS = ("phone", "phone_number", "whatsapp", "mobile")
+CONTACT_PROJECTION = {k: 1 for k in PHONE_FIELDS + ("phones",)}
+
+# Share modal lists only clients with a WhatsApp number, by name -> partial index
+clients_col.create_index(
+    [("name", ASCENDING), ("_id", ASCENDING)],
+    name="share_clients_by_name",
+    partialFilterExpression={"primary_wa": {"$type": "string"}}
+)
+HAS_WA = {"primary_wa": {"$type": "string"}}
+
+# ---------- Normalization ----------
+def _digits_only(s: str) -> str:
+    return re.sub(r"\D+", "", s or "")
+
+def normalize_msisdn(raw: str, default_cc: str = _GH_DEFAULT_CC) -> str | None:
+    """
+    Return E.164-like digits WITHOUT '+' (for wa.me). Examples:
+      '0541234567'   -> '233541234567'
+      '+233541234567'-> '233541234567'
+      '541234567'    -> '233541234567'  (assume local GSM without 0)
+    """
+    if not raw:
+        return None
+    d = _digits_only(raw)
+    if not d:
+        return None
+    # Already has country code (length >= 11 and not starting with '0')
+    if d.startswith(default_cc):
+        return d
+    # Local starting with 0: drop 0 and prepend CC
+    if d.startswith("0") and len(d) >= 10:
+        return default_cc + d[1:]
+    # Bare 9-digit local (e.g., 54xxxxxxx): prepend CC
+    if len(d) in (9,):
+        return default_cc + d
+    # If looks like an international number with another CC, accept as-is
+    if len(d) >= 11 and not d.startswith("0"):
+        return d
+    return None
+
+def raw_phones(doc):
+    """Non-empty phone strings from the common phone fields, in field order."""
+    raw_list = []
+    for key in PHONE_FIELDS:
+        v = doc.get(key)
+        if isinstance(v, str) and v.strip():
+            raw_list.append(v.strip())
+    if isinstance(doc.get("phones"), list):
+        for v in doc["phones"]:
+            if isinstance(v, str) and v.strip():
+                raw_list.append(v.strip())
+    return raw_list
+
+def contact_fields(doc):
+    """
+    Fields to $set on a client document whenever its phone fields are written:
+    wa_numbers (unique normalized numbers) and primary_wa (first one, or None).
+    """
+    wa_numbers = []
+    for raw in raw_phones(doc):
+        n = normalize_msisdn(raw)
+        if n and n not in wa_numbers:
+            wa_numbers.append(n)
+    return {"wa_numbers": wa_numbers, "primary_wa": wa_numbers[0] if wa_numbers else None}
+
+# ---------- Backfill ----------
+def backfill_contact_fields(batch_size=500):
+    """Compute wa_numbers / primary_wa for every existing client. Returns the number of clients updated."""
+    ops, updated = [], 0
+    projection = dict(CONTACT_PROJECTION, wa_numbers=1, primary_wa=1)
+    for c in clients_col.find({}, projection):
+        fields = contact_fields(c)
+        if all(c.get(k, "missing") == v for k, v in fields.items()):
+            continue
+        ops.append(UpdateOne({"_id": c["_id"]}, {"$set": fields}))
+        if len(ops) >= batch_size:
+            updated += clients_col.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += clients_col.bulk_write(ops, ordered=False).modified_count
+    return updated
+
+
+if __name__ == "__main__":
+    print(f"✅ Updated WhatsApp numbers on {backfill_contact_fields()} clients.")
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template
 from bson import ObjectId
 from datetime import datetime
+from pricing import compute_pricing, to_py
 from db import clients_collection, orders_collection, payments_collection
 
 client_profile_bp = Blueprint("client_profile", __name__, template_folder="templates")
@@ -23,7 +24,8 @@ def client_profile(client_id):
         )
 
         # ✅ Prepare each order with extra fields
-        for order in all_orders:
+        priced = compute_pricing(all_orders)
+        for i, order in enumerate(all_orders):
             # Convert timestamps
             if "date" in order and not isinstance(order["date"], datetime):
                 try:
@@ -36,17 +38,9 @@ def client_profile(client_id):
                 except:
                     order["due_date"] = None
 
-            # Compute margin and returns
-            try:
-                p = float(order.get("p_bdc_omc", 0))
-                s = float(order.get("s_bdc_omc", 0))
-                q = float(order.get("quantity", 0))
-                margin = s - p
-                order["margin"] = round(margin, 2)
-                order["returns"] = round(margin * q, 2)
-            except:
-                order["margin"] = 0.0
-                order["returns"] = 0.0
+            # Margin and returns (see pricing.compute_pricing)
+            order["margin"] = to_py(priced["margin_eff"][i], nan=0.0)
+            order["returns"] = to_py(priced["margin_returns"][i], nan=0.0)
 
             # Add default tax and debt fields
             try:
@@ -0,0 +1,115 @@
+from pymongo import UpdateOne
+from collections import OrderedDict
+from threading import Lock
+import re, time
+
+from db import db
+
+# 📦 Collections
+clients_col = db["clients"]
+
+# Multikey index: lowercase name tokens, full name and client_id
+clients_col.create_index("search_keys")
+
+CACHE_SIZE = 512
+CACHE_TTL = 60  # seconds; other workers pick up new clients within this window
+
+_cache = OrderedDict()
+_cache_lock = Lock()
+
+# ---------- Keys ----------
+def _normalize(s):
+    return re.sub(r"\s+", " ", (s or "").strip().lower())
+
+def search_keys(name, client_id=None):
+    """Prefix-searchable keys for a client: each name token, the full name and the client_id."""
+    keys = []
+    full = _normalize(name)
+    if full:
+        keys.append(full)
+        keys.extend(t for t in re.split(r"[^0-9a-z]+", full) if t)
+    cid = _normalize(client_id)
+    if cid:
+        keys.append(cid)
+    return sorted(set(keys))
+
+def search_fields(name, client_id=None):
+    """Fields to $set on a client document whenever its name / client_id is written."""
+    return {"search_keys": search_keys(name, client_id)}
+
+# ---------- Cache ----------
+def invalidate_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def _cache_get(term):
+    with _cache_lock:
+        hit = _cache.get(term)
+        if not hit:
+            return None
+        if time.monotonic() - hit[0] > CACHE_TTL:
+            del _cache[term]
+            return None
+        _cache.move_to_end(term)
+        return hit[1]
+
+def _cache_put(term, value):
+    with _cache_lock:
+        _cache[term] = (time.monotonic(), value)
+        _cache.move_to_end(term)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+# ---------- Lookup ----------
+def lookup_clients(term, limit=20):
+    """
+    Clients whose name token, full name or client_id starts with `term`.
+    Anchored, escaped prefix on `search_keys` -> index range scan.
+    Returns [{id, client_id, name}].
+    """
+    term = _normalize(term)
+    cached = _cache_get(term)
+    if cached is not None:
+        return cached
+
+    q = {"search_keys": {"$regex": "^" + re.escape(term)}} if term else {}
+    docs = clients_col.find(q, {"name": 1, "client_id": 1}).limit(limit)
+    results = [{
+        "id": str(d["_id"]),
+        "client_id": d.get("client_id", str(d["_id"])),
+        "name": d.get("name", "Unnamed")
+    } for d in docs]
+
+    _cache_put(term, results)
+    return results
+
+def client_ids_matching(term, limit=1000):
+    """
+    _ids of every client lookup_clients would match (uncached, for filtering other
+    collections). Returns (ids, truncated); truncated is True when more than `limit` match.
+    """
+    term = _normalize(term)
+    q = {"search_keys": {"$regex": "^" + re.escape(term)}} if term else {}
+    ids = [d["_id"] for d in clients_col.find(q, {"_id": 1}).limit(limit + 1)]
+    return ids[:limit], len(ids) > limit
+
+# ---------- Backfill ----------
+def backfill_search_keys(batch_size=500):
+    """Compute search_keys for every existing client. Returns the number of clients updated."""
+    ops, updated = [], 0
+    for c in clients_col.find({}, {"name": 1, "client_id": 1, "search_keys": 1}):
+        keys = search_keys(c.get("name"), c.get("client_id"))
+        if c.get("search_keys") == keys:
+            continue
+        ops.append(UpdateOne({"_id": c["_id"]}, {"$set": {"search_keys": keys}}))
+        if len(ops) >= batch_size:
+            updated += clients_col.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += clients_col.bulk_write(ops, ordered=False).modified_count
+    invalidate_cache()
+    return updated
+
+
+if __name__ == "__main__":
+    print(f"✅ Updated search keys on {backfill_search_keys()} clients.")
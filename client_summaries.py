@@ -0,0 +1,205 @@
+from pymongo import ReplaceOne, ASCENDING, DESCENDING
+from bson import ObjectId
+from datetime import datetime
+import sys
+
+from db import db
+
+# 📦 Collections
+orders_col = db["orders"]
+summaries_col = db["client_summaries"]  # one document per client (_id = str(client_id))
+
+orders_col.create_index([("client_id", ASCENDING), ("date", DESCENDING)])
+
+RECENT_ORDERS = 5
+TOTAL_FIELDS = ("total_orders", "total_debt", "total_paid", "amount_left")
+# Order fields kept on the recent-order stubs (what the client dashboard shows)
+STUB_FIELDS = (
+    "order_id", "product", "order_type", "vehicle_number", "quantity", "total_debt",
+    "status", "delivery_status", "delivered_date", "due_date", "date",
+    "driver_name", "driver_phone", "depot", "region"
+)
+
+# ---------- Helpers ----------
+def _to_f(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _num(field):
+    """Aggregation twin of _to_f: non-numeric values count as 0 instead of being skipped or failing."""
+    return {"$convert": {"input": field, "to": "double", "onError": 0.0, "onNull": 0.0}}
+
+def _client_key(client_id):
+    return str(client_id)
+
+def _client_match(client_key):
+    """Orders hold client_id as ObjectId or str."""
+    return {"$in": [ObjectId(client_key), client_key]} if ObjectId.is_valid(client_key) else client_key
+
+def _paid(order):
+    return sum(_to_f(p.get("amount")) for p in (order.get("payment_details") or []))
+
+def _stub(order):
+    stub = {k: order.get(k) for k in STUB_FIELDS}
+    stub["_id"] = order["_id"]
+    stub["paid"] = round(_paid(order), 2)
+    return stub
+
+def _summary_doc(total_orders, total_debt, total_paid, recent, now):
+    return {
+        "total_orders": total_orders,
+        "total_debt": round(total_debt, 2),
+        "total_paid": round(total_paid, 2),
+        "amount_left": round(total_debt - total_paid, 2),
+        "recent_orders": recent,
+        "updated_at": now
+    }
+
+def _projection():
+    return dict({k: 1 for k in STUB_FIELDS}, payment_details=1)
+
+# ---------- Compute ----------
+def compute_summary(client_id):
+    """
+    One client's summary from source: totals via a grouped aggregation, recent
+    orders via the (client_id, date) index. total_paid sums the orders' payment_details.
+    Amounts convert like _to_f, so this agrees with _all_from_source and check_drift.
+    """
+    key = _client_key(client_id)
+    match = {"client_id": _client_match(key)}
+
+    totals = {"count": 0, "debt": 0.0, "paid": 0.0}
+    for r in orders_col.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "debt": {"$sum": _num("$total_debt")},
+            "paid": {"$sum": {"$sum": {"$map": {
+                "input": {"$ifNull": ["$payment_details", []]},
+                "in": _num("$$this.amount")
+            }}}}
+        }}
+    ]):
+        totals = {"count": r["count"], "debt": _to_f(r["debt"]), "paid": _to_f(r["paid"])}
+
+    recent = [_stub(o) for o in orders_col.find(match, _projection()).sort("date", -1).limit(RECENT_ORDERS)]
+    return _summary_doc(totals["count"], totals["debt"], totals["paid"], recent, datetime.utcnow())
+
+def _all_from_source():
+    """Every client's summary in one pass over orders, holding only each client's newest orders."""
+    out = {}
+    by_date = lambda o: o.get("date") or datetime.min
+    for o in orders_col.find({"client_id": {"$ne": None}}, dict(_projection(), client_id=1)):
+        key = _client_key(o.get("client_id"))
+        s = out.setdefault(key, {"count": 0, "debt": 0.0, "paid": 0.0, "recent": []})
+        s["count"] += 1
+        s["debt"] += _to_f(o.get("total_debt"))
+        s["paid"] += _paid(o)
+        # Keep only the newest RECENT_ORDERS per client
+        s["recent"].append(o)
+        if len(s["recent"]) > RECENT_ORDERS:
+            s["recent"].sort(key=by_date, reverse=True)
+            s["recent"].pop()
+
+    now = datetime.utcnow()
+    return {
+        key: _summary_doc(s["count"], s["debt"], s["paid"],
+                          [_stub(o) for o in sorted(s["recent"], key=by_date, reverse=True)], now)
+        for key, s in out.items()
+    }
+
+# ---------- Incremental maintenance ----------
+def refresh_client_summary(client_id):
+    """Recompute and store one client's summary (call after an order is submitted, approved, paid or delivered)."""
+    if client_id is None:
+        return None
+    doc = compute_summary(client_id)
+    summaries_col.replace_one({"_id": _client_key(client_id)}, doc, upsert=True)
+    return doc
+
+def refresh_client_summaries(client_ids):
+    """Batched refresh_client_summary: one bulk_write for many clients."""
+    keys = {_client_key(c) for c in client_ids if c is not None}
+    ops = [ReplaceOne({"_id": key}, compute_summary(key), upsert=True) for key in keys]
+    if ops:
+        summaries_col.bulk_write(ops, ordered=False)
+    return len(ops)
+
+# ---------- Reads ----------
+def get_summary(client_id):
+    """The stored summary (single document read); computed and stored on first access."""
+    doc = summaries_col.find_one({"_id": _client_key(client_id)})
+    return doc or refresh_client_summary(client_id)
+
+# ---------- Rebuild / drift check ----------
+def rebuild_summaries():
+    """Recompute every client's summary from source. Returns the number of summaries written."""
+    summaries = _all_from_source()
+    ops = [ReplaceOne({"_id": key}, doc, upsert=True) for key, doc in summaries.items()]
+    for i in range(0, len(ops), 1000):
+        summaries_col.bulk_write(ops[i:i + 1000], ordered=False)
+    summaries_col.delete_many({"_id": {"$nin": list(summaries)}})
+    return len(ops)
+
+def check_drift(fix=False, tolerance=0.005):
+    """
+    Compare stored summaries with source. Returns [(client_key, field, stored, actual)];
+    field "recent_orders" flags a stale recent-orders list, "missing" an absent summary.
+    With fix=True drifted summaries are rewritten.
+    """
+    actual = _all_from_source()
+    stored = {d["_id"]: d for d in summaries_col.find({})}
+    drift, ops = [], []
+
+    for key, want in actual.items():
+        have = stored.get(key)
+        rows = []
+        if not have:
+            rows.append((key, "missing", None, None))
+        else:
+            for field in TOTAL_FIELDS:
+                if abs(_to_f(have.get(field)) - _to_f(want[field])) > tolerance:
+                    rows.append((key, field, have.get(field), want[field]))
+            have_recent = [(o.get("_id"), o.get("delivery_status"), o.get("status"), o.get("paid"))
+                           for o in have.get("recent_orders") or []]
+            want_recent = [(o["_id"], o.get("delivery_status"), o.get("status"), o.get("paid"))
+                           for o in want["recent_orders"]]
+            if have_recent != want_recent:
+                rows.append((key, "recent_orders", len(have_recent), len(want_recent)))
+        drift.extend(rows)
+        if fix and rows:
+            ops.append(ReplaceOne({"_id": key}, want, upsert=True))
+
+    for key in stored.keys() - actual.keys():
+        drift.append((key, "orphaned", None, None))
+
+    if fix:
+        if ops:
+            summaries_col.bulk_write(ops, ordered=False)
+        orphans = list(stored.keys() - actual.keys())
+        if orphans:
+            summaries_col.delete_many({"_id": {"$in": orphans}})
+    return drift
+
+
+if __name__ == "__main__":
+    # Usage: python client_summaries.py rebuild | check [--fix]
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "rebuild":
+        print(f"✅ Rebuilt {rebuild_summaries()} client summaries.")
+    elif cmd == "check":
+        fix = "--fix" in sys.argv[2:]
+        rows = check_drift(fix=fix)
+        for key, field, have, want in rows:
+            print(f"⚠️ {key}: {field} stored {have}, actual {want}")
+        if not rows:
+            print("✅ All client summaries match their orders.")
+        elif fix:
+            print(f"✅ Fixed {len({r[0] for r in rows})} client summary(ies).")
+        else:
+            print("Run with --fix to rewrite the drifted summaries.")
+    else:
+        print("Usage: python client_summaries.py rebuild | check [--fix]")
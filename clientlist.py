@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, request, jsonify, session
 from bson import ObjectId
 from db import db
 from datetime import datetime
+from client_search import search_fields, invalidate_cache
+from client_contacts import contact_fields, CONTACT_PROJECTION
 
 clientlist_bp = Blueprint('clientlist', __name__, template_folder='templates')
 
@@ -66,18 +68,28 @@ def update_client():
     if not ObjectId.is_valid(client_id):
         return jsonify(success=False, error="Invalid client ID"), 400
 
+    existing = clients_collection.find_one({"_id": ObjectId(client_id)}, dict(CONTACT_PROJECTION, client_id=1))
+    if not existing:
+        return jsonify(success=False, error="No changes made or client not found")
+
+    update_fields = {
+        "name": name,
+        "phone": phone,
+        "status": status
+    }
+    update_fields.update(search_fields(name, existing.get("client_id")))
+    update_fields.update(contact_fields({**existing, "phone": phone}))
+
     result = clients_collection.update_one(
         {"_id": ObjectId(client_id)},
-        {"$set": {
-            "name": name,
-            "phone": phone,
-            "status": status
-        }}
+        {"$set": update_fields}
     )
 
     if result.modified_count == 0:
         return jsonify(success=False, error="No changes made or client not found")
 
+    invalidate_cache()
+
     return jsonify(success=True)
 
 # ✅ Delete (archive) client
@@ -1,15 +1,34 @@
 from flask import Blueprint, render_template, request, jsonify, abort
 from db import db
+from balance_snapshots import opening_balance
+from client_search import lookup_clients
 from bson import ObjectId
 from dateutil.relativedelta import relativedelta
 from datetime import datetime, timedelta
-import re, calendar
+import re, calendar, math
 
 debtors_bp = Blueprint("debtors", __name__)
 
 clients_col  = db["clients"]
 orders_col   = db["orders"]
 payments_col = db["payments"]
+order_balances_col = db["order_balances"]  # maintained by order_balances.py
+
+DEBTORS_PER_PAGE = 20
+
+# Supports the per-client latest-order / linked-payments lookups in view_debtors
+orders_col.create_index([("client_id", 1), ("status", 1), ("date", -1)])
+payments_col.create_index([("client_id", 1), ("status", 1), ("date", 1)])
+
+# Receivables aging buckets on days overdue (due_date -> today)
+AGING_BUCKETS = [
+    {"key": "current",  "label": "Current", "lo": None, "hi": 0},
+    {"key": "d1_30",    "label": "1-30",    "lo": 1,    "hi": 30},
+    {"key": "d31_60",   "label": "31-60",   "lo": 31,   "hi": 60},
+    {"key": "d61_90",   "label": "61-90",   "lo": 61,   "hi": 90},
+    {"key": "d90_plus", "label": "90+",     "lo": 91,   "hi": None},
+]
+order_balances_col.create_index([("amount_left", 1), ("client_id", 1)])
 
 # ---------------- helpers ----------------
 
@@ -152,6 +171,7 @@ def _years_range():
 def view_debtors_table():
     """
     Aggregated debtors by client for the selected window **based on order 'date'**.
+    Reads the materialized `order_balances` rows (see order_balances.py).
     Filters:
       - ?month=1..12 & ?year=YYYY  (primary UI)
       - OR ?from=YYYY-MM-DD&to=YYYY-MM-DD (custom)
@@ -165,50 +185,24 @@ def view_debtors_table():
     client = _find_client(client_token) if client_token else None
     client_oid = client["_id"] if client else None
 
-    # Orders match (window + status + optional client)
-    order_match = {"status": "approved"}
+    # Balance rows match (window + optional client); rows exist only for approved orders
+    balance_match = {}
     if start_dt and end_dt:
-        order_match["date"] = {"$gte": start_dt, "$lte": end_dt}
+        balance_match["date"] = {"$gte": start_dt, "$lte": end_dt}
     if client_oid:
-        order_match["client_id"] = client_oid
+        balance_match["client_id"] = client_oid
 
     pipeline = [
-        {"$match": order_match},
+        {"$match": balance_match},
 
-        # Group orders by client
+        # Group per-order balances by client
         {"$group": {
             "_id": "$client_id",
-            "order_oids": {"$addToSet": "$_id"},           # Mongo ObjectIds of orders
-            "order_refs": {"$addToSet": "$order_id"},      # Short string order IDs (e.g., '97OZD') if present
-            "total_debt": {"$sum": {"$toDouble": "$total_debt"}},
+            "total_debt": {"$sum": "$total_debt"},
+            "total_paid": {"$sum": "$confirmed_paid"},
             "latest_due_date": {"$max": "$due_date"},
             "oldest_order_date": {"$min": "$date"}
         }},
-
-        # Payments for those orders (support both styles):
-        #   payments.order_id == order _id   (ObjectId)
-        #   payments.order_id == order_id    (short string like '97OZD')
-        {"$lookup": {
-            "from": "payments",
-            "let": {"orderOids": "$order_oids", "orderRefs": "$order_refs", "cid": "$_id"},
-            "pipeline": [
-                {"$match": {"$expr": {
-                    "$and": [
-                        {"$eq": ["$client_id", "$$cid"]},
-                        {"$eq": ["$status", "confirmed"]},
-                        {"$or": [
-                            {"$in": ["$order_id", "$$orderOids"]},  # payments.order_id holds ObjectId
-                            {"$in": ["$order_id", "$$orderRefs"]},  # payments.order_id holds string code
-                            {"$in": ["$order_ref", "$$orderRefs"]}, # payments.order_ref holds string code
-                            {"$in": ["$order_ref", "$$orderOids"]}, # very defensive
-                        ]}
-                    ]
-                }}},
-                {"$group": {"_id": None, "paid": {"$sum": {"$toDouble": "$amount"}}}}
-            ],
-            "as": "pay"
-        }},
-        {"$addFields": {"total_paid": {"$ifNull": [{"$arrayElemAt": ["$pay.paid", 0]}, 0]}}},
         {"$addFields": {"amount_left": {"$max": [{"$subtract": ["$total_debt", "$total_paid"]}, 0]}}},
 
         # Only debtors (orders in window not fully paid)
@@ -239,7 +233,7 @@ def view_debtors_table():
         {"$sort": {"amount_left": -1}}
     ]
 
-    rows = list(orders_col.aggregate(pipeline))
+    rows = list(order_balances_col.aggregate(pipeline))
 
     # finalize fields for template
     for r in rows:
@@ -280,46 +274,84 @@ def view_debtors():
     start_dt, end_dt, sel_month, sel_year = _resolve_window(request.args)
 
     client_token = request.args.get("client")
+    try:
+        page = max(int(request.args.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+
     if client_token:
         c = _find_client(client_token)
-        clients = [c] if c else []
+        client_match = {"_id": c["_id"]} if c else {"_id": None}
     else:
-        clients = list(clients_col.find({"status": "active"}))
+        client_match = {"status": "active"}
 
-    client_data = []
-    for client in clients:
-        if not client: 
-            continue
-        cid = client["_id"]
+    order_match = {"status": "approved"}
+    if start_dt and end_dt:
+        order_match["date"] = {"$gte": start_dt, "$lte": end_dt}
 
-        q = {"client_id": cid, "status": "approved"}
-        if start_dt and end_dt:
-            q["date"] = {"$gte": start_dt, "$lte": end_dt}
+    # One round trip: each client's latest approved order in the window, then
+    # (for the requested page only) the confirmed payments linked to it.
+    pipeline = [
+        {"$match": client_match},
+        {"$sort": {"name": 1, "_id": 1}},
+        {"$lookup": {
+            "from": "orders",
+            "localField": "_id",
+            "foreignField": "client_id",
+            "pipeline": [
+                {"$match": order_match},
+                {"$sort": {"date": -1}},
+                {"$limit": 1},
+                {"$project": {"order_id": 1, "date": 1, "due_date": 1, "order_type": 1, "total_debt": 1}}
+            ],
+            "as": "latest"
+        }},
+        {"$unwind": "$latest"},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "rows": [
+                {"$skip": (page - 1) * DEBTORS_PER_PAGE},
+                {"$limit": DEBTORS_PER_PAGE},
+                # payments linked to this order (support both id styles)
+                {"$lookup": {
+                    "from": "payments",
+                    "localField": "_id",
+                    "foreignField": "client_id",
+                    "let": {"oid": "$latest._id", "ref": "$latest.order_id"},
+                    "pipeline": [
+                        {"$match": {"status": "confirmed"}},
+                        {"$match": {"$expr": {"$or": [
+                            {"$eq": ["$order_id", "$$oid"]},
+                            {"$eq": ["$order_ref", "$$oid"]},
+                            {"$and": [{"$ne": [{"$ifNull": ["$$ref", None]}, None]}, {"$or": [
+                                {"$eq": ["$order_id", "$$ref"]},
+                                {"$eq": ["$order_ref", "$$ref"]},
+                            ]}]},
+                        ]}}},
+                        {"$sort": {"date": 1}},
+                        {"$project": {"amount": 1, "date": 1, "bank_name": 1, "note": 1}}
+                    ],
+                    "as": "pays"
+                }},
+                {"$project": {"name": 1, "client_id": 1, "latest": 1, "pays": 1}}
+            ]
+        }}
+    ]
 
-        approved = list(orders_col.find(q).sort("date", -1))
-        if not approved:
-            continue
+    facet = next(clients_col.aggregate(pipeline), {"total": [], "rows": []})
+    total_clients = facet["total"][0]["n"] if facet["total"] else 0
+    total_pages = max(math.ceil(total_clients / DEBTORS_PER_PAGE), 1)
 
-        latest = approved[0]
+    client_data = []
+    for client in facet["rows"]:
+        latest = client["latest"]
         order_oid  = latest["_id"]
         total_debt = float(latest.get("total_debt", 0) or 0)
         order_type = (latest.get("order_type") or "-").upper()
 
-        # payments linked to this order (support both id styles)
-        pays = list(payments_col.find({
-            "client_id": cid,
-            "status": "confirmed",
-            "$or": [
-                {"order_id": order_oid},
-                {"order_id": latest.get("order_id")},
-                {"order_ref": latest.get("order_id")},
-                {"order_ref": order_oid},
-            ]
-        }).sort("date", 1))
-
         total_paid = 0.0
         payment_data = []
-        for p in pays:
+        for p in client["pays"]:
             amt = float(p.get("amount", 0) or 0)
             total_paid += amt
             payment_data.append({
@@ -365,56 +397,23 @@ def view_debtors():
         from_date=_fmt_date(start_dt, "") if start_dt else "",
         to_date=_fmt_date(end_dt, "") if end_dt else "",
         period_label=period,
-        customer=(client_token or "")
+        customer=(client_token or ""),
+        current_page=page,
+        total_pages=total_pages
     )
 
 # ---------------- Statement: customer ledger + PDF page ----------------
 
-@debtors_bp.route("/debtors/statement")
-def debtor_statement():
+def build_statement(client, start_dt, end_dt):
     """
-    Ledger (Balance b/f, PMS/AGO split, running balance).
-    Filters: ?client=<id|client_id|name>  (required)
-             Month/Year or custom range (same precedence as above).
+    Ledger rows for one client and window (shared by the page and statement_batch.py).
+    Returns (period_label, rows, totals_row).
     """
-    token = request.args.get("client")
-    if not token:
-        abort(400, "client is required")
-
-    client = _find_client(token)
-    if not client:
-        abort(404, "Client not found")
-
-    start_dt, end_dt, sel_month, sel_year = _resolve_window(request.args)
-    if not start_dt:
-        # default to current month
-        now = datetime.utcnow()
-        start_dt = datetime(now.year, now.month, 1)
-        end_dt   = start_dt + relativedelta(months=1) - timedelta(microseconds=1)
-
     cid = client["_id"]
 
-    # Opening balance = (orders - payments) strictly before start
-    prev_orders = list(orders_col.find({
-        "client_id": cid, "status": "approved", "date": {"$lt": start_dt}
-    }))
-    prev_ids    = [o["_id"] for o in prev_orders]
-    prev_refs   = [o.get("order_id") for o in prev_orders if o.get("order_id")]
-    prev_debt   = sum(float(o.get("total_debt", 0) or 0) for o in prev_orders)
-
-    prev_pays = list(payments_col.find({
-        "client_id": cid,
-        "status": "confirmed",
-        "date": {"$lt": start_dt},
-        "$or": [
-            {"order_id": {"$in": prev_ids}},
-            {"order_id": {"$in": prev_refs}},
-            {"order_ref": {"$in": prev_refs}},
-            {"order_ref": {"$in": prev_ids}},
-        ],
-    }))
-    prev_paid = sum(float(p.get("amount", 0) or 0) for p in prev_pays)
-    opening = round(prev_debt - prev_paid, 2)
+    # Opening balance = (orders - payments) strictly before start,
+    # starting from the latest monthly snapshot (see balance_snapshots.py)
+    opening = opening_balance(cid, start_dt)
 
     # Activity within window
     win_orders = list(orders_col.find({
@@ -524,6 +523,32 @@ def debtor_statement():
     else:
         period = f"{_fmt_date(start_dt)} to {_fmt_date(end_dt)}"
 
+    return period, rows, totals_row
+
+@debtors_bp.route("/debtors/statement")
+def debtor_statement():
+    """
+    Ledger (Balance b/f, PMS/AGO split, running balance).
+    Filters: ?client=<id|client_id|name>  (required)
+             Month/Year or custom range (same precedence as above).
+    """
+    token = request.args.get("client")
+    if not token:
+        abort(400, "client is required")
+
+    client = _find_client(token)
+    if not client:
+        abort(404, "Client not found")
+
+    start_dt, end_dt, sel_month, sel_year = _resolve_window(request.args)
+    if not start_dt:
+        # default to current month
+        now = datetime.utcnow()
+        start_dt = datetime(now.year, now.month, 1)
+        end_dt   = start_dt + relativedelta(months=1) - timedelta(microseconds=1)
+
+    period, rows, totals_row = build_statement(client, start_dt, end_dt)
+
     return render_template(
         "partials/debtors_statement.html",
         company_name="TRUETYPE SERVICES",
@@ -534,23 +559,113 @@ def debtor_statement():
         totals=totals_row
     )
 
+# ---------------- Aging report (single pass) ----------------
+
+def _aging_sums():
+    """Conditional $sum per aging bucket over the `days_overdue` field."""
+    out = {}
+    for b in AGING_BUCKETS:
+        conds = []
+        if b["lo"] is not None:
+            conds.append({"$gte": ["$days_overdue", b["lo"]]})
+        if b["hi"] is not None:
+            conds.append({"$lte": ["$days_overdue", b["hi"]]})
+        out[b["key"]] = {"$sum": {"$cond": [{"$and": conds}, "$amount_left", 0]}}
+    return out
+
+@debtors_bp.route("/debtors/aging")
+def debtors_aging():
+    """
+    Receivables aging (Current / 1-30 / 31-60 / 61-90 / 90+ days past due_date),
+    per client and in total, from the outstanding `order_balances` rows.
+    Filters: ?client=<id|client_id|name>, ?sort=<bucket key|total>, ?format=json
+    """
+    client_token = request.args.get("client")
+    client = _find_client(client_token) if client_token else None
+    sort_key = request.args.get("sort") or "total"
+    if sort_key not in [b["key"] for b in AGING_BUCKETS]:
+        sort_key = "total"
+
+    match = {"amount_left": {"$gt": 0}}
+    if client:
+        match["client_id"] = client["_id"]
+
+    now = datetime.utcnow()
+    sums = _aging_sums()
+    sums["total"] = {"$sum": "$amount_left"}
+    sums["orders"] = {"$sum": 1}
+
+    pipeline = [
+        {"$match": match},
+        {"$addFields": {"days_overdue": {"$cond": [
+            {"$and": [
+                {"$eq": [{"$type": "$due_date"}, "date"]},
+                {"$lt": ["$due_date", now]}
+            ]},
+            {"$dateDiff": {"startDate": "$due_date", "endDate": now, "unit": "day"}},
+            0
+        ]}}},
+        {"$facet": {
+            "clients": [
+                {"$group": dict({"_id": "$client_id"}, **sums)},
+                {"$sort": {sort_key: -1}},
+                {"$lookup": {
+                    "from": "clients",
+                    "localField": "_id",
+                    "foreignField": "_id",
+                    "pipeline": [{"$project": {"name": 1, "client_id": 1}}],
+                    "as": "client"
+                }},
+                {"$unwind": {"path": "$client", "preserveNullAndEmptyArrays": True}}
+            ],
+            "totals": [{"$group": dict({"_id": None}, **sums)}]
+        }}
+    ]
+
+    facet = next(order_balances_col.aggregate(pipeline), {"clients": [], "totals": []})
+    keys = [b["key"] for b in AGING_BUCKETS] + ["total"]
+
+    rows = []
+    for r in facet["clients"]:
+        c = r.get("client") or {}
+        row = {
+            "client_oid": str(r["_id"]),
+            "client_id": c.get("client_id") or str(r["_id"]),
+            "name": c.get("name", "Unnamed"),
+            "orders": r.get("orders", 0)
+        }
+        row.update({k: round(float(r.get(k) or 0), 2) for k in keys})
+        rows.append(row)
+
+    t = facet["totals"][0] if facet["totals"] else {}
+    totals = {k: round(float(t.get(k) or 0), 2) for k in keys}
+    totals["orders"] = t.get("orders", 0)
+
+    if (request.args.get("format") or "").lower() == "json":
+        return jsonify({
+            "as_of": _fmt_date(now),
+            "buckets": [{"key": b["key"], "label": b["label"]} for b in AGING_BUCKETS],
+            "clients": rows,
+            "totals": totals
+        })
+
+    return render_template(
+        "partials/debtors_aging.html",
+        buckets=AGING_BUCKETS,
+        clients=rows,
+        totals=totals,
+        as_of=_fmt_date(now),
+        sort=sort_key,
+        customer=(client_token or "")
+    )
+
 # ---------------- JSON (optional for AJAX / autocomplete) ----------------
 
 @debtors_bp.route("/debtors/clients.json")
 def clients_lookup():
+    # Prefix match on the clients.search_keys index (see client_search.py)
     term = (request.args.get("q") or "").strip()
-    q = {}
-    if term:
-        q = {"$or": [
-            {"name": {"$regex": term, "$options": "i"}},
-            {"client_id": {"$regex": term, "$options": "i"}}
-        ]}
-    docs = list(clients_col.find(q, {"name":1, "client_id":1}).limit(20))
-    return jsonify([{
-        "id": str(d["_id"]),
-        "client_id": d.get("client_id", str(d["_id"])),
-        "name": d.get("name", "Unnamed")
-    } for d in docs])
+    return jsonify(lookup_clients(term, limit=20))
 
 @debtors_bp.route("/debtors/tag", methods=["POST"])
 def update_tag():
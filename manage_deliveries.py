@@ -2,12 +2,13 @@ from flask import Blueprint, render_template, request, jsonify
 from bson import ObjectId
 from db import db
 from datetime import datetime
+from bdc_payments import bdc_payments_col
+from client_summaries import refresh_client_summary
 
 manage_deliveries_bp = Blueprint("manage_deliveries", __name__, template_folder="templates")
 
 orders_collection = db["orders"]
 clients_collection = db["clients"]
-bdc_collection = db["bdc"]
 
 @manage_deliveries_bp.route("/deliveries", methods=["GET"])
 def view_deliveries():
@@ -114,13 +115,14 @@ def update_delivery_status(order_id):
         }
     )
 
-    # Also update in bdc.payment_details where order_id matches
-    bdc_result = bdc_collection.update_one(
-        {"payment_details.order_id": ObjectId(order_id)},
-        {"$set": {"payment_details.$.delivery_status": new_status}}
+    # Also update the BDC payment for this order (indexed on order_id)
+    bdc_result = bdc_payments_col.update_one(
+        {"order_id": ObjectId(order_id)},
+        {"$set": {"delivery_status": new_status}}
     )
 
     if orders_result.modified_count == 1 or bdc_result.modified_count == 1:
+        refresh_client_summary(order.get("client_id"))
         return jsonify({"success": True, "message": "Delivery status updated in order and BDC."})
     else:
         return jsonify({"success": False, "message": "No update made."})
@@ -0,0 +1,211 @@
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, DeleteMany
+from bson import ObjectId
+from datetime import datetime
+from db import db
+
+# 📦 Collections
+orders_col         = db["orders"]
+payments_col       = db["payments"]
+order_balances_col = db["order_balances"]
+
+# One row per approved order: total_debt / confirmed_paid / amount_left
+order_balances_col.create_index("order_oid", unique=True)
+order_balances_col.create_index([("date", DESCENDING)])
+order_balances_col.create_index([("client_id", ASCENDING), ("date", DESCENDING)])
+
+# ---------- Helpers ----------
+def _to_f(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _num(field):
+    """Aggregation twin of _to_f: non-numeric values count as 0 instead of failing the pipeline."""
+    return {"$convert": {"input": field, "to": "double", "onError": 0.0, "onNull": 0.0}}
+
+def _as_oid(val):
+    if isinstance(val, ObjectId):
+        return val
+    try:
+        return ObjectId(val)
+    except Exception:
+        return None
+
+def _order_payment_match(order):
+    """Confirmed payments linked to an order (supports ObjectId and short-code styles)."""
+    order_oid = order["_id"]
+    ref = order.get("order_id")
+    links = [{"order_id": order_oid}, {"order_ref": order_oid}]
+    if ref:
+        links += [{"order_id": ref}, {"order_ref": ref}]
+    return {"client_id": order.get("client_id"), "status": "confirmed", "$or": links}
+
+def _balance_doc(order, confirmed_paid):
+    total_debt = round(_to_f(order.get("total_debt")), 2)
+    confirmed_paid = round(confirmed_paid, 2)
+    return {
+        "order_oid": order["_id"],
+        "order_ref": order.get("order_id"),
+        "client_id": order.get("client_id"),
+        "date": order.get("date"),
+        "due_date": order.get("due_date"),
+        "total_debt": total_debt,
+        "confirmed_paid": confirmed_paid,
+        "amount_left": round(max(total_debt - confirmed_paid, 0), 2),
+        "updated_at": datetime.utcnow()
+    }
+
+# ---------- Incremental maintenance ----------
+def refresh_order_balance(order_oid):
+    """Recompute the balance row for one order; drops the row if it is no longer approved."""
+    oid = _as_oid(order_oid)
+    if not oid:
+        return None
+
+    order = orders_col.find_one({"_id": oid}, {
+        "order_id": 1, "client_id": 1, "status": 1,
+        "date": 1, "due_date": 1, "total_debt": 1
+    })
+    if not order or order.get("status") != "approved":
+        order_balances_col.delete_one({"order_oid": oid})
+        return None
+
+    paid = 0.0
+    for r in payments_col.aggregate([
+        {"$match": _order_payment_match(order)},
+        {"$group": {"_id": None, "paid": {"$sum": _num("$amount")}}}
+    ]):
+        paid = _to_f(r.get("paid"))
+
+    doc = _balance_doc(order, paid)
+    order_balances_col.replace_one({"order_oid": oid}, doc, upsert=True)
+    return doc
+
+def refresh_order_balances(order_oids):
+    """Batched refresh_order_balance: one orders query, one payments query, one bulk_write."""
+    oids = [o for o in (_as_oid(x) for x in order_oids) if o]
+    if not oids:
+        return 0
+
+    orders = {}
+    key_map = {}
+    for o in orders_col.find({"_id": {"$in": oids}, "status": "approved"}, {
+        "order_id": 1, "client_id": 1, "date": 1, "due_date": 1, "total_debt": 1
+    }):
+        orders[o["_id"]] = o
+        key_map[o["_id"]] = o["_id"]
+        if o.get("order_id"):
+            key_map[o["order_id"]] = o["_id"]
+
+    paid_map = {}
+    if key_map:
+        keys = list(key_map.keys())
+        for p in payments_col.find({
+            "status": "confirmed",
+            "$or": [{"order_id": {"$in": keys}}, {"order_ref": {"$in": keys}}]
+        }, {"client_id": 1, "order_id": 1, "order_ref": 1, "amount": 1}):
+            for key in ("order_id", "order_ref"):
+                target = key_map.get(p.get(key))
+                if target and orders[target].get("client_id") == p.get("client_id"):
+                    paid_map[target] = paid_map.get(target, 0.0) + _to_f(p.get("amount"))
+                    break
+
+    ops = [ReplaceOne({"order_oid": oid}, _balance_doc(o, paid_map.get(oid, 0.0)), upsert=True)
+           for oid, o in orders.items()]
+    stale = [oid for oid in oids if oid not in orders]
+    if stale:
+        ops.append(DeleteMany({"order_oid": {"$in": stale}}))
+    if ops:
+        order_balances_col.bulk_write(ops, ordered=False)
+    return len(orders)
+
+def refresh_balances_for_payment(payment):
+    """Refresh the order a payment points at (payment.order_id / payment.order_ref)."""
+    if not payment:
+        return None
+
+    order = None
+    for key in ("order_id", "order_ref"):
+        val = payment.get(key)
+        if not val:
+            continue
+        oid = _as_oid(val)
+        q = {"_id": oid} if oid else {"order_id": val}
+        order = orders_col.find_one(q, {"_id": 1})
+        if order:
+            break
+
+    return refresh_order_balance(order["_id"]) if order else None
+
+def refresh_balances_for_payments(payments):
+    """Batched refresh_balances_for_payment: one query resolves every linked order, then one refresh."""
+    oids, codes = set(), set()
+    for p in payments:
+        for key in ("order_id", "order_ref"):
+            val = p.get(key)
+            if not val:
+                continue
+            oid = _as_oid(val)
+            if oid:
+                oids.add(oid)
+            else:
+                codes.add(val)
+    if not oids and not codes:
+        return 0
+
+    orders = orders_col.find(
+        {"$or": [{"_id": {"$in": list(oids)}}, {"order_id": {"$in": list(codes)}}]}, {"_id": 1}
+    )
+    return refresh_order_balances([o["_id"] for o in orders])
+
+# ---------- Full rebuild ----------
+def rebuild_order_balances(batch_size=1000):
+    """
+    Recompute every row from scratch:
+      1) one pass over approved orders to map order _id / short code -> order
+      2) one pass over confirmed payments to sum paid per order
+      3) bulk upsert rows, then drop rows whose order is no longer approved
+    Returns the number of rows written.
+    """
+    started = datetime.utcnow()
+    orders = {}
+    key_map = {}
+    for o in orders_col.find({"status": "approved"}, {
+        "order_id": 1, "client_id": 1, "date": 1, "due_date": 1, "total_debt": 1
+    }):
+        orders[o["_id"]] = o
+        key_map[o["_id"]] = o["_id"]
+        if o.get("order_id"):
+            key_map[o["order_id"]] = o["_id"]
+
+    paid_map = {}
+    for p in payments_col.find({"status": "confirmed"}, {
+        "client_id": 1, "order_id": 1, "order_ref": 1, "amount": 1
+    }):
+        for key in ("order_id", "order_ref"):
+            target = key_map.get(p.get(key))
+            if target and orders[target].get("client_id") == p.get("client_id"):
+                paid_map[target] = paid_map.get(target, 0.0) + _to_f(p.get("amount"))
+                break
+
+    written = 0
+    ops = []
+    for oid, o in orders.items():
+        ops.append(ReplaceOne({"order_oid": oid}, _balance_doc(o, paid_map.get(oid, 0.0)), upsert=True))
+        if len(ops) >= batch_size:
+            order_balances_col.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+    if ops:
+        order_balances_col.bulk_write(ops, ordered=False)
+        written += len(ops)
+
+    # Anything not touched by this run belongs to an order that is no longer approved
+    order_balances_col.delete_many({"updated_at": {"$lt": started}})
+    return written
+
+
+if __name__ == "__main__":
+    count = rebuild_order_balances()
+    print(f"✅ Rebuilt {count} order balance rows.")
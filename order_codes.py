@@ -0,0 +1,68 @@
+from pymongo import ReturnDocument
+from threading import Lock
+import string
+
+from db import db
+
+# 📦 Collections
+counters_col = db["counters"]
+
+ALPHABET = string.ascii_uppercase + string.digits  # same alphabet as the legacy random codes
+CODE_LEN = 5
+SPACE = len(ALPHABET) ** CODE_LEN                   # 36^5 = 60,466,176 codes
+BLOCK_SIZE = 50
+
+# n -> (n * _MUL + _ADD) mod SPACE is a bijection (gcd(_MUL, 36) == 1), so consecutive
+# counter values give distinct, non-sequential-looking codes
+_MUL = 15485863
+_ADD = 2971215
+_COUNTER_ID = "order_code"
+
+# ---------- Encoding ----------
+def encode(n):
+    """Counter value -> 5-char code (unique for n < SPACE)."""
+    v = (n * _MUL + _ADD) % SPACE
+    chars = []
+    for _ in range(CODE_LEN):
+        v, r = divmod(v, len(ALPHABET))
+        chars.append(ALPHABET[r])
+    return "".join(reversed(chars))
+
+# ---------- Allocator ----------
+class OrderCodeAllocator:
+    """
+    Hands out order codes from blocks reserved atomically on the counter document
+    ($inc by BLOCK_SIZE via find_one_and_update). Each process caches its block,
+    so a code costs no round trip until the block runs out.
+    """
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = Lock()
+
+    def _reserve_block(self):
+        doc = counters_col.find_one_and_update(
+            {"_id": _COUNTER_ID},
+            {"$inc": {"seq": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._end = doc["seq"]
+        self._next = self._end - self.block_size
+        if self._end > SPACE:
+            raise RuntimeError("Order code space exhausted")
+
+    def next_code(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve_block()
+            n = self._next
+            self._next += 1
+        return encode(n)
+
+allocator = OrderCodeAllocator()
+
+def next_order_code():
+    return allocator.next_code()
@@ -2,6 +2,13 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 from bson import ObjectId, errors
 from db import db
 from datetime import datetime
+from pymongo import UpdateOne
+from pricing import compute_pricing, price_one, to_py
+from product_prices import get_product
+from order_balances import refresh_order_balance, refresh_order_balances
+from balance_snapshots import invalidate_snapshots
+from bdc_payments import record_payment, record_payments
+from client_summaries import refresh_client_summary, refresh_client_summaries
 
 orders_bp = Blueprint('orders', __name__, template_folder='templates')
 
@@ -10,29 +17,84 @@ clients_collection = db['clients']
 bdc_collection = db['bdc']
 products_collection = db['products']  # Products collection
 
+ORDERS_PAGE_SIZE = 25
+
+# Keyset pagination for the pending queue: (status, date desc, _id desc)
+orders_collection.create_index([('status', 1), ('date', -1), ('_id', -1)])
+
 def _f(v):
     try:
         return float(v)
     except (TypeError, ValueError):
         return None
 
-def _nz(v):  # treat None as 0.0
-    return v if v is not None else 0.0
-
-@orders_bp.route('/', methods=['GET'])
-def view_orders():
-    if 'role' not in session or session['role'] not in ['admin', 'assistant']:
-        flash("Access denied.", "danger")
-        return redirect(url_for('login.login'))
-
-    orders = list(orders_collection.find({'status': 'pending'}).sort('date', -1))
-    bdcs = list(bdc_collection.find({}, {'name': 1}))  # _id included by default
+def _encode_cursor(order):
+    """
+    Keyset cursor on (date, _id) of the last order on a page. Orders without a
+    datetime `date` come after all dated ones, ordered by _id only: "_<id>".
+    """
+    d = order.get('date')
+    if not isinstance(d, datetime):
+        return f"_{order['_id']}"
+    return f"{d.isoformat()}_{order['_id']}"
+
+def _decode_cursor(cursor):
+    """(date or None, ObjectId), or None for a malformed cursor."""
+    try:
+        d, oid = (cursor or '').rsplit('_', 1)
+        return (datetime.fromisoformat(d) if d else None), ObjectId(oid)
+    except (ValueError, errors.InvalidId):
+        return None
 
+def _pending_orders_page(cursor=None, page_size=ORDERS_PAGE_SIZE):
+    """
+    One page of pending orders, newest first, continuing after `cursor`.
+    Clients for the page are fetched with a single $in query.
+    Returns (orders, next_cursor).
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    orders = []
+    if not after or after[0] is not None:
+        query = {'status': 'pending', 'date': {'$type': 'date'}}
+        if after:
+            d, oid = after
+            query['$or'] = [{'date': {'$lt': d}}, {'date': d, '_id': {'$lt': oid}}]
+        orders = list(
+            orders_collection.find(query)
+            .sort([('date', -1), ('_id', -1)])
+            .limit(page_size + 1)
+        )
+
+    # Dated orders exhausted: continue with undated ones (legacy rows) by _id
+    if len(orders) <= page_size:
+        query = {'status': 'pending', 'date': {'$not': {'$type': 'date'}}}
+        if after and after[0] is None:
+            query['_id'] = {'$lt': after[1]}
+        orders += list(
+            orders_collection.find(query)
+            .sort('_id', -1)
+            .limit(page_size + 1 - len(orders))
+        )
+    has_more = len(orders) > page_size
+    orders = orders[:page_size]
+
+    client_oids = set()
     for order in orders:
         try:
-            client = clients_collection.find_one({'_id': ObjectId(order.get('client_id'))})
-        except Exception:
-            client = None
+            client_oids.add(ObjectId(order.get('client_id')))
+        except (TypeError, errors.InvalidId):
+            pass
+    client_map = {
+        str(c['_id']): c
+        for c in clients_collection.find(
+            {'_id': {'$in': list(client_oids)}},
+            {'name': 1, 'image_url': 1, 'client_id': 1}
+        )
+    }
+
+    priced = compute_pricing(orders)
+    for i, order in enumerate(orders):
+        client = client_map.get(str(order.get('client_id')))
 
         if client:
             order['client_name'] = client.get('name', 'No Name')
@@ -44,73 +106,98 @@ def view_orders():
             order['client_image_url'] = ''
             order['client_profile_url'] = None
 
-        # Server-side initial display (fallbacks)
-        p = _f(order.get('p_bdc_omc'))
-        s = _f(order.get('s_bdc_omc'))
-        p_tax = _f(order.get('p_tax'))
-        s_tax = _f(order.get('s_tax'))
-        q = _f(order.get('quantity')) or 0.0
-
-        margin_price = (s - p) if (s is not None and p is not None) else None
-        margin_tax = (s_tax - p_tax) if (s_tax is not None and p_tax is not None) else None
+        # Server-side initial display (see pricing.compute_pricing)
+        order['margin'] = to_py(priced['margin_price'][i])
+        order['returns_sbdc'] = to_py(priced['returns_sbdc'][i])
+        order['returns_stax'] = to_py(priced['returns_stax'][i])
+        order['returns_total'] = to_py(priced['returns_total'][i])
+        order['returns'] = order['returns_total']  # legacy
 
-        order['margin'] = round(margin_price, 2) if margin_price is not None else None
+    next_cursor = _encode_cursor(orders[-1]) if (has_more and orders) else None
+    return orders, next_cursor
 
-        # returns for initial render
-        ret_sbdc = (s * q) if (s is not None) else 0.0
-        ret_stax = (s_tax * q) if (s_tax is not None) else 0.0
-        ret_total = ret_sbdc + ret_stax
+@orders_bp.route('/', methods=['GET'])
+def view_orders():
+    if 'role' not in session or session['role'] not in ['admin', 'assistant']:
+        flash("Access denied.", "danger")
+        return redirect(url_for('login.login'))
 
-        order['returns_sbdc'] = round(ret_sbdc, 2)
-        order['returns_stax'] = round(ret_stax, 2)
-        order['returns_total'] = round(ret_total, 2)
-        order['returns'] = round(ret_total, 2)  # legacy
+    orders, next_cursor = _pending_orders_page()
+    bdcs = list(bdc_collection.find({}, {'name': 1}))  # _id included by default
 
-    return render_template('partials/orders.html', orders=orders, bdcs=bdcs)
+    return render_template('partials/orders.html', orders=orders, bdcs=bdcs, next_cursor=next_cursor)
 
-@orders_bp.route('/update/<order_id>', methods=['POST'])
-def update_order(order_id):
+@orders_bp.route('/pending.json', methods=['GET'])
+def pending_orders_page():
+    """Next page of pending order cards for infinite scroll: {html, next_cursor}."""
     if 'role' not in session or session['role'] not in ['admin', 'assistant']:
         return jsonify({"success": False, "error": "Unauthorized"}), 403
 
-    form = request.form
-    mode = (form.get("order_type") or "combo").strip().lower()  # 's_bdc' | 's_tax' | 'combo'
+    orders, next_cursor = _pending_orders_page(request.args.get('cursor'))
+    bdcs = list(bdc_collection.find({}, {'name': 1}))
 
+    return jsonify({
+        "success": True,
+        "html": render_template('partials/order_cards.html', orders=orders, bdcs=bdcs),
+        "next_cursor": next_cursor
+    })
+
+# ---------------------------
+# Order update rules (shared by single and bulk approval)
+# ---------------------------
+def _order_fields(src):
+    """Read the update fields from a form or a JSON dict. Returns (mode, fields)."""
+    mode = (src.get("order_type") or "combo").strip().lower()  # 's_bdc' | 's_tax' | 'combo'
     fields = {
-        "omc": form.get("omc"),
-        "bdc": form.get("bdc"),  # may be None when S‑Tax
-        "depot": form.get("depot"),
-        "p_bdc_omc": form.get("p_bdc_omc"),
-        "s_bdc_omc": form.get("s_bdc_omc"),
-        "p_tax": form.get("p_tax"),
-        "s_tax": form.get("s_tax"),
-        "due_date": form.get("due_date"),
-        "payment_type": (form.get("payment_type") or "").strip(),
-        "payment_amount": form.get("payment_amount"),
-        "shareholder": (form.get("shareholder") or "").strip()
+        "omc": src.get("omc"),
+        "bdc": src.get("bdc"),  # may be None when S‑Tax
+        "depot": src.get("depot"),
+        "p_bdc_omc": src.get("p_bdc_omc"),
+        "s_bdc_omc": src.get("s_bdc_omc"),
+        "p_tax": src.get("p_tax"),
+        "s_tax": src.get("s_tax"),
+        "due_date": src.get("due_date"),
+        "payment_type": (src.get("payment_type") or "").strip(),
+        "payment_amount": src.get("payment_amount"),
+        "shareholder": (src.get("shareholder") or "").strip()
     }
-
-    # Basic requireds: OMC & DEPOT always; BDC required unless S‑Tax
+    return mode, fields
+
+# Fields read as text (stripped / parsed as dates); JSON items may only send strings here
+TEXT_FIELDS = ("order_type", "omc", "bdc", "depot", "due_date", "payment_type", "shareholder")
+
+def _item_error(item):
+    """Shape check for one bulk item (JSON). Returns (error, code) or None."""
+    if not isinstance(item, dict):
+        return "Each order must be an object.", 400
+    for key in TEXT_FIELDS:
+        if item.get(key) is not None and not isinstance(item[key], str):
+            return f"{key} must be a string.", 400
+    return None
+
+def _check_required(mode, fields):
+    """Basic requireds: OMC & DEPOT always; BDC required unless S‑Tax. Returns (error, code) or None."""
     if not all([fields["omc"], fields["depot"]]):
-        return jsonify({"success": False, "error": "OMC and DEPOT are required."}), 400
+        return "OMC and DEPOT are required.", 400
     if mode != "s_tax" and not fields["bdc"]:
-        return jsonify({"success": False, "error": "BDC is required for this order type."}), 400
+        return "BDC is required for this order type.", 400
+    return None
 
-    # Fetch order + client
+def _bdc_oid(mode, fields):
+    """BDC ObjectId for the update (None when S‑Tax). Returns (oid, error)."""
+    if mode == "s_tax":
+        return None, None
     try:
-        order = orders_collection.find_one({"_id": ObjectId(order_id)})
-    except Exception:
-        order = None
-    if not order:
-        return jsonify({"success": False, "error": "Order not found"}), 404
-
-    client_name = ""
-    try:
-        client = clients_collection.find_one({"_id": ObjectId(order.get("client_id"))})
-        client_name = client.get("name", "") if client else ""
-    except Exception:
-        pass
-
+        return ObjectId(fields["bdc"]), None
+    except (TypeError, errors.InvalidId):
+        return None, ("Invalid BDC ID", 400)
+
+def _build_order_update(order, mode, fields, client_name, bdc):
+    """
+    Apply the margin / total_debt / payment rules to one order.
+    `bdc` is the resolved BDC document (None when S‑Tax).
+    Returns (update_data, payment_entry, error) where error is (message, code) or None.
+    """
     # Parse numeric inputs
     p = _f(fields["p_bdc_omc"])   # P-BDC
     s = _f(fields["s_bdc_omc"])   # S-BDC
@@ -122,37 +209,30 @@ def update_order(order_id):
 
     # Validate based on order type
     if mode not in ("s_bdc", "s_tax", "combo"):
-        return jsonify({"success": False, "error": "Invalid order type."}), 400
+        return None, None, ("Invalid order type.", 400)
 
     if mode == "s_bdc":
         if s is None:
-            return jsonify({"success": False, "error": "S-BDC is required for S-BDC type."}), 400
+            return None, None, ("S-BDC is required for S-BDC type.", 400)
     elif mode == "s_tax":
         if s_tax is None:
-            return jsonify({"success": False, "error": "S-Tax is required for S-Tax type."}), 400
+            return None, None, ("S-Tax is required for S-Tax type.", 400)
     else:  # combo
         if s is None or s_tax is None:
-            return jsonify({"success": False, "error": "S-BDC and S-Tax are required for Combo type."}), 400
-
-    # Compute margins per L
-    margin_price = (s - p) if (s is not None and p is not None) else None
-    margin_tax = (s_tax - p_tax) if (s_tax is not None and p_tax is not None) else None
-
-    # Compute total debt by order type
-    if mode == "s_bdc":
-        total_debt = _nz(s) * q
-        active_margin = margin_price
-    elif mode == "s_tax":
-        total_debt = _nz(s_tax) * q
-        active_margin = margin_tax
-    else:  # combo
-        total_debt = (_nz(s) + _nz(s_tax)) * q
-        active_margin = margin_price  # display
+            return None, None, ("S-BDC and S-Tax are required for Combo type.", 400)
 
-    # Returns (always)
-    returns_sbdc = (_nz(s) * q) if (s is not None) else 0.0
-    returns_stax = (_nz(s_tax) * q) if (s_tax is not None) else 0.0
-    returns_total = returns_sbdc + returns_stax
+    # Margins per L, total debt by order type and returns (see pricing.compute_pricing)
+    priced = price_one({
+        "p_bdc_omc": p, "s_bdc_omc": s, "p_tax": p_tax, "s_tax": s_tax,
+        "quantity": q, "order_type": mode
+    })
+    margin_price = to_py(priced["margin_price"])
+    margin_tax = to_py(priced["margin_tax"])
+    active_margin = to_py(priced["margin"])
+    total_debt = priced["total_debt"]
+    returns_sbdc = priced["returns_sbdc"]
+    returns_stax = priced["returns_stax"]
+    returns_total = priced["returns_total"]
 
     # Build update doc
     update_data = {
@@ -182,69 +262,45 @@ def update_order(order_id):
         try:
             update_data["due_date"] = datetime.strptime(fields["due_date"], "%Y-%m-%d")
         except ValueError:
-            return jsonify({"success": False, "error": "Invalid date format"}), 400
+            return None, None, ("Invalid date format", 400)
     else:
         update_data["due_date"] = None
 
-    # BDC lookup & set only when not S‑Tax
-    bdc_id = None
+    # BDC set only when not S‑Tax
     if mode != "s_tax":
-        try:
-            bdc_id = ObjectId(fields["bdc"])
-        except (ValueError, errors.InvalidId):
-            return jsonify({"success": False, "error": "Invalid BDC ID"}), 400
-
-        bdc = bdc_collection.find_one({"_id": bdc_id})
         if not bdc:
-            return jsonify({"success": False, "error": "BDC not found"}), 404
-
-        update_data["bdc_id"] = bdc_id
+            return None, None, ("BDC not found", 404)
+        update_data["bdc_id"] = bdc["_id"]
         update_data["bdc_name"] = bdc.get("name", "")
 
     # ---------------------------
     # Payment handling
     # ---------------------------
     payment_type_norm = (fields["payment_type"] or "").strip().lower()
+    payment_entry = None
 
     # If order_type is S-Tax, ignore any posted payment fields (UI disables them)
     if mode != "s_tax" and payment_type_norm in ("cash", "from account", "credit"):
-        calc_amount = None
-
-        if payment_type_norm in ("cash", "from account", "credit"):
-            # UI now auto-fills qty × P-BDC for all three; validate P-BDC exists
-            if p is None:
-                return jsonify({"success": False, "error": "P-BDC is required to compute payment amount"}), 400
-            calc_amount = round(q * p, 2)
-
-        if calc_amount is not None:
-            payment_entry = {
-                "order_id": ObjectId(order_id),
-                "payment_type": fields["payment_type"],   # original case
-                "amount": calc_amount,
-                "client_name": client_name or "—",
-                "product": order.get("product", ""),
-                "vehicle_number": order.get("vehicle_number", ""),
-                "driver_name": order.get("driver_name", ""),
-                "driver_phone": order.get("driver_phone", ""),
-                "quantity": order.get("quantity", ""),
-                "region": order.get("region", ""),
-                "delivery_status": "pending",
-                "shareholder": fields["shareholder"] or None,
-                "date": datetime.utcnow()
-            }
-
-            # Push to ORDER
-            orders_collection.update_one(
-                {"_id": ObjectId(order_id)},
-                {"$push": {"payment_details": payment_entry}}
-            )
-
-            # Also push to BDC only if we have one (i.e., not S‑Tax)
-            if bdc_id:
-                bdc_collection.update_one(
-                    {"_id": bdc_id},
-                    {"$push": {"payment_details": payment_entry}}
-                )
+        # UI now auto-fills qty × P-BDC for all three; validate P-BDC exists
+        if p is None:
+            return None, None, ("P-BDC is required to compute payment amount", 400)
+        calc_amount = round(q * p, 2)
+
+        payment_entry = {
+            "order_id": order["_id"],
+            "payment_type": fields["payment_type"],   # original case
+            "amount": calc_amount,
+            "client_name": client_name or "—",
+            "product": order.get("product", ""),
+            "vehicle_number": order.get("vehicle_number", ""),
+            "driver_name": order.get("driver_name", ""),
+            "driver_phone": order.get("driver_phone", ""),
+            "quantity": order.get("quantity", ""),
+            "region": order.get("region", ""),
+            "delivery_status": "pending",
+            "shareholder": fields["shareholder"] or None,
+            "date": datetime.utcnow()
+        }
 
     # Status – approve if totals + margin exist as appropriate (independent of balance)
     complete_fields = (update_data.get("total_debt") is not None) and (
@@ -254,17 +310,184 @@ def update_order(order_id):
     update_data["status"] = "approved" if complete_fields else "pending"
     update_data["delivery_status"] = "pending"
 
+    return update_data, payment_entry, None
+
+@orders_bp.route('/update/<order_id>', methods=['POST'])
+def update_order(order_id):
+    if 'role' not in session or session['role'] not in ['admin', 'assistant']:
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+
+    mode, fields = _order_fields(request.form)
+
+    err = _check_required(mode, fields)
+    if err:
+        return jsonify({"success": False, "error": err[0]}), err[1]
+
+    # Fetch order + client
+    try:
+        order = orders_collection.find_one({"_id": ObjectId(order_id)})
+    except Exception:
+        order = None
+    if not order:
+        return jsonify({"success": False, "error": "Order not found"}), 404
+
+    client_name = ""
+    try:
+        client = clients_collection.find_one({"_id": ObjectId(order.get("client_id"))})
+        client_name = client.get("name", "") if client else ""
+    except Exception:
+        pass
+
+    # BDC lookup only when not S‑Tax
+    bdc_id, err = _bdc_oid(mode, fields)
+    if err:
+        return jsonify({"success": False, "error": err[0]}), err[1]
+    bdc = bdc_collection.find_one({"_id": bdc_id}) if bdc_id else None
+
+    update_data, payment_entry, err = _build_order_update(order, mode, fields, client_name, bdc)
+    if err:
+        return jsonify({"success": False, "error": err[0]}), err[1]
+
+    if payment_entry:
+        # Push to ORDER
+        orders_collection.update_one(
+            {"_id": ObjectId(order_id)},
+            {"$push": {"payment_details": payment_entry}}
+        )
+
+        # Also record against the BDC only if we have one (i.e., not S‑Tax), bumping its running total
+        if bdc_id:
+            record_payment(bdc_id, payment_entry)
+
     orders_collection.update_one({"_id": ObjectId(order_id)}, {"$set": update_data})
 
+    # Keep the materialized debtor balance row, monthly snapshots and client summary in step with the order
+    refresh_order_balance(ObjectId(order_id))
+    invalidate_snapshots(order.get("client_id"), order.get("date"))
+    refresh_client_summary(order.get("client_id"))
+
+    complete_fields = update_data["status"] == "approved"
     return jsonify({
         "success": True,
         "message": "Order updated" + (" and approved" if complete_fields else " (still pending)")
     })
 
+@orders_bp.route('/bulk_update', methods=['POST'])
+def bulk_update_orders():
+    """
+    Body: {"orders": [{"order_id": "...", <same fields as /update/<order_id>>}, ...]}
+    Prefetches every order, client and BDC with one query each, applies the same
+    rules as update_order, then commits with one bulk_write per collection.
+    An order_id repeated within the batch fails after its first occurrence.
+    Returns: {success, results: [{order_id, success, status | error}]}
+    """
+    if 'role' not in session or session['role'] not in ['admin', 'assistant']:
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+
+    data = request.get_json(force=True, silent=True) or {}
+    items = (data.get("orders") if isinstance(data, dict) else None) or []
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "error": "orders must be a non-empty list"}), 400
+
+    # Parse + basic validation (no DB yet)
+    results = []
+    parsed = []
+    seen = set()
+    for item in items:
+        err = _item_error(item)
+        raw_id = str(item.get("order_id") or "") if isinstance(item, dict) else ""
+        result = {"order_id": raw_id, "success": False}
+        results.append(result)
+        if err:
+            result["error"] = err[0]
+            continue
+
+        mode, fields = _order_fields(item)
+        err = _check_required(mode, fields)
+        bdc_id, bdc_err = (None, None) if err else _bdc_oid(mode, fields)
+        err = err or bdc_err
+        if not err and not ObjectId.is_valid(raw_id):
+            err = ("Order not found", 404)
+        if not err and ObjectId(raw_id) in seen:
+            err = ("Duplicate order_id in this batch", 400)
+        if err:
+            result["error"] = err[0]
+            continue
+        seen.add(ObjectId(raw_id))
+        parsed.append((result, ObjectId(raw_id), mode, fields, bdc_id))
+
+    # Prefetch orders, clients and BDCs (one query each)
+    order_map = {o["_id"]: o for o in orders_collection.find({"_id": {"$in": [x[1] for x in parsed]}})}
+
+    client_oids = set()
+    for o in order_map.values():
+        try:
+            client_oids.add(ObjectId(o.get("client_id")))
+        except (TypeError, errors.InvalidId):
+            pass
+    client_names = {
+        str(c["_id"]): c.get("name", "")
+        for c in clients_collection.find({"_id": {"$in": list(client_oids)}}, {"name": 1})
+    }
+    bdc_map = {
+        b["_id"]: b
+        for b in bdc_collection.find({"_id": {"$in": list({x[4] for x in parsed if x[4]})}}, {"name": 1})
+    }
+
+    order_ops, bdc_payments = [], []
+    touched = []
+    for result, oid, mode, fields, bdc_id in parsed:
+        order = order_map.get(oid)
+        if not order:
+            result["error"] = "Order not found"
+            continue
+
+        update_data, payment_entry, err = _build_order_update(
+            order, mode, fields, client_names.get(str(order.get("client_id")), ""),
+            bdc_map.get(bdc_id) if bdc_id else None
+        )
+        if err:
+            result["error"] = err[0]
+            continue
+
+        op = {"$set": update_data}
+        if payment_entry:
+            op["$push"] = {"payment_details": payment_entry}
+            if bdc_id:
+                bdc_payments.append((bdc_id, payment_entry))
+        order_ops.append(UpdateOne({"_id": oid}, op))
+
+        result["success"] = True
+        result["status"] = update_data["status"]
+        touched.append(order)
+
+    if order_ops:
+        orders_collection.bulk_write(order_ops, ordered=False)
+    record_payments(bdc_payments)
+
+    if touched:
+        # Keep the materialized debtor balance rows, monthly snapshots and client summaries in step (batched)
+        refresh_order_balances([o["_id"] for o in touched])
+        refresh_client_summaries({o.get("client_id") for o in touched})
+        earliest = {}
+        for o in touched:
+            d = o.get("date")
+            cid = o.get("client_id")
+            if isinstance(d, datetime) and (cid not in earliest or d < earliest[cid]):
+                earliest[cid] = d
+        for cid, d in earliest.items():
+            invalidate_snapshots(cid, d)
+
+    return jsonify({
+        "success": True,
+        "updated": len(touched),
+        "failed": len(results) - len(touched),
+        "results": results
+    })
+
 @orders_bp.route('/get_product_price', methods=['GET'])
 def get_product_price():
-    product_name = (request.args.get('name', '') or '').strip().lower()
-    product = products_collection.find_one({'name': {'$regex': f'^{product_name}$', '$options': 'i'}})
+    product = get_product(request.args.get('name', ''), fresh=True)
     if not product:
         return jsonify({'success': False, 'error': 'Product not found'}), 404
     return jsonify({
@@ -1,7 +1,12 @@
 from flask import Blueprint, render_template, jsonify, request
-from bson import ObjectId
-from datetime import datetime
+from bson import ObjectId, errors
+from datetime import datetime, timedelta
 from db import db
+from order_balances import refresh_balances_for_payment, refresh_balances_for_payments
+from balance_snapshots import invalidate_snapshots
+from bank_receipts import record_receipts, RECEIPT_PROJECTION
+from client_search import client_ids_matching
+from bulk_confirm import parse_items, confirm_many, MAX_BATCH
 
 # Collections
 payments_col = db["payments"]
@@ -10,110 +15,125 @@ clients_col = db["clients"]
 # Blueprint
 payments_bp = Blueprint("payments_bp", __name__)
 
-# GET: Load the payments page
-@payments_bp.route("/payments")
-def view_payments():
-    # Step 1: Fetch all payments sorted by date DESC
-    payment_docs = list(payments_col.find({}, {
-        "client_id": 1,
-        "amount": 1,
-        "bank_name": 1,
-        "status": 1,
-        "account_last4": 1,  # ✅ Include last 4 digits of account number
-        "proof_url": 1,
-        "date": 1
-    }).sort("date", -1))
-
-    # Step 2: Extract unique client ObjectIds
-    client_ids = list({
-        ObjectId(p["client_id"]) for p in payment_docs if p.get("client_id")
-    })
-
-    # Step 3: Batch-fetch all clients
-    clients = clients_col.find({"_id": {"$in": client_ids}})
-    client_map = {str(c["_id"]): c for c in clients}
-
-    # Step 4: Build the payments list with mapped client info
-    payments = []
-    for p in payment_docs:
-        raw_client_id = p.get("client_id")
-        str_client_id = str(raw_client_id) if raw_client_id else None
-        client = client_map.get(str_client_id)
+PAYMENTS_PAGE_SIZE = 50
+CLIENT_FILTER_LIMIT = 1000  # matching clients a client filter covers; beyond that the page says so
+PAYMENT_STATUSES = ("pending", "confirmed", "all")
+CONFIRM_PROJECTION = dict(RECEIPT_PROJECTION, client_id=1, order_id=1, order_ref=1)  # fields after_confirm needs
 
-        payments.append({
-            "_id": str(p["_id"]),
-            "client_name": client.get("name", "Unknown") if client else "Unknown",
-            "client_id_str": client.get("client_id", "Unknown") if client else "Unknown",
-            "phone": client.get("phone", "Unknown") if client else "Unknown",
-            "amount": float(p.get("amount", 0)),
-            "bank_name": p.get("bank_name", "-"),
-            "account_last4": p.get("account_last4", ""),  # ✅ Added here
-            "status": p.get("status", "pending"),
-            "proof_url": p.get("proof_url", "#"),
-            "date": p.get("date", "N/A")
-        })
+# Keyset pagination on (date desc, _id desc), with and without the usual filters
+payments_col.create_index([("date", -1), ("_id", -1)])
+payments_col.create_index([("status", 1), ("date", -1), ("_id", -1)])
+payments_col.create_index([("bank_name", 1), ("date", -1), ("_id", -1)])
 
-    return render_template("partials/payments.html", payments=payments)
+PAGE_PROJECTION = {
+    "client_id": 1,
+    "amount": 1,
+    "bank_name": 1,
+    "status": 1,
+    "account_last4": 1,  # ✅ Include last 4 digits of account number
+    "proof_url": 1,
+    "date": 1
+}
 
-# POST: Confirm payment
-@payments_bp.route("/confirm_payment/<payment_id>", methods=["POST"])
-def confirm_payment(payment_id):
+def _encode_cursor(payment):
+    """
+    Keyset cursor on (date, _id) of the last payment on a page. Payments without a
+    datetime `date` come after all dated ones, ordered by _id only: "_<id>".
+    """
+    d = payment.get("date")
+    if not isinstance(d, datetime):
+        return f"_{payment['_id']}"
+    return f"{d.isoformat()}_{payment['_id']}"
+
+def _decode_cursor(cursor):
+    """(date or None, ObjectId), or None for a malformed cursor."""
     try:
-        feedback = request.form.get("feedback", "").strip()
-        update_fields = {
-            "status": "confirmed",
-            "confirmed_at": datetime.now()
-        }
-        if feedback:
-            update_fields["feedback"] = feedback
+        d, oid = (cursor or "").rsplit("_", 1)
+        return (datetime.fromisoformat(d) if d else None), ObjectId(oid)
+    except (ValueError, errors.InvalidId):
+        return None
 
-        result = payments_col.update_one(
-            {"_id": ObjectId(payment_id)},
-            {"$set": update_fields}
-        )
+def _payment_filters(args):
+    """
+    Filters from the query string: status (default pending), bank, client, from, to.
+    A client filter is resolved to client_ids here (prefix match on the clients'
+    search_keys index); client_truncated flags more matches than CLIENT_FILTER_LIMIT.
+    """
+    status = (args.get("status") or "pending").strip().lower()
+    if status not in PAYMENT_STATUSES:
+        status = "pending"
+    filters = {
+        "status": status,
+        "bank": (args.get("bank") or "").strip(),
+        "client": (args.get("client") or "").strip(),
+        "from": (args.get("from") or "").strip(),
+        "to": (args.get("to") or "").strip(),
+        "client_ids": None,
+        "client_truncated": False
+    }
+    if filters["client"]:
+        filters["client_ids"], filters["client_truncated"] = client_ids_matching(filters["client"], CLIENT_FILTER_LIMIT)
+    return filters
 
-        if result.modified_count == 1:
-            return jsonify({"success": True})
-        else:
-            return jsonify({"success": False, "error": "No matching payment found."})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)})
-from flask import Blueprint, render_template, jsonify, request
-from bson import ObjectId
-from datetime import datetime
-from db import db
+def _payments_query(filters):
+    query = {}
+    if filters["status"] != "all":
+        query["status"] = filters["status"]
+    if filters["bank"]:
+        query["bank_name"] = filters["bank"]
+    if filters["client"]:
+        # Payments may hold the id as ObjectId or str
+        ids = filters["client_ids"] or []
+        query["client_id"] = {"$in": ids + [str(i) for i in ids]}
+    date_q = {}
+    try:
+        if filters["from"]:
+            date_q["$gte"] = datetime.strptime(filters["from"], "%Y-%m-%d")
+        if filters["to"]:
+            date_q["$lt"] = datetime.strptime(filters["to"], "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        pass
+    if date_q:
+        query["date"] = date_q
+    return query
 
-# Collections
-payments_col = db["payments"]
-clients_col = db["clients"]
+def _payments_page(filters, cursor=None, page_size=PAYMENTS_PAGE_SIZE):
+    """
+    One page of payments matching `filters`, newest first, continuing after `cursor`.
+    Clients for the page are fetched with a single $in query. Returns (payments, next_cursor).
+    """
+    query = _payments_query(filters)
+    after = _decode_cursor(cursor) if cursor else None
+    payment_docs = []
+    if not after or after[0] is not None:
+        conds = [query, {"date": {"$type": "date"}}]
+        if after:
+            d, oid = after
+            conds.append({"$or": [{"date": {"$lt": d}}, {"date": d, "_id": {"$lt": oid}}]})
+        payment_docs = list(payments_col.find({"$and": conds}, PAGE_PROJECTION)
+                            .sort([("date", -1), ("_id", -1)]).limit(page_size + 1))
 
-# Blueprint
-payments_bp = Blueprint("payments_bp", __name__)
+    # Dated payments exhausted: continue with undated ones by _id (never inside a date range)
+    if len(payment_docs) <= page_size and "date" not in query:
+        conds = [query, {"date": {"$not": {"$type": "date"}}}]
+        if after and after[0] is None:
+            conds.append({"_id": {"$lt": after[1]}})
+        payment_docs += list(payments_col.find({"$and": conds}, PAGE_PROJECTION)
+                             .sort("_id", -1).limit(page_size + 1 - len(payment_docs)))
+    has_more = len(payment_docs) > page_size
+    payment_docs = payment_docs[:page_size]
+
+    client_ids = set()
+    for p in payment_docs:
+        try:
+            client_ids.add(ObjectId(p.get("client_id")))
+        except (TypeError, errors.InvalidId):
+            pass
+    client_map = {
+        str(c["_id"]): c
+        for c in clients_col.find({"_id": {"$in": list(client_ids)}}, {"name": 1, "client_id": 1, "phone": 1})
+    }
 
-# GET: Load the payments page
-@payments_bp.route("/payments")
-def view_payments():
-    # Step 1: Fetch all payments sorted by date DESC
-    payment_docs = list(payments_col.find({}, {
-        "client_id": 1,
-        "amount": 1,
-        "bank_name": 1,
-        "status": 1,
-        "account_last4": 1,  # ✅ Include last 4 digits of account number
-        "proof_url": 1,
-        "date": 1
-    }).sort("date", -1))
-
-    # Step 2: Extract unique client ObjectIds
-    client_ids = list({
-        ObjectId(p["client_id"]) for p in payment_docs if p.get("client_id")
-    })
-
-    # Step 3: Batch-fetch all clients
-    clients = clients_col.find({"_id": {"$in": client_ids}})
-    client_map = {str(c["_id"]): c for c in clients}
-
-    # Step 4: Build the payments list with mapped client info
     payments = []
     for p in payment_docs:
         raw_client_id = p.get("client_id")
@@ -133,7 +153,31 @@ def view_payments():
             "date": p.get("date", "N/A")
         })
 
-    return render_template("partials/payments.html", payments=payments)
+    next_cursor = _encode_cursor(payment_docs[-1]) if (has_more and payment_docs) else None
+    return payments, next_cursor
+
+# GET: Load the payments page (first page; more via /payments/page.json)
+@payments_bp.route("/payments")
+def view_payments():
+    filters = _payment_filters(request.args)
+    payments, next_cursor = _payments_page(filters)
+    banks = sorted(b for b in payments_col.distinct("bank_name") if b)
+    return render_template(
+        "partials/payments.html",
+        payments=payments,
+        next_cursor=next_cursor,
+        filters=filters,
+        banks=banks,
+        client_filter_limit=CLIENT_FILTER_LIMIT
+    )
+
+# GET: Next page of the payments queue as rendered rows
+@payments_bp.route("/payments/page.json")
+def payments_page_json():
+    filters = _payment_filters(request.args)
+    payments, next_cursor = _payments_page(filters, request.args.get("cursor"))
+    html = render_template("partials/payment_rows.html", payments=payments)
+    return jsonify({"html": html, "next_cursor": next_cursor})
 
 # POST: Confirm payment
 @payments_bp.route("/confirm_payment/<payment_id>", methods=["POST"])
@@ -147,14 +191,70 @@ def confirm_payment(payment_id):
         if feedback:
             update_fields["feedback"] = feedback
 
-        result = payments_col.update_one(
-            {"_id": ObjectId(payment_id)},
-            {"$set": update_fields}
+        # Only a pending -> confirmed transition updates the derived totals
+        payment = payments_col.find_one_and_update(
+            {"_id": ObjectId(payment_id), "status": {"$ne": "confirmed"}},
+            {"$set": update_fields},
+            projection=CONFIRM_PROJECTION
         )
 
-        if result.modified_count == 1:
+        if payment:
+            # Keep the materialized debtor balance row, monthly snapshots and bank receipts in step with the payment
+            refresh_balances_for_payment(payment)
+            record_receipts([payment])
+            invalidate_snapshots(payment.get("client_id"), payment.get("date"))
+            return jsonify({"success": True})
+        elif payments_col.count_documents({"_id": ObjectId(payment_id)}, limit=1):
+            if feedback:
+                payments_col.update_one({"_id": ObjectId(payment_id)}, {"$set": {"feedback": feedback}})
             return jsonify({"success": True})
         else:
             return jsonify({"success": False, "error": "No matching payment found."})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
+
+def after_confirm(confirmed):
+    """
+    Derived updates for a batch of newly confirmed payments (read with
+    CONFIRM_PROJECTION): one order-balance refresh, one bank receipts rollup write,
+    and snapshots invalidated once per client from its earliest payment.
+    """
+    refresh_balances_for_payments(confirmed)
+    record_receipts(confirmed)
+    earliest = {}
+    for p in confirmed:
+        key = str(p.get("client_id"))
+        d = p.get("date")
+        if isinstance(d, datetime) and (key not in earliest or d < earliest[key][1]):
+            earliest[key] = (p.get("client_id"), d)
+    for client_id, since in earliest.values():
+        invalidate_snapshots(client_id, since)
+
+# POST: Confirm many payments at once
+@payments_bp.route("/confirm_payments", methods=["POST"])
+def confirm_payments():
+    """
+    Body: {"payments": [{"id", "feedback"}, ...]} or {"ids": [...], "feedback": "..."}.
+    One bulk_write for the batch; order balances are refreshed in one pass and
+    snapshots invalidated once per affected client.
+    """
+    try:
+        items = parse_items(request)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    try:
+        if not items:
+            return jsonify({"success": False, "error": "No payment ids given."}), 400
+        if len(items) > MAX_BATCH:
+            return jsonify({"success": False, "error": f"At most {MAX_BATCH} payments per request."}), 400
+
+        results, confirmed = confirm_many(
+            payments_col, items,
+            CONFIRM_PROJECTION,
+            {"confirmed_at": datetime.now()}
+        )
+
+        after_confirm(confirmed)
+        return jsonify({"success": True, "confirmed": len(confirmed), "results": results})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
@@ -0,0 +1,82 @@
+import numpy as np
+
+# Order types (see orders.update_order); orders without one are treated as combo
+MODES = ("s_bdc", "s_tax", "combo")
+
+# ---------- Helpers ----------
+def _f(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _column(orders, key):
+    vals = [o.get(key) for o in orders]
+    try:
+        # Fast path: numbers, numeric strings and None (-> NaN) convert in C
+        return np.array(vals, dtype=float)
+    except (TypeError, ValueError):
+        return np.fromiter((_f(v) for v in vals), dtype=float, count=len(vals))
+
+def to_py(v, nan=None, ndigits=2):
+    """Rounded Python float for templates/JSON; NaN becomes `nan`."""
+    v = float(v)
+    return nan if np.isnan(v) else round(v, ndigits)
+
+# ---------- Engine ----------
+def compute_pricing(orders):
+    """
+    Derived figures for a batch of order dicts, one NumPy pass per column.
+    Missing / non-numeric inputs are NaN. Returns a dict of float arrays:
+      margin_price   S-BDC - P-BDC                     (NaN unless both present)
+      margin_tax     S-Tax - P-Tax                     (NaN unless both present)
+      margin         active margin by order type       (s_tax -> margin_tax, else margin_price)
+      returns_sbdc   S-BDC × Q                         (0 when S-BDC missing)
+      returns_stax   S-Tax × Q                         (0 when S-Tax missing)
+      returns_total  returns_sbdc + returns_stax
+      total_debt     by type: S-BDC×Q | S-Tax×Q | (S-BDC + S-Tax)×Q   (missing prices count as 0)
+      margin_eff     stored `margin` when present, else the active margin, else 0
+      margin_returns margin_eff × Q
+      quantity       Q (0 when missing)
+    """
+    n = len(orders)
+    p     = _column(orders, "p_bdc_omc")
+    s     = _column(orders, "s_bdc_omc")
+    p_tax = _column(orders, "p_tax")
+    s_tax = _column(orders, "s_tax")
+    q     = np.nan_to_num(_column(orders, "quantity"), nan=0.0)
+    stored_margin = _column(orders, "margin")
+
+    modes = [(o.get("order_type") or "combo").strip().lower() for o in orders]
+    is_stax = np.fromiter((m == "s_tax" for m in modes), dtype=bool, count=n)
+    is_sbdc = np.fromiter((m == "s_bdc" for m in modes), dtype=bool, count=n)
+
+    margin_price = s - p
+    margin_tax = s_tax - p_tax
+    margin = np.where(is_stax, margin_tax, margin_price)
+
+    s0 = np.nan_to_num(s, nan=0.0)
+    st0 = np.nan_to_num(s_tax, nan=0.0)
+    returns_sbdc = s0 * q
+    returns_stax = st0 * q
+
+    total_debt = np.where(is_sbdc, returns_sbdc, np.where(is_stax, returns_stax, (s0 + st0) * q))
+
+    margin_eff = np.where(np.isnan(stored_margin), np.nan_to_num(margin, nan=0.0), stored_margin)
+
+    return {
+        "margin_price": margin_price,
+        "margin_tax": margin_tax,
+        "margin": margin,
+        "returns_sbdc": returns_sbdc,
+        "returns_stax": returns_stax,
+        "returns_total": returns_sbdc + returns_stax,
+        "total_debt": total_debt,
+        "margin_eff": margin_eff,
+        "margin_returns": margin_eff * q,
+        "quantity": q,
+    }
+
+def price_one(order):
+    """compute_pricing for a single order dict; returns plain floats (NaN for missing)."""
+    return {k: float(v[0]) for k, v in compute_pricing([order]).items()}
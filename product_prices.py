@@ -0,0 +1,168 @@
+from pymongo import UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from bson import ObjectId
+from datetime import datetime
+from threading import Lock
+import re, sys, time
+
+from db import db
+
+# 📦 Collections
+products_col = db["products"]
+price_history_col = db["product_price_history"]  # one row per price change
+
+price_history_col.create_index([("product_id", ASCENDING), ("timestamp", DESCENDING)], unique=True)
+
+SERIES_UNITS = ("day", "week")
+
+CACHE_TTL = 60  # seconds; writes in this process invalidate immediately, other workers may lag
+
+_cache = {}
+_cache_lock = Lock()
+
+# ---------- Keys ----------
+def name_key(name):
+    """Normalized product name: trimmed, single-spaced, lowercase."""
+    return re.sub(r"\s+", " ", (name or "").strip()).lower()
+
+def ensure_name_keys():
+    """Set name_key on products that predate it. Returns the number of products updated."""
+    ops = [
+        UpdateOne({"_id": p["_id"]}, {"$set": {"name_key": name_key(p.get("name"))}})
+        for p in products_col.find({"name_key": {"$exists": False}}, {"name": 1})
+    ]
+    if not ops:
+        return 0
+    return products_col.bulk_write(ops, ordered=False).modified_count
+
+def ensure_name_key_index():
+    """Unique index on name_key. Returns False if two products normalize to the same name."""
+    try:
+        products_col.create_index("name_key", unique=True)
+        return True
+    except OperationFailure as e:
+        # Lookups still work, uniqueness is not enforced until the duplicates are renamed
+        print("⚠️ products.name_key index not created:", e)
+        return False
+
+# ---------- Cache ----------
+def invalidate_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def get_product(name, fresh=False):
+    """
+    Read-through cached lookup by normalized name (exact match on the name_key index).
+    Other workers' cached prices can lag a price update by up to CACHE_TTL, so pass
+    fresh=True where the price gets stored (order snapshots) to skip the cache read.
+    Returns {"_id", "name", "s_price", "p_price"} or None.
+    """
+    key = name_key(name)
+    if not key:
+        return None
+
+    now = time.monotonic()
+    if not fresh:
+        with _cache_lock:
+            hit = _cache.get(key)
+            if hit and now - hit[0] <= CACHE_TTL:
+                return hit[1]
+
+    doc = products_col.find_one({"name_key": key}, {"name": 1, "s_price": 1, "p_price": 1})
+    if doc:
+        with _cache_lock:
+            _cache[key] = (now, doc)
+    return doc
+
+# ---------- Price history ----------
+def record_price(product_id, s_price, p_price, timestamp=None):
+    """Append one price point for a product."""
+    price_history_col.update_one(
+        {"product_id": ObjectId(product_id), "timestamp": timestamp or datetime.utcnow()},
+        {"$set": {"s_price": s_price, "p_price": p_price}},
+        upsert=True
+    )
+
+def price_at(product_id, when):
+    """Price in effect at `when` (latest point at or before it): one index seek."""
+    return price_history_col.find_one(
+        {"product_id": ObjectId(product_id), "timestamp": {"$lte": when}},
+        {"_id": 0, "s_price": 1, "p_price": 1, "timestamp": 1},
+        sort=[("timestamp", -1)]
+    )
+
+def price_series(product_ids, unit="day", start=None, end=None):
+    """
+    Chart series downsampled to one point per day/week (the last price in each bucket).
+    Returns {product_id(str): [{date, s_price, p_price}, ...]} oldest first.
+    """
+    unit = unit if unit in SERIES_UNITS else "day"
+    match = {"product_id": {"$in": [ObjectId(pid) for pid in product_ids]}}
+    if start or end:
+        match["timestamp"] = {}
+        if start:
+            match["timestamp"]["$gte"] = start
+        if end:
+            match["timestamp"]["$lte"] = end
+
+    series = {str(pid): [] for pid in product_ids}
+    for r in price_history_col.aggregate([
+        {"$match": match},
+        {"$sort": {"product_id": 1, "timestamp": 1}},
+        {"$group": {
+            "_id": {
+                "product_id": "$product_id",
+                "bucket": {"$dateTrunc": {"date": "$timestamp", "unit": unit}}
+            },
+            "s_price": {"$last": "$s_price"},
+            "p_price": {"$last": "$p_price"}
+        }},
+        {"$sort": {"_id.product_id": 1, "_id.bucket": 1}}
+    ]):
+        series.setdefault(str(r["_id"]["product_id"]), []).append({
+            "date": r["_id"]["bucket"].strftime("%Y-%m-%d"),
+            "s_price": r.get("s_price"),
+            "p_price": r.get("p_price")
+        })
+    return series
+
+def migrate_embedded_history(batch_size=1000):
+    """
+    Move products.price_history arrays into product_price_history, then drop the arrays.
+    Idempotent (upsert on product_id + timestamp). Returns the number of points moved.
+    """
+    moved = 0
+    for p in products_col.find({"price_history": {"$exists": True}}, {"price_history": 1, "date_added": 1}):
+        ops = []
+        for entry in p.get("price_history") or []:
+            ts = entry.get("timestamp")
+            if not isinstance(ts, datetime):
+                try:
+                    ts = datetime.fromisoformat(str(ts))
+                except Exception:
+                    ts = p.get("date_added") or datetime.utcnow()
+            ops.append(UpdateOne(
+                {"product_id": p["_id"], "timestamp": ts},
+                {"$set": {"s_price": entry.get("s_price"), "p_price": entry.get("p_price")}},
+                upsert=True
+            ))
+            if len(ops) >= batch_size:
+                price_history_col.bulk_write(ops, ordered=False)
+                moved += len(ops)
+                ops = []
+        if ops:
+            price_history_col.bulk_write(ops, ordered=False)
+            moved += len(ops)
+        products_col.update_one({"_id": p["_id"]}, {"$unset": {"price_history": ""}})
+    return moved
+
+
+if __name__ == "__main__":
+    # Usage: python product_prices.py migrate
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        print(f"✅ Set name_key on {ensure_name_keys()} products.")
+        if ensure_name_key_index():
+            print("✅ products.name_key unique index in place.")
+        print(f"✅ Moved {migrate_embedded_history()} price points to product_price_history.")
+    else:
+        print("Usage: python product_prices.py migrate")
@@ -2,44 +2,18 @@ from flask import Blueprint, render_template, request, jsonify
 from bson import ObjectId
 from datetime import datetime
 from db import db
-import re
+
+from product_prices import name_key, invalidate_cache, record_price, price_at, price_series
+from client_contacts import HAS_WA
+from sms_outbox import enqueue_many
 
 products_bp = Blueprint("products", __name__, template_folder="templates")
 products_collection = db["products"]
 clients_collection  = db["clients"]  # NEW: we’ll read clients + phone numbers
 
-# -------------------- helpers --------------------
-
-_GH_DEFAULT_CC = "233"  # Ghana (change if needed)
-
-def _digits_only(s: str) -> str:
-    return re.sub(r"\D+", "", s or "")
+SHARE_CLIENTS_PAGE = 200
 
-def _normalize_msisdn(raw: str, default_cc: str = _GH_DEFAULT_CC) -> str | None:
-    """
-    Return E.164-like digits WITHOUT '+' (for wa.me). Examples:
-      '0541234567'   -> '233541234567'
-      '+233541234567'-> '233541234567'
-      '541234567'    -> '233541234567'  (assume local GSM without 0)
-    """
-    if not raw:
-        return None
-    d = _digits_only(raw)
-    if not d:
-        return None
-    # Already has country code (length >= 11 and not starting with '0')
-    if d.startswith(default_cc):
-        return d
-    # Local starting with 0: drop 0 and prepend CC
-    if d.startswith("0") and len(d) >= 10:
-        return default_cc + d[1:]
-    # Bare 9-digit local (e.g., 54xxxxxxx): prepend CC
-    if len(d) in (9,):
-        return default_cc + d
-    # If looks like an international number with another CC, accept as-is
-    if len(d) >= 11 and not d.startswith("0"):
-        return d
-    return None
+# -------------------- helpers --------------------
 
 def _format_money(v):
     try:
@@ -55,27 +29,14 @@ def manage_products():
 # 📥 Load Products via AJAX
 @products_bp.route("/products/load", methods=["GET"])
 def load_products():
-    products = list(products_collection.find().sort("date_added", -1))
+    # Latest prices from the product docs; chart series downsampled from product_price_history
+    resolution = request.args.get("resolution", "day")
+    products = list(products_collection.find({}, {"price_history": 0}).sort("date_added", -1))
+    series = price_series([p["_id"] for p in products], unit=resolution)
     for p in products:
         p["_id"] = str(p["_id"])
         p["date_added"] = p.get("date_added", datetime.utcnow()).strftime("%Y-%m-%d")
-
-        # Format price history timestamps to date strings for chart labels
-        formatted_history = []
-        for entry in p.get("price_history", []):
-            ts = entry.get("timestamp") or datetime.utcnow()
-            if not isinstance(ts, datetime):
-                # in case it was stored as number/string
-                try:
-                    ts = datetime.fromisoformat(str(ts))
-                except Exception:
-                    ts = datetime.utcnow()
-            formatted_history.append({
-                "s_price": entry.get("s_price"),
-                "p_price": entry.get("p_price"),
-                "date": ts.strftime("%Y-%m-%d")
-            })
-        p["price_history"] = formatted_history
+        p["price_history"] = series.get(p["_id"], [])
 
     return jsonify(products)
 
@@ -97,21 +58,22 @@ def add_product():
     except Exception:
         return jsonify({"success": False, "message": "Prices must be numeric."}), 400
 
+    if products_collection.find_one({"name_key": name_key(name)}, {"_id": 1}):
+        return jsonify({"success": False, "message": "Product already exists."}), 400
+
     now = datetime.utcnow()
     product = {
         "name": name,
+        "name_key": name_key(name),
         "description": description,
         "s_price": s_price,
         "p_price": p_price,
-        "date_added": now,
-        "price_history": [{
-            "s_price": s_price,
-            "p_price": p_price,
-            "timestamp": now
-        }]
+        "date_added": now
     }
 
     result = products_collection.insert_one(product)
+    record_price(result.inserted_id, s_price, p_price, now)
+    invalidate_cache()
     product["_id"] = str(result.inserted_id)
     product["date_added"] = now.strftime("%Y-%m-%d")
 
@@ -125,6 +87,7 @@ def delete_product(product_id):
     except Exception:
         return jsonify({"success": False, "message": "Invalid product id."}), 400
     result = products_collection.delete_one({"_id": oid})
+    invalidate_cache()
     return jsonify({"success": result.deleted_count == 1})
 
 # ✏️ Update Product and Append to Price History
@@ -147,9 +110,13 @@ def update_product(product_id):
     except Exception:
         return jsonify({"success": False, "message": "Prices must be numeric."}), 400
 
+    if products_collection.find_one({"name_key": name_key(name), "_id": {"$ne": oid}}, {"_id": 1}):
+        return jsonify({"success": False, "message": "Another product already has this name."}), 400
+
     now = datetime.utcnow()
     update_fields = {
         "name": name,
+        "name_key": name_key(name),
         "description": description,
         "s_price": s_price,
         "p_price": p_price
@@ -157,71 +124,109 @@ def update_product(product_id):
 
     result = products_collection.update_one(
         {"_id": oid},
-        {
-            "$set": update_fields,
-            "$push": {
-                "price_history": {
-                    "s_price": s_price,
-                    "p_price": p_price,
-                    "timestamp": now
-                }
-            }
-        }
+        {"$set": update_fields}
     )
+    if result.matched_count:
+        record_price(oid, s_price, p_price, now)
+    invalidate_cache()
 
     return jsonify({"success": result.modified_count == 1})
 
+# 🕒 Price in effect at a date
+@products_bp.route("/products/<product_id>/price_at", methods=["GET"])
+def product_price_at(product_id):
+    """?date=YYYY-MM-DD (defaults to now) -> price as of the end of that day."""
+    try:
+        oid = ObjectId(product_id)
+    except Exception:
+        return jsonify({"success": False, "message": "Invalid product id."}), 400
+
+    date_str = (request.args.get("date") or "").strip()
+    try:
+        when = datetime.strptime(date_str, "%Y-%m-%d").replace(hour=23, minute=59, second=59) if date_str else datetime.utcnow()
+    except ValueError:
+        return jsonify({"success": False, "message": "date must be YYYY-MM-DD."}), 400
+
+    point = price_at(oid, when)
+    if not point:
+        return jsonify({"success": False, "message": "No price recorded on or before this date."}), 404
+    return jsonify({
+        "success": True,
+        "s_price": point.get("s_price"),
+        "p_price": point.get("p_price"),
+        "since": point["timestamp"].strftime("%Y-%m-%d %H:%M")
+    })
+
+# 📈 Price history over a date range
+@products_bp.route("/products/<product_id>/history", methods=["GET"])
+def product_price_history(product_id):
+    """?start=YYYY-MM-DD&end=YYYY-MM-DD&resolution=day|week"""
+    try:
+        oid = ObjectId(product_id)
+    except Exception:
+        return jsonify({"success": False, "message": "Invalid product id."}), 400
+
+    try:
+        start = datetime.strptime(request.args["start"], "%Y-%m-%d") if request.args.get("start") else None
+        end = datetime.strptime(request.args["end"], "%Y-%m-%d").replace(hour=23, minute=59, second=59) if request.args.get("end") else None
+    except ValueError:
+        return jsonify({"success": False, "message": "Dates must be YYYY-MM-DD."}), 400
+
+    series = price_series([oid], unit=request.args.get("resolution", "day"), start=start, end=end)
+    return jsonify({"success": True, "history": series.get(product_id, [])})
+
 # -------------------------------------------------
 # NEW: Clients list for WhatsApp share modal
 # -------------------------------------------------
 @products_bp.route("/products/clients", methods=["GET"])
 def list_clients_for_share():
     """
-    Returns [{_id, name, phones: [raw], wa_numbers:[digits], primary_wa: '2335...'}]
-    We try to extract numbers from common fields.
+    ?cursor=<name>|<id>&limit=N ->
+    { clients: [{_id, name, wa_numbers:[digits], primary_wa: '2335...'}], next_cursor }
+    Numbers are normalized when the client is written (client_contacts.contact_fields);
+    only clients with a WhatsApp number are read, by name, via a partial index.
+    Clients without a string name come last, by _id only (cursor "<id>").
     """
-    docs = list(clients_collection.find({}, {
-        "name": 1,
-        "client_id": 1,
-        "phone": 1,
-        "phone_number": 1,
-        "whatsapp": 1,
-        "mobile": 1,
-        "phones": 1
-    }).sort("name", 1))
-
-    results = []
-    for d in docs:
-        cid = str(d.get("_id"))
-        name = d.get("name") or d.get("client_id") or cid
-
-        raw_list = []
-        for key in ("phone", "phone_number", "whatsapp", "mobile"):
-            v = d.get(key)
-            if isinstance(v, str) and v.strip():
-                raw_list.append(v.strip())
-        if isinstance(d.get("phones"), list):
-            for v in d["phones"]:
-                if isinstance(v, str) and v.strip():
-                    raw_list.append(v.strip())
-
-        wa_numbers = []
-        for raw in raw_list:
-            n = _normalize_msisdn(raw)
-            if n and n not in wa_numbers:
-                wa_numbers.append(n)
-
-        results.append({
-            "_id": cid,
-            "name": name,
-            "phones": raw_list,
-            "wa_numbers": wa_numbers,
-            "primary_wa": wa_numbers[0] if wa_numbers else None
-        })
-
-    # Keep only clients that have at least one WhatsAppable number
-    results = [r for r in results if r["primary_wa"]]
-    return jsonify(results)
+    try:
+        limit = min(max(int(request.args.get("limit", SHARE_CLIENTS_PAGE)), 1), 1000)
+    except ValueError:
+        limit = SHARE_CLIENTS_PAGE
+
+    name, sep, last_id = (request.args.get("cursor") or "").rpartition("|")
+    if last_id and not ObjectId.is_valid(last_id):
+        return jsonify({"success": False, "message": "Invalid cursor."}), 400
+    projection = {"name": 1, "client_id": 1, "wa_numbers": 1, "primary_wa": 1}
+
+    docs = []
+    if sep or not last_id:
+        query = dict(HAS_WA, name={"$type": "string"})
+        if last_id:
+            query["$or"] = [
+                {"name": {"$gt": name}},
+                {"name": name, "_id": {"$gt": ObjectId(last_id)}}
+            ]
+        docs = list(clients_collection.find(query, projection).sort([("name", 1), ("_id", 1)]).limit(limit + 1))
+
+    # Named clients exhausted: continue with unnamed ones by _id
+    if len(docs) <= limit:
+        query = dict(HAS_WA, name={"$not": {"$type": "string"}})
+        if last_id and not sep:
+            query["_id"] = {"$gt": ObjectId(last_id)}
+        docs += list(clients_collection.find(query, projection).sort("_id", 1).limit(limit + 1 - len(docs)))
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = f"{last['name']}|{last['_id']}" if isinstance(last.get("name"), str) else str(last["_id"])
+
+    results = [{
+        "_id": str(d["_id"]),
+        "name": d.get("name") or d.get("client_id") or str(d["_id"]),
+        "wa_numbers": d.get("wa_numbers") or [],
+        "primary_wa": d["primary_wa"]
+    } for d in docs]
+    return jsonify({"clients": results, "next_cursor": next_cursor})
 
 # -------------------------------------------------
 # NEW: Default share message for a product
@@ -289,36 +294,15 @@ def build_share_links():
     if not oids:
         return jsonify({"success": False, "message": "No valid client ids."}), 400
 
-    docs = list(clients_collection.find({"_id": {"$in": oids}}, {
-        "name":1, "phone":1, "phone_number":1, "whatsapp":1, "mobile":1, "phones":1
-    }))
+    docs = list(clients_collection.find(
+        dict(HAS_WA, _id={"$in": oids}), {"name": 1, "primary_wa": 1}
+    ))
 
     links = []
     for d in docs:
         cid = str(d["_id"])
         name = d.get("name") or cid
-
-        # collect phones
-        raw_list = []
-        for key in ("phone", "phone_number", "whatsapp", "mobile"):
-            v = d.get(key)
-            if isinstance(v, str) and v.strip():
-                raw_list.append(v.strip())
-        if isinstance(d.get("phones"), list):
-            for v in d["phones"]:
-                if isinstance(v, str) and v.strip():
-                    raw_list.append(v.strip())
-
-        # choose first whatsapp-able number
-        wa_number = None
-        for raw in raw_list:
-            n = _normalize_msisdn(raw)
-            if n:
-                wa_number = n
-                break
-
-        if not wa_number:
-            continue
+        wa_number = d["primary_wa"]
 
         # Build wa.me URL
         # (encode on the frontend or do a simple safe replace here)
@@ -336,4 +320,44 @@ def build_share_links():
 
     return jsonify({"success": True, "links": links, "message": custom_msg})
 
+# -------------------------------------------------
+# NEW: Broadcast product price by SMS (queued)
+# -------------------------------------------------
+@products_bp.route("/products/share/sms", methods=["POST"])
+def broadcast_price_sms():
+    """
+    Body: { "product_id": "...", "message": "optional custom text", "client_ids": ["...", ...] }
+    Queues one SMS per selected client with a number and returns immediately:
+    { success, queued, skipped }. Delivery runs on the sms_outbox worker.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    product_id = data.get("product_id")
+    custom_msg = (data.get("message") or "").strip()
+    client_ids = data.get("client_ids") or []
 
+    if not product_id or not client_ids:
+        return jsonify({"success": False, "message": "product_id and client_ids are required"}), 400
+
+    try:
+        p = products_collection.find_one({"_id": ObjectId(product_id)}, {"name":1, "s_price":1})
+    except Exception:
+        p = None
+    if not p:
+        return jsonify({"success": False, "message": "Product not found"}), 404
+
+    if not custom_msg:
+        name = p.get("name") or "Product"
+        s_price = _format_money(p.get("s_price"))
+        custom_msg = f"This is the price for {name}: {s_price:.2f}"
+
+    oids = [ObjectId(cid) for cid in client_ids if ObjectId.is_valid(cid)]
+    if not oids:
+        return jsonify({"success": False, "message": "No valid client ids."}), 400
+
+    docs = clients_collection.find(dict(HAS_WA, _id={"$in": oids}), {"primary_wa": 1})
+    queued, skipped = enqueue_many(
+        [(d["primary_wa"], custom_msg, {"client_id": str(d["_id"]), "product_id": product_id}) for d in docs],
+        kind="price_broadcast"
+    )
+    skipped += len(oids) - queued - skipped  # selected clients without a number
+    return jsonify({"success": queued > 0, "queued": queued, "skipped": skipped, "message": custom_msg})
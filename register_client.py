@@ -1,13 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, flash, session, jsonify
 from datetime import datetime
 from db import db
-import requests
-from urllib.parse import quote
+from client_search import search_fields, invalidate_cache
+from client_contacts import contact_fields
+from sms_outbox import enqueue_sms
 
 register_client_bp = Blueprint('register_client', __name__, template_folder='templates')
 clients_collection = db.clients
 
-ARKESEL_API_KEY = "c1JKV21keG1DdnJZQW1zc2JpVks"
 DEFAULT_IMAGE_URL = "https://cdn-icons-png.flaticon.com/256/3135/3135715.png"
 
 # ✅ Generate unique client ID in format TTYYXXX####
@@ -19,41 +19,23 @@ def generate_unique_client_id(phone):
     suffix = str(count + 1).zfill(4)
     return f"{prefix}{suffix}"
 
-# ✅ Send SMS with Arkesel
+# ✅ Queue registration SMS (sent by the outbox worker; the request never waits on Arkesel)
 def send_registration_sms(name, phone, client_id):
-    try:
-        phone_number = phone.strip().replace(" ", "").replace("-", "")
-        if phone_number.startswith("0") and len(phone_number) == 10:
-            phone_number = "233" + phone_number[1:]
-        if not phone_number.startswith("233") or len(phone_number) != 12:
-            print("❌ Invalid phone number for SMS:", phone)
-            return False
-
-        first_name = name.split()[0] if name else "Client"
-        message = (
-            f"Welcome to TrueType Services, {first_name}!\n\n"
-            f"Your account has been successfully created.\n"
-            f"Login Details:\n"
-            f"Client ID: {client_id}\n"
-            f"Password: {phone}\n\n"
-            f"Use these to log in at https://truetypegh.com/login\n"
-            f"Thank you!"
-        )
-
-        sms_url = (
-            "https://sms.arkesel.com/sms/api?action=send-sms"
-            f"&api_key={ARKESEL_API_KEY}"
-            f"&to={phone_number}"
-            f"&from=TrueType"
-            f"&sms={quote(message)}"
-        )
-
-        response = requests.get(sms_url)
-        print("Arkesel SMS response:", response.text)
-        return response.status_code == 200 and '"code":"ok"' in response.text
-    except Exception as e:
-        print("SMS error:", str(e))
-        return False
+    first_name = name.split()[0] if name else "Client"
+    message = (
+        f"Welcome to TrueType Services, {first_name}!\n\n"
+        f"Your account has been successfully created.\n"
+        f"Login Details:\n"
+        f"Client ID: {client_id}\n"
+        f"Password: {phone}\n\n"
+        f"Use these to log in at https://truetypegh.com/login\n"
+        f"Thank you!"
+    )
+    # Carries the login password: the outbox wipes the stored body once it is sent
+    queued = enqueue_sms(phone, message, kind="registration", meta={"client_id": client_id}, redact=True)
+    if not queued:
+        print("❌ Invalid phone number for SMS:", phone)
+    return bool(queued)
 
 # ✅ Register client (Admin & Assistant)
 @register_client_bp.route('/admin/register_client', methods=['GET', 'POST'])
@@ -110,12 +92,15 @@ def register_client():
             'next_of_kin_phone': next_of_kin_phone,
             'relationship': relationship
         }
+        client_data.update(search_fields(name, client_id))
+        client_data.update(contact_fields(client_data))
 
         try:
             clients_collection.insert_one(client_data)
+            invalidate_cache()
             sms_sent = send_registration_sms(name, phone, client_id)
             if not sms_sent:
-                print("⚠️ SMS failed or invalid number.")
+                print("⚠️ SMS not queued: invalid number.")
         except Exception as e:
             print("Registration error:", str(e))
             error_msg = "❌ Client registration failed. Please try again."
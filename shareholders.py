@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request
 from datetime import datetime, timedelta
 from collections import defaultdict
+import numpy as np
+from pricing import compute_pricing
 from db import db
 
 shareholders_bp = Blueprint('shareholders', __name__)
@@ -33,19 +35,24 @@ def filter_orders_for_returns(period, start_date, end_date):
 
 
 def build_contributions(orders):
+    # margin × quantity per order, vectorized (see pricing.compute_pricing)
+    priced = compute_pricing(orders)
+    qty = priced["quantity"]
+    returns = np.round(priced["margin_returns"], 2)
+    holders = np.array([order.get("shareholder") for order in orders], dtype=object)
+
     total_orders = len(orders)
-    total_quantity = sum(order.get("quantity", 0) for order in orders)
-    total_returns = sum(round(order.get("margin", 0) * order.get("quantity", 0), 2) for order in orders)
+    total_quantity = float(qty.sum())
+    total_returns = float(returns.sum())
 
-    contributions = {name: {"orders": 0, "quantity": 0, "returns": 0} for name in SHAREHOLDERS}
-    for order in orders:
-        name = order.get("shareholder")
-        qty = order.get("quantity", 0)
-        margin = order.get("margin", 0)
-        if name in contributions:
-            contributions[name]["orders"] += 1
-            contributions[name]["quantity"] += qty
-            contributions[name]["returns"] += round(margin * qty, 2)
+    contributions = {}
+    for name in SHAREHOLDERS:
+        mask = holders == name
+        contributions[name] = {
+            "orders": int(mask.sum()),
+            "quantity": float(qty[mask].sum()),
+            "returns": float(returns[mask].sum())
+        }
 
     for name in SHAREHOLDERS:
         returns = contributions[name]["returns"]
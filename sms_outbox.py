@@ -0,0 +1,264 @@
+from pymongo import ASCENDING, ReturnDocument
+from bson import ObjectId
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Event, Lock, Semaphore, Thread
+import os, sys, time
+import requests
+
+from db import db
+from client_contacts import normalize_msisdn
+
+# 📦 Collections
+outbox_col = db["sms_outbox"]
+
+outbox_col.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+outbox_col.create_index([("kind", ASCENDING), ("created_at", ASCENDING)])
+
+ARKESEL_API_KEY = os.environ.get("ARKESEL_API_KEY")  # no key -> provider disabled, messages stay queued
+SMS_API_URL = os.environ.get("SMS_API_URL", "https://sms.arkesel.com/sms/api")  # point at a fake server in tests
+SMS_SENDER = "TrueType"
+
+CONCURRENCY = int(os.environ.get("SMS_CONCURRENCY", 4))     # requests in flight per process
+RATE_PER_SEC = float(os.environ.get("SMS_RATE_PER_SEC", 5))  # gateway calls per second per process
+MAX_ATTEMPTS = 5
+RETRY_BASE = 30        # seconds; doubles each attempt
+LEASE_SECONDS = 120    # a claimed message not finished by then is picked up again
+HTTP_TIMEOUT = 10
+IDLE_POLL = 5          # seconds between outbox polls when nothing is queued
+REDACTED = "[redacted]"  # stored body of a sensitive message once it is sent or failed
+
+# ---------- Providers ----------
+class ArkeselProvider:
+    """
+    Arkesel HTTP API. Any object with send(to, message) -> (ok, detail) and an
+    `enabled` flag can replace it. Disabled when no API key is configured.
+    """
+
+    def __init__(self, api_url=SMS_API_URL, api_key=ARKESEL_API_KEY, sender=SMS_SENDER, timeout=HTTP_TIMEOUT):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.sender = sender
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    @property
+    def enabled(self):
+        return bool(self.api_key)
+
+    def send(self, to, message):
+        if not self.enabled:
+            raise RuntimeError("ARKESEL_API_KEY is not set")
+        response = self.session.get(self.api_url, params={
+            "action": "send-sms",
+            "api_key": self.api_key,
+            "to": to,
+            "from": self.sender,
+            "sms": message
+        }, timeout=self.timeout)
+        return response.status_code == 200 and '"code":"ok"' in response.text, response.text[:500]
+
+_provider = ArkeselProvider()
+
+def set_provider(provider):
+    """Swap the SMS provider (e.g. a client for a local fake gateway)."""
+    global _provider
+    _provider = provider
+
+# ---------- Rate limiting ----------
+class _RateLimiter:
+    """Token bucket shared by the sender threads of one process."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# ---------- Outbox ----------
+def _outbox_doc(to, message, kind, meta, now, redact=False):
+    number = normalize_msisdn(to)
+    if not number or not message:
+        return None
+    return {
+        "to": number,
+        "message": message,
+        "redact": redact,
+        "kind": kind,
+        "meta": meta or {},
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now
+    }
+
+def enqueue_sms(to, message, kind="general", meta=None, redact=False):
+    """
+    Queue one SMS and return its outbox id, or None when `to` is not a valid number.
+    Delivery happens on the worker; the caller never waits on the gateway.
+    redact=True (credentials etc.): the stored body is wiped once the message is sent or failed.
+    """
+    doc = _outbox_doc(to, message, kind, meta, datetime.utcnow(), redact)
+    if not doc:
+        return None
+    result = outbox_col.insert_one(doc)
+    worker.wake()
+    return result.inserted_id
+
+def enqueue_many(messages, kind="general"):
+    """Queue [(to, message, meta), ...] in one insert. Returns (queued, skipped)."""
+    now = datetime.utcnow()
+    docs = [_outbox_doc(to, message, kind, meta, now) for to, message, meta in messages]
+    docs = [d for d in docs if d]
+    if docs:
+        outbox_col.insert_many(docs, ordered=False)
+        worker.wake()
+    return len(docs), len(messages) - len(docs)
+
+def _claim():
+    """
+    Atomically take the next due message (or one whose lease expired). Each claim
+    stamps a fresh lease token; only its holder may record the outcome.
+    """
+    now = datetime.utcnow()
+    return outbox_col.find_one_and_update(
+        {"status": {"$in": ["pending", "sending"]}, "next_attempt_at": {"$lte": now}},
+        {
+            "$set": {
+                "status": "sending",
+                "lease": ObjectId(),
+                "next_attempt_at": now + timedelta(seconds=LEASE_SECONDS)
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def _deliver(msg, limiter):
+    limiter.acquire()
+    try:
+        ok, detail = _provider.send(msg["to"], msg["message"])
+    except Exception as e:
+        ok, detail = False, str(e)
+
+    now = datetime.utcnow()
+    if ok:
+        update = {"status": "sent", "sent_at": now, "response": detail}
+    elif msg["attempts"] >= MAX_ATTEMPTS:
+        update = {"status": "failed", "last_error": detail, "failed_at": now}
+    else:
+        delay = RETRY_BASE * 2 ** (msg["attempts"] - 1)
+        update = {"status": "pending", "last_error": detail, "next_attempt_at": now + timedelta(seconds=delay)}
+    if msg.get("redact") and update["status"] != "pending":
+        update["message"] = REDACTED
+    result = outbox_col.update_one(
+        {"_id": msg["_id"], "status": "sending", "lease": msg["lease"]},
+        {"$set": update, "$unset": {"lease": ""}}
+    )
+    if not result.matched_count:
+        # Lease expired and another worker re-claimed the message: its outcome wins
+        print(f"⚠️ SMS {msg['_id']} lease lost; outcome not recorded.")
+        return
+    if not ok:
+        print(f"❌ SMS to {msg['to']} failed (attempt {msg['attempts']}):", detail)
+
+def redact_finished():
+    """Wipe the body of sensitive messages already sent or failed (e.g. queued before redaction existed)."""
+    return outbox_col.update_many(
+        {"$or": [{"redact": True}, {"kind": "registration"}],
+         "status": {"$in": ["sent", "failed"]}, "message": {"$ne": REDACTED}},
+        {"$set": {"message": REDACTED, "redact": True}}
+    ).modified_count
+
+# ---------- Worker ----------
+class SmsWorker:
+    """
+    One dispatcher thread claims due messages and hands them to a thread pool.
+    A semaphore caps messages in flight at `concurrency`; the token bucket caps
+    gateway calls per second. Safe to run in several processes: claims are atomic.
+    """
+
+    def __init__(self, concurrency=CONCURRENCY, rate=RATE_PER_SEC):
+        self.concurrency = concurrency
+        self.rate = rate
+        self._wake = Event()
+        self._stop = Event()
+        self._thread = None
+        self._lock = Lock()
+        self._warned = False
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            if not getattr(_provider, "enabled", True):
+                if not self._warned:
+                    print("⚠️ SMS provider disabled (set ARKESEL_API_KEY); messages stay queued.")
+                    self._warned = True
+                return
+            self._stop.clear()
+            self._thread = Thread(target=self._run, name="sms-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        limiter = _RateLimiter(self.rate)
+        slots = Semaphore(self.concurrency)
+
+        def release(_):
+            slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sms") as pool:
+            while not self._stop.is_set():
+                slots.acquire()
+                try:
+                    msg = _claim()
+                except Exception as e:
+                    print("SMS outbox error:", str(e))
+                    msg = None
+                if not msg:
+                    slots.release()
+                    self._wake.wait(IDLE_POLL)
+                    self._wake.clear()
+                    continue
+                pool.submit(_deliver, msg, limiter).add_done_callback(release)
+
+worker = SmsWorker()
+
+
+if __name__ == "__main__":
+    # Dedicated sender process: python sms_outbox.py | one-off cleanup: python sms_outbox.py redact
+    if sys.argv[1:] == ["redact"]:
+        print(f"✅ Redacted {redact_finished()} finished message(s).")
+        sys.exit(0)
+    if not _provider.enabled:
+        sys.exit("❌ ARKESEL_API_KEY is not set.")
+    print(f"📨 SMS outbox worker running ({CONCURRENCY} concurrent, {RATE_PER_SEC}/s).")
+    worker.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.stop()
@@ -0,0 +1,163 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from dateutil.relativedelta import relativedelta
+from datetime import datetime, timedelta
+from bson import ObjectId
+from xml.sax.saxutils import escape
+import os, re, sys, time, shutil, tempfile, zipfile
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+from db import db
+from debtors import build_statement
+
+# 📦 Collections
+clients_col        = db["clients"]
+orders_col         = db["orders"]
+order_balances_col = db["order_balances"]
+
+COMPANY_NAME = "TRUETYPE SERVICES"
+COLUMNS = [
+    ("Date", "date"), ("Description", "desc"),
+    ("PMS Vol", "pms_vol"), ("PMS Amt", "pms_amt"),
+    ("AGO Vol", "ago_vol"), ("AGO Amt", "ago_amt"),
+    ("Total Amt", "total_amt"), ("Paid", "paid"), ("Balance", "balance"),
+]
+
+# ---------- Helpers ----------
+def _month_window(year, month):
+    start_dt = datetime(year, month, 1)
+    end_dt = start_dt + relativedelta(months=1) - timedelta(microseconds=1)
+    return start_dt, end_dt
+
+def _safe_name(s):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", (s or "").strip()).strip("_") or "client"
+
+def debtor_ids_for_month(year, month):
+    """Clients with an outstanding order dated up to month end, or approved orders in the month."""
+    start_dt, end_dt = _month_window(year, month)
+    ids = set(order_balances_col.distinct("client_id", {
+        "date": {"$lte": end_dt}, "amount_left": {"$gt": 0}
+    }))
+    ids |= set(orders_col.distinct("client_id", {
+        "status": "approved", "date": {"$gte": start_dt, "$lte": end_dt}
+    }))
+    return [cid for cid in ids if cid is not None]
+
+def _write_pdf(path, customer_name, period, rows, totals):
+    doc = SimpleDocTemplate(
+        path, pagesize=landscape(A4),
+        leftMargin=12 * mm, rightMargin=12 * mm, topMargin=12 * mm, bottomMargin=12 * mm
+    )
+    styles = getSampleStyleSheet()
+    cell = ParagraphStyle("cell", parent=styles["Normal"], fontSize=8, leading=10)
+
+    # Paragraph text is reportlab markup: escape client-supplied text (names, descriptions)
+    data = [[label for label, _ in COLUMNS]]
+    for r in rows:
+        row = [r.get(key, "") for _, key in COLUMNS]
+        row[1] = Paragraph(escape(str(row[1] or "")), cell)  # wraps long descriptions
+        data.append(row)
+    data.append([
+        "", "TOTAL",
+        totals["pms_vol"], totals["pms_amt"],
+        totals["ago_vol"], totals["ago_amt"],
+        totals["total_amt"], totals["paid"], totals["closing"],
+    ])
+
+    table = Table(data, repeatRows=1, colWidths=[22 * mm, 80 * mm] + [22 * mm] * 7)
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1f2937")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 8),
+        ("ALIGN", (2, 0), (-1, -1), "RIGHT"),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -2), [colors.white, colors.HexColor("#f6f8fb")]),
+    ]))
+
+    doc.build([
+        Paragraph(COMPANY_NAME, styles["Title"]),
+        Paragraph(f"Customer Statement: {escape(str(customer_name or ''))}", styles["Heading2"]),
+        Paragraph(f"Period: {escape(str(period))}", styles["Normal"]),
+        Spacer(1, 6 * mm),
+        table,
+    ])
+
+# ---------- Worker ----------
+def _render_client(client_hex, start_dt, end_dt, out_dir):
+    """Runs in a worker process: build the ledger rows and write one PDF to out_dir."""
+    t0 = time.perf_counter()
+    client = clients_col.find_one({"_id": ObjectId(client_hex)})
+    if not client:
+        return {"client": client_hex, "path": None, "seconds": 0.0, "error": "Client not found"}
+
+    name = client.get("name", "Unnamed")
+    code = client.get("client_id") or client_hex
+    try:
+        period, rows, totals = build_statement(client, start_dt, end_dt)
+        path = os.path.join(out_dir, f"{_safe_name(code)}_{_safe_name(name)}.pdf")
+        _write_pdf(path, name, period, rows, totals)
+        error = None
+    except Exception as e:
+        path, error = None, str(e)
+
+    return {
+        "client": code,
+        "name": name,
+        "path": path,
+        "seconds": round(time.perf_counter() - t0, 3),
+        "error": error
+    }
+
+# ---------- Batch ----------
+def generate_statements_zip(year, month, zip_path, workers=None):
+    """
+    Render a statement PDF for every debtor of year/month across a process pool
+    and stream each finished PDF into zip_path. Returns the per-client report.
+    """
+    start_dt, end_dt = _month_window(year, month)
+    client_ids = [str(cid) for cid in debtor_ids_for_month(year, month) if ObjectId.is_valid(str(cid))]
+
+    out_dir = tempfile.mkdtemp(prefix="statements_", dir=os.path.dirname(os.path.abspath(zip_path)))
+    report = []
+    try:
+        # spawn: each worker opens its own MongoClient instead of inheriting a forked one
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool, \
+             zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            futures = [pool.submit(_render_client, cid, start_dt, end_dt, out_dir) for cid in client_ids]
+            for fut in as_completed(futures):
+                res = fut.result()
+                if res["path"]:
+                    zf.write(res["path"], arcname=os.path.basename(res["path"]))
+                    os.remove(res["path"])
+                report.append(res)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    report.sort(key=lambda r: r["seconds"], reverse=True)
+    return report
+
+
+if __name__ == "__main__":
+    # Usage: python statement_batch.py YYYY-MM [out.zip] [workers]
+    if len(sys.argv) < 2:
+        print("Usage: python statement_batch.py YYYY-MM [out.zip] [workers]")
+        sys.exit(1)
+
+    y, m = (int(x) for x in sys.argv[1].split("-"))
+    out = sys.argv[2] if len(sys.argv) > 2 else f"statements_{y}-{m:02d}.zip"
+    n_workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    t_start = time.perf_counter()
+    results = generate_statements_zip(y, m, out, n_workers)
+    for r in results:
+        status = "✅" if not r["error"] else f"❌ {r['error']}"
+        print(f"{r['client']:<16} {r.get('name', ''):<30} {r['seconds']:>7.3f}s {status}")
+    print(f"📦 {out}: {sum(1 for r in results if not r['error'])}/{len(results)} statements "
+          f"in {time.perf_counter() - t_start:.1f}s")
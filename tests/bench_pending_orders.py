@@ -0,0 +1,87 @@
+"""
+Benchmark: the old pending-orders view (every pending order, one client lookup each)
+vs one keyset page from orders._pending_orders_page, at 5k pending orders.
+Runs against the in-memory mongomock db, so absolute numbers are only indicative;
+the gap comes from the rows read and the number of queries.
+Usage: python tests/bench_pending_orders.py [pending_orders]
+"""
+import random, sys, time
+from datetime import datetime, timedelta
+
+import fakedb
+fake = fakedb.install()
+
+from bson import ObjectId
+import orders
+from test_pricing import old_view_orders
+
+CLIENTS = 300
+
+class _Counting:
+    """Counts find / find_one calls on a collection."""
+
+    def __init__(self, col):
+        self.col, self.calls = col, 0
+
+    def find(self, *args, **kwargs):
+        self.calls += 1
+        return self.col.find(*args, **kwargs)
+
+    def find_one(self, *args, **kwargs):
+        self.calls += 1
+        return self.col.find_one(*args, **kwargs)
+
+def _seed(n):
+    rng = random.Random(5)
+    client_ids = fake.db["clients"].insert_many(
+        [{"name": f"Client {i}", "client_id": f"C{i:04d}", "image_url": ""} for i in range(CLIENTS)]
+    ).inserted_ids
+    start = datetime(2025, 1, 1)
+    fake.db["orders"].insert_many([{
+        "client_id": rng.choice(client_ids),
+        "status": "pending",
+        "date": start + timedelta(minutes=rng.randint(0, 500000)),
+        "quantity": rng.randint(1000, 60000),
+        "p_bdc_omc": round(rng.uniform(10, 14), 2),
+        "s_bdc_omc": round(rng.uniform(12, 16), 2),
+        "s_tax": round(rng.uniform(1, 3), 2),
+    } for _ in range(n)])
+
+def old_view(orders_col, clients_col):
+    """orders.view_orders before keyset paging (template rendering left out)."""
+    rows = list(orders_col.find({'status': 'pending'}).sort('date', -1))
+    for order in rows:
+        try:
+            client = clients_col.find_one({'_id': ObjectId(order.get('client_id'))})
+        except Exception:
+            client = None
+        order['client_name'] = client.get('name', 'No Name') if client else 'Unknown'
+        order.update(old_view_orders(order))
+    return rows
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main(n=5000):
+    _seed(n)
+    orders_col, clients_col = _Counting(orders.orders_collection), _Counting(orders.clients_collection)
+
+    rows, old_s = _timed(lambda: old_view(orders_col, clients_col))
+    old_queries = orders_col.calls + clients_col.calls
+
+    orders.orders_collection, orders.clients_collection = orders_col, clients_col
+    orders_col.calls = clients_col.calls = 0
+    (page, cursor), first_s = _timed(lambda: orders._pending_orders_page())
+    first_queries = orders_col.calls + clients_col.calls
+    (page, _), deep_s = _timed(lambda: orders._pending_orders_page(cursor))
+
+    print(f"{n} pending orders, page size {orders.ORDERS_PAGE_SIZE}")
+    print(f"  old view (all rows):   {old_s * 1000:9.1f} ms  {len(rows)} rows, {old_queries} queries")
+    print(f"  keyset first page:     {first_s * 1000:9.1f} ms  {len(page)} rows, {first_queries} queries")
+    print(f"  keyset next page:      {deep_s * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
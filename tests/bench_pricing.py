@@ -0,0 +1,40 @@
+"""
+Benchmark: compute_pricing vs the old per-row formulas on 50k orders.
+Usage: python tests/bench_pricing.py [rows]
+"""
+import random, sys, time
+
+import fakedb
+fakedb.install()
+
+from pricing import compute_pricing
+from test_pricing import _order, old_view_orders, old_update_order, old_approved_returns
+
+def _best(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(rows=50000):
+    rng = random.Random(1)
+    orders = [_order(rng) for _ in range(rows)]
+
+    def old():
+        for o in orders:
+            old_view_orders(o)
+            old_update_order(o)
+            old_approved_returns(o)
+
+    old_s = _best(old)
+    new_s = _best(lambda: compute_pricing(orders))
+    print(f"{rows} orders")
+    print(f"  old per-row formulas: {old_s * 1000:8.1f} ms")
+    print(f"  compute_pricing:      {new_s * 1000:8.1f} ms  ({old_s / new_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,12 @@
+import pytest
+
+import fakedb
+
+# Swap db.py (live MongoDB) for mongomock before any app module is imported
+fake = fakedb.install()
+
+@pytest.fixture
+def db():
+    fakedb.reset(fake)
+    yield fake.db
+    fakedb.reset(fake)
@@ -0,0 +1,98 @@
+"""
+In-memory stand-in for db.py (mongomock), for tests and benchmarks.
+install() must run before any app module imports `db`.
+"""
+import os, sys, types
+
+import mongomock
+from pymongo import UpdateOne, UpdateMany, ReplaceOne, InsertOne, DeleteOne, DeleteMany
+from pymongo.results import BulkWriteResult
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _bulk_write(self, ops, ordered=True, **kwargs):
+    # mongomock's bulk_write breaks on current pymongo operations: apply them one by one
+    raw = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+
+    def updated(res):
+        raw["nMatched"] += res.matched_count
+        raw["nModified"] += res.modified_count
+        if res.upserted_id is not None:
+            raw["nUpserted"] += 1
+
+    for op in ops:
+        if isinstance(op, InsertOne):
+            self.insert_one(op._doc)
+            raw["nInserted"] += 1
+        elif isinstance(op, UpdateOne):
+            updated(self.update_one(op._filter, op._doc, upsert=op._upsert))
+        elif isinstance(op, UpdateMany):
+            updated(self.update_many(op._filter, op._doc, upsert=op._upsert))
+        elif isinstance(op, ReplaceOne):
+            updated(self.replace_one(op._filter, op._doc, upsert=op._upsert))
+        elif isinstance(op, DeleteOne):
+            raw["nRemoved"] += self.delete_one(op._filter).deleted_count
+        elif isinstance(op, DeleteMany):
+            raw["nRemoved"] += self.delete_many(op._filter).deleted_count
+    return BulkWriteResult(raw, True)
+
+_convert_other = mongomock.aggregate._Parser._handle_type_convertion_operator
+
+def _convert(self, operator, values):
+    # mongomock has no $convert: support the to-double form the app uses
+    if operator != "$convert" or values.get("to") != "double":
+        return _convert_other(self, operator, values)
+    try:
+        value = self.parse(values["input"])
+    except KeyError:
+        value = None
+    if value is None:
+        return self.parse(values["onNull"]) if "onNull" in values else None
+    try:
+        if isinstance(value, str):
+            return float(value.strip() and value)  # the server rejects blank strings
+        if isinstance(value, (bool, int, float)):
+            return float(value)
+        raise ValueError(value)
+    except ValueError:
+        if "onError" in values:
+            return self.parse(values["onError"])
+        raise mongomock.OperationFailure(f"Failed to parse number '{value}' in $convert")
+
+_project_other = mongomock.aggregate._Parser._handle_project_operator
+
+def _project(self, operator, values):
+    # mongomock reads a single-expression $sum/$avg/... argument as a list of its keys
+    if isinstance(values, dict) and operator in mongomock.aggregate._GROUPING_OPERATOR_MAP:
+        parsed = self.parse(values)
+        return mongomock.aggregate._GROUPING_OPERATOR_MAP[operator](parsed if isinstance(parsed, list) else [parsed])
+    return _project_other(self, operator, values)
+
+def install():
+    """Register a mongomock-backed `db` module and put the repo root on sys.path."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    existing = sys.modules.get("db")
+    if getattr(existing, "IS_FAKE", False):
+        return existing
+
+    mongomock.collection.Collection.bulk_write = _bulk_write
+    mongomock.aggregate._Parser._handle_type_convertion_operator = _convert
+    mongomock.aggregate._Parser._handle_project_operator = _project
+    client = mongomock.MongoClient()
+    module = types.ModuleType("db")
+    module.IS_FAKE = True
+    module.client = client
+    module.db = client["truetype"]
+    module.users_collection = module.db["users"]
+    module.clients_collection = module.db["clients"]
+    module.orders_collection = module.db["orders"]
+    module.payments_collection = module.db["payments"]
+    module.settings_collection = module.db["settings"]
+    sys.modules["db"] = module
+    return module
+
+def reset(module):
+    """Drop every collection (indexes stay declared by the app modules)."""
+    for name in module.db.list_collection_names():
+        module.db[name].delete_many({})
@@ -0,0 +1,86 @@
+"""Bank statement reconciliation against pending payments."""
+import io
+from datetime import datetime
+
+from bson import ObjectId
+from flask import Flask
+
+from bank_reconcile import bank_reconcile_bp, reconcile_statement
+
+def _statement(text):
+    return io.BytesIO(text.replace("\n", "\r\n").encode("utf-8"))
+
+def _seed(db):
+    client_id = db["clients"].insert_one({"name": "Kofi"}).inserted_id
+    pending = [
+        ("payments", 100.00, "4321", datetime(2026, 3, 2, 10)),
+        ("payments", 250.50, "4321", datetime(2026, 3, 3, 9)),
+        ("truck_payments", 75.00, "4321", datetime(2026, 3, 4, 15)),
+        ("payments", 100.00, "9999", datetime(2026, 3, 2, 11)),
+    ]
+    for col, amount, last4, date in pending:
+        db[col].insert_one({"client_id": client_id, "amount": amount, "bank_name": "GCB",
+                            "account_last4": last4, "date": date, "status": "pending"})
+    return client_id
+
+NO_ACCOUNT = """Date,Description,Credit,Debit
+02/03/2026,Transfer KOFI,100.00,
+03/03/2026,Transfer KOFI,"250.50",
+05/03/2026,Truck KOFI,75.00,
+06/03/2026,Charges,,12.00
+"""
+
+def test_no_account_column_and_no_account_chosen_matches_on_amount_and_day(db):
+    _seed(db)
+    report = reconcile_statement(_statement(NO_ACCOUNT))
+    assert report["counts"]["credits"] == 3
+    assert report["counts"]["matched"] == 3
+    assert report["counts"]["skipped"] == 1
+    assert {m["source"] for m in report["matches"]} == {"payments", "truck_payments"}
+    # the second 100.00 on 2 March is still pending, and nothing was handed out twice
+    assert report["counts"]["pending_unmatched"] == 1
+    assert len({m["payment_id"] for m in report["matches"]}) == 3
+
+def test_chosen_account_limits_matches(db):
+    _seed(db)
+    report = reconcile_statement(_statement(NO_ACCOUNT), bank_name="GCB", last4="9999")
+    assert report["counts"]["matched"] == 1
+    assert report["counts"]["unmatched"] == 2
+
+def test_account_column(db):
+    _seed(db)
+    text = """Transaction Date,Account Number,Amount,Narration
+2026-03-02,00112229999,100.00,A
+2026-03-02,00112224321,100.00,B
+2026-03-02,00112224321,100.00,C
+"""
+    report = reconcile_statement(_statement(text), tolerance=0)
+    assert report["counts"]["matched"] == 2
+    assert [u["reference"] for u in report["unmatched_lines"]] == ["C"]
+
+def test_upload_with_apply_confirms_and_updates_totals(db):
+    client_id = _seed(db)
+    order_id = db["orders"].insert_one({"client_id": client_id, "order_id": "ORD1", "status": "approved",
+                                        "total_debt": 1000.0, "date": datetime(2026, 3, 1)}).inserted_id
+    db["payments"].update_one({"amount": 250.50}, {"$set": {"order_id": order_id}})
+    app = Flask(__name__)
+    app.register_blueprint(bank_reconcile_bp)
+
+    res = app.test_client().post("/bank-reconcile/upload", data={
+        "statement": (_statement(NO_ACCOUNT), "statement.csv"), "apply": "1"
+    })
+
+    body = res.get_json()
+    assert body["applied"] == 3
+    assert {m["outcome"] for m in body["matches"]} == {"confirmed"}
+    for m in body["matches"]:
+        doc = db[m["source"]].find_one({"_id": ObjectId(m["payment_id"])})
+        assert doc["status"] == "confirmed" and doc["confirmed_via"] == "bank_statement"
+    assert db["payments"].count_documents({"status": "pending"}) == 1
+
+    # derived totals: truck ledger, bank receipts rollup, order balance
+    assert db["truck_client_totals"].find_one({"_id": str(client_id)})["total_paid"] == 75.0
+    receipts = {(r["day"], r["total"], r["count"]) for r in db["bank_daily_receipts"].find({"day": {"$exists": True}})}
+    assert receipts == {(datetime(2026, 3, 2), 100.0, 1), (datetime(2026, 3, 3), 250.5, 1)}
+    balance = db["order_balances"].find_one({"order_oid": order_id})
+    assert balance["confirmed_paid"] == 250.5 and balance["amount_left"] == 749.5
@@ -0,0 +1,40 @@
+"""BDC payments: the stored row and the running totals stay in step."""
+from bson import ObjectId
+
+import bdc_balances
+import bdc_payments
+from bdc_balances import initial_totals, payment_inc, _components, _to_f
+
+def _python_balances(bdc_ids=None):
+    """balances_from_source in Python (mongomock has no $unionWith / $convert)."""
+    db = bdc_balances.bdc_col.database
+    out = {}
+    for t in db["bdc_transactions"].find({"type": "deposit"}):
+        out.setdefault(t["bdc_id"], [0.0, 0.0, 0.0])[0] += _to_f(t.get("amount"))
+    for p in db["bdc_payments"].find({}):
+        for field, amt in payment_inc(p.get("payment_type"), p.get("amount")).items():
+            out.setdefault(p["bdc_id"], [0.0, 0.0, 0.0])[1 if field == "from_account_total" else 2] += amt
+    wanted = None if bdc_ids is None else {ObjectId(b) for b in bdc_ids}
+    return {k: _components(*v) for k, v in out.items() if wanted is None or k in wanted}
+
+def test_unsynced_bdc_balance_includes_the_new_payment(db, monkeypatch):
+    monkeypatch.setattr(bdc_balances, "balances_from_source", _python_balances)
+    bdc_id = db["bdc"].insert_one({"name": "Legacy BDC"}).inserted_id  # never synced
+    db["bdc_transactions"].insert_one({"bdc_id": bdc_id, "type": "deposit", "amount": 1000.0})
+
+    comp = bdc_payments.record_payment(bdc_id, {"payment_type": "Credit", "amount": "GHS 250"})
+    assert comp["credit_total"] == 250.0
+    assert comp["balance"] == 750.0
+    assert db["bdc_payments"].count_documents({"bdc_id": bdc_id}) == 1
+
+def test_synced_bdc_counters(db):
+    bdc_id = db["bdc"].insert_one(dict(initial_totals(), name="New BDC", deposits_total=500.0)).inserted_id
+    bdc_payments.record_payment(bdc_id, {"payment_type": "from account", "amount": 100})
+    comp = bdc_payments.record_payment(bdc_id, {"payment_type": "cash", "amount": 40})
+    assert comp["from_account_total"] == 100.0
+    assert comp["balance"] == 400.0
+    assert db["bdc_payments"].count_documents({"bdc_id": bdc_id}) == 2
+
+def test_missing_bdc_leaves_no_row(db):
+    assert bdc_payments.record_payment(ObjectId(), {"payment_type": "credit", "amount": 10}) is None
+    assert db["bdc_payments"].count_documents({}) == 0
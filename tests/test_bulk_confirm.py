@@ -0,0 +1,43 @@
+"""Bulk confirmation endpoints: malformed bodies are rejected with 400."""
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+import admin_truck_payments
+import payments
+
+BAD_BODIES = [
+    ["abc"],
+    {"payments": "abc"},
+    {"payments": {"id": "abc"}},
+    {"ids": "abc"},
+    {"ids": {"a": 1}},
+    {"ids": ["abc"], "feedback": 5},
+    {"payments": [{"id": "abc", "feedback": ["x"]}]},
+    7,
+]
+
+@pytest.fixture
+def client(db):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.register_blueprint(payments.payments_bp)
+    app.register_blueprint(admin_truck_payments.admin_truck_payments_bp)
+    return app.test_client()
+
+@pytest.mark.parametrize("url", ["/confirm_payments", "/admin/truck_payments/confirm"])
+@pytest.mark.parametrize("body", BAD_BODIES)
+def test_malformed_body_is_400(client, url, body):
+    res = client.post(url, json=body)
+    assert res.status_code == 400
+    assert res.get_json()["success"] is False
+
+def test_truck_payments_confirm(db, client):
+    pid = db["truck_payments"].insert_one(
+        {"client_id": "c1", "amount": 50, "status": "pending", "date": datetime(2026, 3, 1)}
+    ).inserted_id
+    body = {"payments": [{"id": str(pid), "feedback": "ok"}, "skipped", {"id": "bad"}]}
+    res = client.post("/admin/truck_payments/confirm", json=body).get_json()
+    assert res["results"] == {str(pid): "confirmed", "bad": "invalid_id"}
+    assert db["truck_payments"].find_one({"_id": pid})["feedback"] == "ok"
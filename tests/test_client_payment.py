@@ -0,0 +1,34 @@
+"""Client payment page: orders with debt stored as strings are still offered for payment."""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from flask import Flask, jsonify
+
+from client import client_payment
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(client_payment, "render_template", lambda name, **ctx: jsonify(
+        orders=[(o["code"], o["outstanding"]) for o in ctx["orders_with_debt"]],
+        total=ctx["full_outstanding_total"]
+    ))
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.register_blueprint(client_payment.client_payment_bp, url_prefix="/client")
+    return app.test_client()
+
+def test_string_debts_are_listed(db, client):
+    cid = ObjectId()
+    docs = [("A1", 1500.0), ("A2", "2,000"), ("A3", "750.50"), ("A4", "0"), ("A5", None), ("A6", "abc")]
+    ids = db["orders"].insert_many([
+        {"client_id": cid if i % 2 else str(cid), "order_id": code, "total_debt": debt, "date": datetime(2026, 5, 1 + i)}
+        for i, (code, debt) in enumerate(docs)
+    ]).inserted_ids
+    db["payments"].insert_one({"client_id": cid, "order_id": ids[2], "amount": "250.50", "status": "confirmed"})
+    with client.session_transaction() as s:
+        s["client_id"] = str(cid)
+
+    body = client.get("/client/payment").get_json()
+    assert body["orders"] == [["A3", 500.0], ["A1", 1500.0]]
+    assert body["total"] == 2000.0
@@ -0,0 +1,23 @@
+"""A refreshed summary agrees with check_drift's source totals, string amounts included."""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from client_summaries import refresh_client_summary, check_drift
+
+def test_refreshed_summary_has_no_drift(db):
+    cid = ObjectId()
+    now = datetime.utcnow()
+    db["orders"].insert_many([
+        {"client_id": cid, "total_debt": "1200.50", "date": now,
+         "payment_details": [{"amount": "200"}, {"amount": 50.25}, {"amount": "n/a"}]},
+        {"client_id": str(cid), "total_debt": 300, "date": now - timedelta(days=1), "payment_details": None},
+        {"client_id": cid, "total_debt": None, "date": now - timedelta(days=2)},
+    ])
+
+    summary = refresh_client_summary(cid)
+    assert summary["total_orders"] == 3
+    assert summary["total_debt"] == 1500.5
+    assert summary["total_paid"] == 250.25
+    assert summary["amount_left"] == 1250.25
+    assert check_drift() == []
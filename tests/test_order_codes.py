@@ -0,0 +1,89 @@
+"""Order code allocation under concurrency: codes stay unique and every submission inserts once."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import Flask
+
+import order_codes
+from order_codes import OrderCodeAllocator, encode, ALPHABET, CODE_LEN
+
+THREADS = 16
+
+class _AtomicCounters:
+    """mongomock applies find_one_and_update without a lock; the server does it atomically."""
+
+    def __init__(self, col):
+        self.col = col
+        self.lock = threading.Lock()
+
+    def find_one_and_update(self, *args, **kwargs):
+        with self.lock:
+            return self.col.find_one_and_update(*args, **kwargs)
+
+@pytest.fixture
+def counters(db, monkeypatch):
+    monkeypatch.setattr(order_codes, "counters_col", _AtomicCounters(db["counters"]))
+    return db["counters"]
+
+def _valid(code):
+    return len(code) == CODE_LEN and all(c in ALPHABET for c in code)
+
+def test_encode_is_unique_over_a_range():
+    codes = {encode(n) for n in range(200000)}
+    assert len(codes) == 200000
+    assert all(_valid(c) for c in codes)
+
+def test_many_threads_share_one_counter(counters, monkeypatch):
+    # Small blocks on one allocator plus a few "other processes" force frequent reservations
+    allocators = [OrderCodeAllocator(block_size=7) for _ in range(4)]
+    monkeypatch.setattr(order_codes, "allocator", allocators[0])
+    per_thread = 500
+
+    def work(i):
+        if i % 2:
+            return [order_codes.next_order_code() for _ in range(per_thread)]
+        alloc = allocators[i % len(allocators)]
+        return [alloc.next_code() for _ in range(per_thread)]
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        codes = [c for batch in pool.map(work, range(THREADS)) for c in batch]
+
+    assert len(codes) == THREADS * per_thread
+    assert len(set(codes)) == len(codes)
+    assert all(_valid(c) for c in codes)
+
+def test_each_submission_inserts_exactly_once(db, counters, monkeypatch):
+    from client import client_order
+
+    inserts = []
+    insert_one = client_order.orders_collection.insert_one
+
+    def counting_insert(doc, *args, **kwargs):
+        inserts.append(doc["order_id"])
+        return insert_one(doc, *args, **kwargs)
+
+    monkeypatch.setattr(client_order.orders_collection, "insert_one", counting_insert)
+    monkeypatch.setattr(order_codes, "allocator", OrderCodeAllocator(block_size=5))
+
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.register_blueprint(client_order.client_order_bp, url_prefix="/client")
+    form = {"product": "AGO", "quantity": "1,000", "region": "Accra",
+            "vehicle_number": "GT-1", "driver_name": "Kofi", "driver_phone": "0240000000"}
+    per_thread = 10
+
+    def submit(i):
+        client = app.test_client()
+        with client.session_transaction() as s:
+            s["client_id"] = f"client-{i}"
+        return [client.post("/client/submit_order", data=form).status_code for _ in range(per_thread)]
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        statuses = [s for batch in pool.map(submit, range(THREADS)) for s in batch]
+
+    assert statuses == [302] * (THREADS * per_thread)
+    assert len(inserts) == THREADS * per_thread
+    assert len(set(inserts)) == len(inserts)
+    assert all(_valid(c) for c in inserts)
+    assert db["orders"].count_documents({}) == len(inserts)
@@ -0,0 +1,125 @@
+"""/orders/bulk_update: input validation, and the same writes as /orders/update."""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+import orders
+from bdc_balances import initial_totals
+
+@pytest.fixture
+def client(db):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.register_blueprint(orders.orders_bp, url_prefix="/orders")
+    c = app.test_client()
+    with c.session_transaction() as s:
+        s["role"] = "admin"
+    return c
+
+def test_malformed_items_get_per_item_errors(db, client):
+    bdc_id = db["bdc"].insert_one({"name": "BDC One"}).inserted_id
+    order_id = db["orders"].insert_one({
+        "status": "pending", "quantity": 1000, "date": datetime(2026, 3, 1)
+    }).inserted_id
+    good = {"order_id": str(order_id), "order_type": "s_bdc", "omc": "OMC", "depot": "Tema",
+            "bdc": str(bdc_id), "p_bdc_omc": "10", "s_bdc_omc": "12"}
+
+    res = client.post("/orders/bulk_update", json={"orders": [
+        "oops", None, 5, ["x"], dict(good, order_type=7), dict(good, shareholder={"a": 1}), good
+    ]})
+
+    assert res.status_code == 200
+    results = res.get_json()["results"]
+    assert len(results) == 7
+    assert [r["success"] for r in results] == [False] * 6 + [True]
+    assert all(r["error"] == "Each order must be an object." for r in results[:4])
+    assert results[4]["error"] == "order_type must be a string."
+    assert results[5]["error"] == "shareholder must be a string."
+    assert db["orders"].find_one({"_id": order_id})["status"] == "approved"
+
+def test_orders_must_be_a_list(client):
+    for body in ({"orders": {"order_id": "x"}}, {"orders": []}, ["x"]):
+        assert client.post("/orders/bulk_update", json=body).status_code == 400
+
+def test_duplicate_order_ids_fail_after_the_first(db, client):
+    bdc_id = db["bdc"].insert_one({"name": "BDC One"}).inserted_id
+    order_id = db["orders"].insert_one({"status": "pending", "quantity": 1000}).inserted_id
+    item = {"order_id": str(order_id), "order_type": "s_bdc", "omc": "OMC", "depot": "Tema",
+            "bdc": str(bdc_id), "p_bdc_omc": "10", "s_bdc_omc": "12", "payment_type": "Cash"}
+
+    res = client.post("/orders/bulk_update", json={"orders": [item, dict(item, s_bdc_omc="13"), item]})
+
+    results = res.get_json()["results"]
+    assert [r["success"] for r in results] == [True, False, False]
+    assert all(r["error"] == "Duplicate order_id in this batch" for r in results[1:])
+    order = db["orders"].find_one({"_id": order_id})
+    assert order["s_bdc_omc"] == 12.0 and len(order["payment_details"]) == 1
+    assert db["bdc_payments"].count_documents({}) == 1
+
+# ---------- Same writes as /orders/update ----------
+CLIENT_ID = ObjectId()
+BDC_ID = ObjectId()
+ORDER_IDS = [ObjectId() for _ in range(3)]
+UPDATES = [
+    {"order_type": "s_bdc", "omc": "OMC", "depot": "Tema", "bdc": str(BDC_ID),
+     "p_bdc_omc": "10", "s_bdc_omc": "12.5", "payment_type": "Cash", "shareholder": "Ama"},
+    {"order_type": "combo", "omc": "OMC", "depot": "Kumasi", "bdc": str(BDC_ID), "p_bdc_omc": "9",
+     "s_bdc_omc": "11", "p_tax": "1", "s_tax": "1.5", "payment_type": "Credit", "due_date": "2026-04-30"},
+    {"order_type": "s_tax", "omc": "OMC", "depot": "Tema", "p_tax": "2", "s_tax": "3", "payment_type": "Cash"},
+]
+
+def _seed(db):
+    db["clients"].insert_one({"_id": CLIENT_ID, "name": "Kojo Ltd"})
+    db["bdc"].insert_one(dict(initial_totals(), _id=BDC_ID, name="BDC One", deposits_total=50000.0))
+    for i, oid in enumerate(ORDER_IDS):
+        db["orders"].insert_one({
+            "_id": oid, "client_id": CLIENT_ID, "status": "pending", "product": "AGO",
+            "quantity": 1000 * (i + 1), "date": datetime(2026, 3, 1 + i),
+            "payment_details": [{"amount": 500.0, "date": datetime(2026, 3, 2)}] if i == 0 else []
+        })
+
+def _state(db, since):
+    """Every collection, with write-time timestamps and generated ids normalized."""
+    def norm(v):
+        if isinstance(v, datetime) and v >= since:
+            return "now"
+        if isinstance(v, dict):
+            return {k: norm(x) for k, x in v.items() if k != "updated_at"}
+        if isinstance(v, list):
+            return [norm(x) for x in v]
+        return v
+
+    state = {}
+    for name in sorted(db.list_collection_names()):
+        rows = [norm(d) for d in db[name].find({})]
+        if name in ("bdc_payments", "order_balances"):  # upserted: _id is generated
+            rows = sorted(({k: v for k, v in r.items() if k != "_id"} for r in rows), key=repr)
+        state[name] = rows
+    return state
+
+def test_bulk_update_matches_single_updates(db, client):
+    since = datetime.utcnow().replace(microsecond=0)  # stored datetimes keep milliseconds only
+    _seed(db)
+    for oid, update in zip(ORDER_IDS, UPDATES):
+        res = client.post(f"/orders/update/{oid}", data=update)
+        assert res.get_json()["success"], res.get_json()
+    single = _state(db, since)
+
+    for name in db.list_collection_names():
+        db[name].delete_many({})
+    _seed(db)
+    res = client.post("/orders/bulk_update", json={"orders": [
+        dict(update, order_id=str(oid)) for oid, update in zip(ORDER_IDS, UPDATES)
+    ]})
+    assert res.get_json()["updated"] == 3
+    bulk = _state(db, since)
+
+    assert bulk == single
+    # the comparison covered the side effects, not just the orders
+    assert len(single["bdc_payments"]) == 2
+    assert len(single["order_balances"]) == 3
+    assert single["bdc"][0]["credit_total"] == 18000.0
+    assert single["client_summaries"][0]["total_orders"] == 3
+    assert [len(o["payment_details"]) for o in single["orders"]] == [2, 1, 0]
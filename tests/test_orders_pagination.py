@@ -0,0 +1,54 @@
+"""Keyset pagination of the pending-orders queue."""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import orders
+
+def _seed(db, dated=10, undated=5):
+    start = datetime(2026, 3, 1)
+    docs = [{"status": "pending", "date": start + timedelta(hours=i // 2), "quantity": 1000}
+            for i in range(dated)]
+    docs += [{"status": "pending", "quantity": 1000} for _ in range(undated // 2)]
+    docs += [{"status": "pending", "date": "2026-03-01", "quantity": 1000} for _ in range(undated - undated // 2)]
+    docs.append({"status": "approved", "date": start, "quantity": 1000})
+    db["orders"].insert_many(docs)
+    return docs
+
+def _walk(page_size):
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = orders._pending_orders_page(cursor, page_size=page_size)
+        seen.extend(o["_id"] for o in page)
+        pages += 1
+        if not cursor:
+            return seen, pages
+        assert pages < 100
+
+def test_pages_cover_every_pending_order_once(db):
+    docs = _seed(db)
+    pending = [d for d in docs if d["status"] == "pending"]
+    for page_size in (1, 3, 4, 10, 15, 50):
+        seen, _ = _walk(page_size)
+        assert len(seen) == len(set(seen)) == len(pending)
+
+    dated = sorted((d for d in pending if isinstance(d.get("date"), datetime)),
+                   key=lambda d: (d["date"], d["_id"]), reverse=True)
+    undated = sorted((d for d in pending if not isinstance(d.get("date"), datetime)),
+                     key=lambda d: d["_id"], reverse=True)
+    assert _walk(4)[0] == [d["_id"] for d in dated + undated]
+
+def test_cursor_falls_back_to_id_for_undated_orders(db):
+    _seed(db, dated=2, undated=4)
+    page, cursor = orders._pending_orders_page(page_size=3)
+    assert cursor.startswith("_")
+    assert orders._decode_cursor(cursor) == (None, page[-1]["_id"])
+    page, cursor = orders._pending_orders_page(cursor, page_size=3)
+    assert len(page) == 3 and cursor is None
+
+def test_bad_cursor_restarts_from_the_top(db):
+    _seed(db, dated=3, undated=0)
+    first, _ = orders._pending_orders_page(page_size=2)
+    again, _ = orders._pending_orders_page("not-a-cursor", page_size=2)
+    assert [o["_id"] for o in again] == [o["_id"] for o in first]
+    assert orders._decode_cursor(f"garbage_{ObjectId()}") is None
@@ -0,0 +1,71 @@
+"""Keyset pagination of the payments queue."""
+from datetime import datetime, timedelta
+
+import payments
+
+FILTERS = {"status": "all", "bank": "", "client": "", "from": "", "to": ""}
+
+def _seed(db, dated=9, undated=5):
+    start = datetime(2026, 3, 1)
+    docs = [{"status": "pending" if i % 3 else "confirmed", "amount": 10, "bank_name": "GCB",
+             "date": start + timedelta(hours=i // 2)} for i in range(dated)]
+    docs += [{"status": "pending", "amount": 10, "bank_name": "GCB"} for _ in range(undated // 2)]
+    docs += [{"status": "pending", "amount": 10, "bank_name": "GCB", "date": "N/A"}
+             for _ in range(undated - undated // 2)]
+    db["payments"].insert_many(docs)
+    return docs
+
+def _walk(filters, page_size):
+    seen, cursor = [], None
+    for _ in range(100):
+        page, cursor = payments._payments_page(filters, cursor, page_size=page_size)
+        seen.extend(p["_id"] for p in page)
+        if not cursor:
+            return seen
+    raise AssertionError("pagination did not end")
+
+def _expected(docs):
+    dated = sorted((d for d in docs if isinstance(d.get("date"), datetime)),
+                   key=lambda d: (d["date"], d["_id"]), reverse=True)
+    undated = sorted((d for d in docs if not isinstance(d.get("date"), datetime)),
+                     key=lambda d: d["_id"], reverse=True)
+    return [str(d["_id"]) for d in dated + undated]
+
+def test_pages_continue_past_undated_payments(db):
+    docs = _seed(db)
+    for page_size in (1, 2, 4, 9, 10, 50):
+        assert _walk(FILTERS, page_size) == _expected(docs)
+
+def test_filters_apply_to_both_segments(db):
+    docs = _seed(db)
+    pending = dict(FILTERS, status="pending")
+    assert _walk(pending, 3) == _expected([d for d in docs if d["status"] == "pending"])
+
+    # a date range only ever matches dated payments
+    ranged = dict(FILTERS, **{"from": "2026-03-01", "to": "2026-03-02"})
+    assert _walk(ranged, 2) == _expected([d for d in docs if isinstance(d.get("date"), datetime)])
+
+def test_undated_cursor(db):
+    _seed(db, dated=1, undated=4)
+    page, cursor = payments._payments_page(FILTERS, page_size=2)
+    assert cursor == f"_{page[-1]['_id']}"
+    page, cursor = payments._payments_page(FILTERS, cursor, page_size=2)
+    assert len(page) == 2
+    page, cursor = payments._payments_page(FILTERS, cursor, page_size=2)
+    assert len(page) == 1 and cursor is None
+
+def test_client_filter_covers_every_match_and_flags_truncation(db, monkeypatch):
+    ids = db["clients"].insert_many(
+        [{"name": f"Kofi {i}", "search_keys": ["kofi", f"kofi {i}", str(i)]} for i in range(60)]
+    ).inserted_ids
+    db["payments"].insert_many([{"client_id": cid, "status": "pending", "amount": 1,
+                                 "date": datetime(2026, 3, 1)} for cid in ids])
+
+    filters = payments._payment_filters({"client": "kofi", "status": "all"})
+    assert not filters["client_truncated"]
+    assert len(_walk(filters, 25)) == 60  # the old lookup stopped at 50 clients
+
+    monkeypatch.setattr(payments, "CLIENT_FILTER_LIMIT", 10)
+    filters = payments._payment_filters({"client": "kofi", "status": "all"})
+    assert filters["client_truncated"]
+    assert len(_walk(filters, 25)) == 10
@@ -0,0 +1,203 @@
+"""
+compute_pricing against the per-view formulas it replaced (copied from the views
+before pricing.py existed), row by row over random orders with missing, blank and
+non-numeric inputs.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from pricing import compute_pricing, price_one, to_py
+
+MISSING = object()
+
+# ---------- Old per-view formulas ----------
+def _old_f(v):  # orders._f
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def _old_nz(v):  # orders._nz
+    return v if v is not None else 0.0
+
+def old_view_orders(order):
+    """orders.view_orders server-side fallbacks."""
+    p = _old_f(order.get('p_bdc_omc'))
+    s = _old_f(order.get('s_bdc_omc'))
+    s_tax = _old_f(order.get('s_tax'))
+    q = _old_f(order.get('quantity')) or 0.0
+    margin_price = (s - p) if (s is not None and p is not None) else None
+    ret_sbdc = (s * q) if (s is not None) else 0.0
+    ret_stax = (s_tax * q) if (s_tax is not None) else 0.0
+    return {
+        'margin': round(margin_price, 2) if margin_price is not None else None,
+        'returns_sbdc': round(ret_sbdc, 2),
+        'returns_stax': round(ret_stax, 2),
+        'returns_total': round(ret_sbdc + ret_stax, 2),
+    }
+
+def old_update_order(order):
+    """orders.update_order derived fields (only for inputs that pass its validation)."""
+    mode = (order.get("order_type") or "combo").strip().lower()
+    p = _old_f(order.get("p_bdc_omc"))
+    s = _old_f(order.get("s_bdc_omc"))
+    p_tax = _old_f(order.get("p_tax"))
+    s_tax = _old_f(order.get("s_tax"))
+    q = _old_f(order.get("quantity")) or 0.0
+
+    margin_price = (s - p) if (s is not None and p is not None) else None
+    margin_tax = (s_tax - p_tax) if (s_tax is not None and p_tax is not None) else None
+    if mode == "s_bdc":
+        total_debt = _old_nz(s) * q
+        active_margin = margin_price
+    elif mode == "s_tax":
+        total_debt = _old_nz(s_tax) * q
+        active_margin = margin_tax
+    else:
+        total_debt = (_old_nz(s) + _old_nz(s_tax)) * q
+        active_margin = margin_price
+    returns_sbdc = (_old_nz(s) * q) if (s is not None) else 0.0
+    returns_stax = (_old_nz(s_tax) * q) if (s_tax is not None) else 0.0
+
+    out = {
+        "total_debt": round(total_debt, 2),
+        "returns_sbdc": round(returns_sbdc, 2),
+        "returns_stax": round(returns_stax, 2),
+        "returns_total": round(returns_sbdc + returns_stax, 2),
+    }
+    if margin_price is not None:
+        out["margin_price"] = round(margin_price, 2)
+    if margin_tax is not None:
+        out["margin_tax"] = round(margin_tax, 2)
+    if active_margin is not None:
+        out["margin"] = round(active_margin, 2)
+    return out
+
+def _update_order_valid(order):
+    mode = (order.get("order_type") or "combo").strip().lower()
+    s, s_tax = _old_f(order.get("s_bdc_omc")), _old_f(order.get("s_tax"))
+    if mode == "s_bdc":
+        return s is not None
+    if mode == "s_tax":
+        return s_tax is not None
+    return mode == "combo" and s is not None and s_tax is not None
+
+def old_approved_returns(order):
+    """approved_orders.view_approved_orders returns."""
+    try:
+        margin = float(order.get('margin', 0))
+        quantity = float(order.get('quantity', 0))
+        return round(margin * quantity, 2)
+    except (TypeError, ValueError):
+        return 0.0
+
+def old_client_profile(order):
+    """client_profile margin / returns."""
+    try:
+        p = float(order.get("p_bdc_omc", 0))
+        s = float(order.get("s_bdc_omc", 0))
+        q = float(order.get("quantity", 0))
+        margin = s - p
+        return round(margin, 2), round(margin * q, 2)
+    except Exception:
+        return 0.0, 0.0
+
+def old_shareholder_returns(orders):
+    """shareholders.build_contributions total_returns."""
+    return sum(round(order.get("margin", 0) * order.get("quantity", 0), 2) for order in orders)
+
+# ---------- Random orders ----------
+def _value(rng, numeric_only=False):
+    roll = rng.random()
+    if numeric_only or roll < 0.55:
+        return round(rng.uniform(0, 30), 2)
+    if roll < 0.70:
+        return str(round(rng.uniform(0, 30), 2))
+    if roll < 0.80:
+        return None
+    if roll < 0.90:
+        return MISSING
+    return rng.choice(["", "abc", "1,200"])
+
+def _order(rng, numeric_only=False):
+    order = {
+        "order_type": rng.choice(["s_bdc", "s_tax", "combo", " Combo ", None, MISSING]),
+        "quantity": rng.choice([round(rng.uniform(0, 60000), 0), str(rng.randint(0, 60000)), None, MISSING, "x"])
+                    if not numeric_only else float(rng.randint(0, 60000)),
+    }
+    for key in ("p_bdc_omc", "s_bdc_omc", "p_tax", "s_tax"):
+        order[key] = _value(rng, numeric_only)
+    return {k: v for k, v in order.items() if v is not MISSING}
+
+@pytest.fixture(scope="module")
+def orders():
+    rng = random.Random(20260101)
+    return [_order(rng) for _ in range(5000)]
+
+def _close(a, b, tol=1e-6):
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(a - b) <= tol
+
+# ---------- Equivalence ----------
+def test_view_orders_matches_old_fallbacks(orders):
+    priced = compute_pricing(orders)
+    for i, order in enumerate(orders):
+        old = old_view_orders(order)
+        assert _close(to_py(priced["margin_price"][i]), old["margin"]), order
+        for key in ("returns_sbdc", "returns_stax", "returns_total"):
+            assert _close(to_py(priced[key][i]), old[key]), (key, order)
+
+def test_update_order_matches_old_formulas(orders):
+    valid = [o for o in orders if _update_order_valid(o)]
+    assert len(valid) > 500
+    priced = compute_pricing(valid)
+    for i, order in enumerate(valid):
+        old = old_update_order(order)
+        for key in ("total_debt", "returns_sbdc", "returns_stax", "returns_total"):
+            assert _close(to_py(priced[key][i]), old[key]), (key, order)
+        for key in ("margin_price", "margin_tax", "margin"):
+            assert _close(to_py(priced[key][i]), old.get(key)), (key, order)
+
+def test_margin_returns_match_old_views_when_margin_is_stored():
+    """Approved orders carry the margin update_order stored; returns agree with the old views."""
+    rng = random.Random(7)
+    approved = []
+    for _ in range(5000):
+        order = _order(rng, numeric_only=True)
+        if order.get("order_type") is not None and order["order_type"].strip().lower() == "s_tax":
+            order["order_type"] = "s_bdc"  # client_profile always used the price margin
+        order["margin"] = old_update_order(order)["margin"]
+        approved.append(order)
+
+    priced = compute_pricing(approved)
+    for i, order in enumerate(approved):
+        assert _close(to_py(priced["margin_returns"][i], nan=0.0), old_approved_returns(order)), order
+        old_margin, old_returns = old_client_profile(order)
+        assert _close(to_py(priced["margin_eff"][i], nan=0.0), old_margin), order
+        # old client_profile multiplied the unrounded margin by Q: allow one cent of rounding
+        assert _close(to_py(priced["margin_returns"][i], nan=0.0), old_returns, tol=0.011), order
+
+    new_total = float(np.round(priced["margin_returns"], 2).sum())
+    assert new_total == pytest.approx(old_shareholder_returns(approved), abs=0.01)
+
+# ---------- Intentional differences ----------
+def test_missing_stored_margin_falls_back_to_active_margin():
+    order = {"order_type": "s_bdc", "p_bdc_omc": 10.0, "s_bdc_omc": 12.5, "quantity": 100}
+    assert old_approved_returns(order) == 0.0
+    assert price_one(order)["margin_returns"] == pytest.approx(250.0)
+
+def test_s_tax_orders_use_tax_margin():
+    order = {"order_type": "s_tax", "p_bdc_omc": 10, "s_bdc_omc": 11, "p_tax": 2, "s_tax": 5, "quantity": 10}
+    assert old_client_profile(order) == (1.0, 10.0)
+    priced = price_one(order)
+    assert priced["margin_eff"] == pytest.approx(3.0)
+    assert priced["margin_returns"] == pytest.approx(30.0)
+
+def test_nothing_to_price():
+    priced = price_one({})
+    assert np.isnan(priced["margin"])
+    assert priced["total_debt"] == 0.0
+    assert priced["margin_returns"] == 0.0
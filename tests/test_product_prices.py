@@ -0,0 +1,19 @@
+"""get_product: another worker's price update reaches order snapshots without waiting out the cache."""
+import product_prices
+from product_prices import get_product, ensure_name_keys, name_key
+
+def test_fresh_lookup_skips_stale_cache(db):
+    product_prices.invalidate_cache()
+    db["products"].insert_one({"name": "AGO", "name_key": "ago", "s_price": 12.0, "p_price": 11.0})
+    assert get_product("ago")["s_price"] == 12.0
+
+    # price changed by another worker: this process's cache still holds the old one
+    db["products"].update_one({"name_key": "ago"}, {"$set": {"s_price": 13.5}})
+    assert get_product("AGO")["s_price"] == 12.0
+    assert get_product("AGO", fresh=True)["s_price"] == 13.5
+    assert get_product("AGO")["s_price"] == 13.5  # fresh read refreshed the entry
+
+def test_migrate_sets_missing_name_keys(db):
+    db["products"].insert_many([{"name": "  Ago  Cell Site"}, {"name": "PMS", "name_key": "pms"}])
+    assert ensure_name_keys() == 1
+    assert db["products"].find_one({"name": "  Ago  Cell Site"})["name_key"] == name_key("ago cell site")
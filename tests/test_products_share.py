@@ -0,0 +1,39 @@
+"""/products/clients keyset paging over clients with and without names."""
+import pytest
+from flask import Flask
+
+import products
+
+@pytest.fixture
+def client(db):
+    app = Flask(__name__)
+    app.register_blueprint(products.products_bp)
+    return app.test_client()
+
+def _walk(client, limit):
+    seen, cursor = [], None
+    for _ in range(100):
+        url = f"/products/clients?limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url).get_json()
+        seen.extend(c["_id"] for c in body["clients"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return seen
+    raise AssertionError("pagination did not end")
+
+def test_clients_without_names_are_paged(db, client):
+    docs = [{"name": n, "primary_wa": f"23324{i:07d}"} for i, n in enumerate(["Ama", "Kofi", "Ama", "", "Yaw"])]
+    docs += [{"name": None, "primary_wa": f"23320{i:07d}", "client_id": f"C{i}"} for i in range(4)]
+    docs += [{"primary_wa": "233200000099"}, {"name": 42, "primary_wa": "233200000098"}]
+    docs += [{"name": "No WhatsApp"}, {"name": None}]
+    db["clients"].insert_many(docs)
+    listed = [d for d in docs if "primary_wa" in d]
+
+    named = sorted((d for d in listed if isinstance(d.get("name"), str)), key=lambda d: (d["name"], d["_id"]))
+    unnamed = sorted((d for d in listed if not isinstance(d.get("name"), str)), key=lambda d: d["_id"])
+    expected = [str(d["_id"]) for d in named + unnamed]
+    for limit in (1, 2, 3, 5, 6, 50):
+        assert _walk(client, limit) == expected
+
+def test_invalid_cursor(db, client):
+    assert client.get("/products/clients?cursor=Ama|nope").status_code == 400
@@ -0,0 +1,163 @@
+"""SMS outbox against a local fake Arkesel gateway (http.server)."""
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+import sms_outbox
+from sms_outbox import ArkeselProvider, SmsWorker, _RateLimiter, MAX_ATTEMPTS, RETRY_BASE, REDACTED
+
+class FakeGateway:
+    """Answers like Arkesel; records requests and the peak number in flight."""
+
+    def __init__(self, status=200, body='{"code":"ok","message":"Successfully Sent"}', delay=0.0):
+        self.status, self.body, self.delay = status, body, delay
+        self.requests, self.in_flight, self.peak = [], 0, 0
+        self.lock = threading.Lock()
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with gateway.lock:
+                    gateway.requests.append(parse_qs(urlparse(self.path).query))
+                    gateway.in_flight += 1
+                    gateway.peak = max(gateway.peak, gateway.in_flight)
+                time.sleep(gateway.delay)
+                with gateway.lock:
+                    gateway.in_flight -= 1
+                body = gateway.body.encode()
+                self.send_response(gateway.status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/sms/api"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class _NoWorker:
+    def wake(self):
+        pass
+
+@pytest.fixture
+def outbox(db, monkeypatch):
+    monkeypatch.setattr(sms_outbox, "worker", _NoWorker())  # drive claims by hand
+    return db["sms_outbox"]
+
+@pytest.fixture
+def gateway_factory(monkeypatch):
+    gateways = []
+
+    def make(**kwargs):
+        gw = FakeGateway(**kwargs)
+        gateways.append(gw)
+        monkeypatch.setattr(sms_outbox, "_provider", ArkeselProvider(api_url=gw.url, api_key="test-key"))
+        return gw
+
+    yield make
+    for gw in gateways:
+        gw.close()
+
+def _deliver_next():
+    msg = sms_outbox._claim()
+    assert msg is not None
+    sms_outbox._deliver(msg, _RateLimiter(1000))
+    return msg
+
+def test_successful_send(outbox, gateway_factory):
+    gw = gateway_factory()
+    oid = sms_outbox.enqueue_sms("0241234567", "Hello", kind="test")
+    _deliver_next()
+
+    doc = outbox.find_one({"_id": oid})
+    assert doc["status"] == "sent" and doc["attempts"] == 1 and "lease" not in doc
+    (req,) = gw.requests
+    assert req["to"] == ["233241234567"]
+    assert req["sms"] == ["Hello"]
+    assert req["api_key"] == ["test-key"]
+    assert req["action"] == ["send-sms"]
+
+def test_retries_with_backoff_then_fails(outbox, gateway_factory):
+    gw = gateway_factory(status=500, body='{"code":"error"}')
+    oid = sms_outbox.enqueue_sms("0241234567", "Hello")
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        before = datetime.utcnow()
+        _deliver_next()
+        doc = outbox.find_one({"_id": oid})
+        assert doc["attempts"] == attempt
+        if attempt < MAX_ATTEMPTS:
+            assert doc["status"] == "pending"
+            delay = (doc["next_attempt_at"] - before).total_seconds()
+            assert RETRY_BASE * 2 ** (attempt - 1) <= delay < RETRY_BASE * 2 ** (attempt - 1) + 5
+            assert sms_outbox._claim() is None  # not due yet
+            outbox.update_one({"_id": oid}, {"$set": {"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+    assert doc["status"] == "failed" and doc["last_error"] == '{"code":"error"}'
+    assert len(gw.requests) == MAX_ATTEMPTS
+    assert sms_outbox._claim() is None
+
+def test_concurrency_is_bounded(outbox, gateway_factory, monkeypatch):
+    gw = gateway_factory(delay=0.2)
+    sms_outbox.enqueue_many([(f"02412345{i:02d}", f"Price update {i}", None) for i in range(12)], kind="broadcast")
+
+    worker = SmsWorker(concurrency=3, rate=1000)
+    worker.start()
+    try:
+        deadline = time.monotonic() + 10
+        while outbox.count_documents({"status": "sent"}) < 12 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+
+    assert outbox.count_documents({"status": "sent"}) == 12
+    assert len(gw.requests) == 12
+    assert 2 <= gw.peak <= 3
+
+def test_rate_limiter_caps_calls_per_second():
+    limiter = _RateLimiter(20)
+    start = time.monotonic()
+    for _ in range(30):  # 20 from the full bucket, 10 more at 20/s
+        limiter.acquire()
+    elapsed = time.monotonic() - start
+    assert 0.4 <= elapsed < 2
+
+def test_lost_lease_does_not_overwrite(outbox, gateway_factory):
+    gateway_factory()
+    oid = sms_outbox.enqueue_sms("0241234567", "Hello")
+    stale = sms_outbox._claim()
+    # lease expires; another worker re-claims the message
+    outbox.update_one({"_id": oid}, {"$set": {"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)}})
+    current = sms_outbox._claim()
+    sms_outbox._deliver(stale, _RateLimiter(1000))
+
+    doc = outbox.find_one({"_id": oid})
+    assert doc["status"] == "sending" and doc["lease"] == current["lease"]
+    sms_outbox._deliver(current, _RateLimiter(1000))
+    assert outbox.find_one({"_id": oid})["status"] == "sent"
+
+def test_sensitive_body_is_redacted_once_final(outbox, gateway_factory):
+    gw = gateway_factory()
+    oid = sms_outbox.enqueue_sms("0241234567", "Password: 0241234567", kind="registration", redact=True)
+    assert outbox.find_one({"_id": oid})["message"].startswith("Password")
+    _deliver_next()
+    assert gw.requests[0]["sms"] == ["Password: 0241234567"]
+    assert outbox.find_one({"_id": oid})["message"] == REDACTED
+
+def test_no_api_key_disables_provider(outbox, monkeypatch):
+    provider = ArkeselProvider(api_url="http://127.0.0.1:9/", api_key=None)
+    assert not provider.enabled
+    monkeypatch.setattr(sms_outbox, "_provider", provider)
+    worker = SmsWorker()
+    worker.start()
+    assert worker._thread is None
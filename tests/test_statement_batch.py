@@ -0,0 +1,16 @@
+"""Statement PDFs for clients whose names or order text look like markup."""
+import statement_batch
+
+TOTALS = {"pms_vol": 0, "pms_amt": 0, "ago_vol": 1000, "ago_amt": "12,000.00",
+          "total_amt": "12,000.00", "paid": "0.00", "closing": "12,000.00"}
+
+def test_markup_characters_in_names_and_rows(tmp_path):
+    path = str(tmp_path / "statement.pdf")
+    rows = [
+        {"date": "2026-03-01", "desc": "Order AB12 <b>urgent for A & B", "ago_vol": 1000, "ago_amt": "12,000.00",
+         "total_amt": "12,000.00", "paid": "0.00", "balance": "12,000.00"},
+        {"date": "2026-03-02", "desc": None},
+    ]
+    statement_batch._write_pdf(path, "Kofi & Sons <b>Ltd", "March 2026 </para>", rows, TOTALS)
+    with open(path, "rb") as f:
+        assert f.read(5) == b"%PDF-"
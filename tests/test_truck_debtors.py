@@ -0,0 +1,59 @@
+"""Truck debtors page from the per-client ledger totals."""
+from bson import ObjectId
+
+import truck_ledger
+from truck_debtors import get_filtered_debtors
+
+def _seed(db):
+    clients = [ObjectId() for _ in range(4)]
+    for i, cid in enumerate(clients):
+        for n in range(i + 1):
+            order = {"client_id": cid, "client_name": f"Client {i}", "client_phone": f"02400000{i}",
+                     "total_debt": 1000.0}
+            order["_id"] = db["truck_orders"].insert_one(order).inserted_id
+            truck_ledger.record_order(order)
+            truck_ledger.record_expense(order, 100)
+    for cid, amount in ((clients[0], 1000.0), (clients[2], 500.0)):
+        truck_ledger.record_confirmed_payment({"client_id": cid, "amount": amount})
+    truck_ledger.record_confirmed_payment({"client_id": ObjectId(), "amount": 50.0})  # no orders: not listed
+    truck_ledger.ledger_totals_col.update_one({"_id": truck_ledger.FLEET_ID}, {"$set": {"synced_at": 1}})
+    return clients
+
+def test_rows_sorted_filtered_and_paged(db):
+    _seed(db)
+    rows, total = get_filtered_debtors(page=1, per_page=2)
+    assert total == 4
+    assert [(r["client_name"], r["amount_left"]) for r in rows] == [("Client 3", 4000.0), ("Client 2", 2500.0)]
+    assert rows[0]["settled_amount"] == 3600.0 and rows[0]["order_count"] == 4
+
+    rows, total = get_filtered_debtors(unpaid_only=True, page=2, per_page=2)
+    assert total == 3
+    assert [r["client_name"] for r in rows] == ["Client 1"]
+
+    rows, total = get_filtered_debtors(search_term="client 0")
+    assert total == 1 and rows[0]["amount_left"] == 0.0 and rows[0]["total_paid"] == 1000.0
+    rows, total = get_filtered_debtors(search_term="024000002")
+    assert [r["client_name"] for r in rows] == ["Client 2"]
+
+def test_rebuild_matches_incremental_totals(db):
+    cid = ObjectId()
+    orders = [{"client_id": cid, "client_name": "Esi", "total_debt": debt} for debt in ("1500.50", 700, None, "n/a")]
+    for order in orders:
+        order["_id"] = db["truck_orders"].insert_one(order).inserted_id
+        truck_ledger.record_order(order)
+    for order, amount in ((orders[0], "120"), (orders[1], 30.5), (orders[1], "fuel")):
+        db["truck_expenses"].insert_one({"order_id": str(order["_id"]), "amount": amount})
+        truck_ledger.record_expense(order, amount)
+    for amount in ("400", 100.25, "x"):
+        payment = {"client_id": cid, "amount": amount, "status": "confirmed"}
+        db["truck_payments"].insert_one(payment)
+        truck_ledger.record_confirmed_payment(payment)
+
+    fields = lambda doc: {k: doc[k] for k in truck_ledger.TOTAL_FIELDS}
+    incremental = fields(truck_ledger.client_totals_col.find_one({"_id": str(cid)}))
+    fleet = fields(truck_ledger.ledger_totals_col.find_one({"_id": truck_ledger.FLEET_ID}))
+    assert incremental == {"total_debt": 2200.5, "total_expense": 150.5, "total_paid": 500.25, "order_count": 4}
+
+    truck_ledger.rebuild_ledger_totals()
+    assert fields(truck_ledger.client_totals_col.find_one({"_id": str(cid)})) == incremental
+    assert fields(truck_ledger.ledger_totals_col.find_one({"_id": truck_ledger.FLEET_ID})) == fleet
@@ -2,6 +2,10 @@ from flask import Blueprint, render_template, request, jsonify
 from datetime import datetime
 from bson import ObjectId
 from db import db
+from client_search import search_fields, invalidate_cache
+from client_contacts import contact_fields
+from truck_ledger import record_order, record_expense
+from truck_analytics import get_report
 
 truck_bp = Blueprint("truck_bp", __name__)
 
@@ -17,6 +21,14 @@ def view_trucks():
     orders = list(truck_orders_col.find().sort("created_at", -1))
     return render_template("partials/truck_page.html", trucks=trucks, clients=clients, orders=orders)
 
+# 📊 Fleet utilization / trip-duration analytics (cached per day; ?refresh=1 recomputes)
+@truck_bp.route("/trucks/analytics", methods=["GET"])
+def truck_analytics():
+    report = get_report(refresh=request.args.get("refresh") == "1")
+    if request.args.get("format") == "json":
+        return jsonify(report)
+    return render_template("partials/truck_analytics.html", report=report)
+
 @truck_bp.route("/trucks/add", methods=["POST"])
 def add_truck():
     data = request.get_json()
@@ -73,7 +85,10 @@ def initiate_truck_order():
             "status": "external",
             "created_at": datetime.utcnow()
         }
+        new_client.update(search_fields(new_client["name"]))
+        new_client.update(contact_fields(new_client))
         inserted = clients_col.insert_one(new_client)
+        invalidate_cache()
         new_client["_id"] = inserted.inserted_id
         client = new_client
     else:
@@ -94,6 +109,7 @@ def initiate_truck_order():
     }
 
     truck_orders_col.insert_one(truck_order)
+    record_order(truck_order)
     return jsonify({"success": True})
 
 @truck_bp.route("/truck_orders/start/<order_id>", methods=["POST"])
@@ -157,6 +173,7 @@ def add_truck_order_expense(order_id):
 
         # ✅ Save to truck_expenses collection
         truck_expenses_col.insert_one(expense)
+        record_expense(order, amount)
 
         # ✅ (Optional) Save under the order itself
         truck_orders_col.update_one(
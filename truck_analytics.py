@@ -0,0 +1,154 @@
+import numpy as np
+from datetime import datetime, date
+from threading import Lock
+
+from db import db
+
+# 📦 Collections
+truck_orders_col = db["truck_orders"]
+truck_expenses_col = db["truck_expenses"]
+analytics_col = db["truck_analytics"]  # one cached report per day (_id = "YYYY-MM-DD")
+
+truck_orders_col.create_index([("truck_id", 1), ("started_at", 1)])
+
+_memo = {}
+_memo_lock = Lock()
+
+# ---------- Helpers ----------
+def _hours(seconds):
+    return seconds / 3600.0
+
+def _r(v, ndigits=2):
+    v = float(v)
+    return None if np.isnan(v) else round(v, ndigits)
+
+def _trips():
+    """
+    One aggregation: every truck order with its expense total (indexed $lookup on
+    truck_expenses.order_id), projected to the fields the report needs.
+    """
+    return list(truck_orders_col.aggregate([
+        {"$addFields": {"order_key": {"$toString": "$_id"}}},
+        {"$lookup": {
+            "from": truck_expenses_col.name,
+            "localField": "order_key",
+            "foreignField": "order_id",
+            "pipeline": [{"$group": {"_id": None, "total": {"$sum": "$amount"}}}],
+            "as": "exp"
+        }},
+        {"$project": {
+            "_id": 0,
+            "truck_id": 1,
+            "truck_number": 1,
+            "destination": 1,
+            "started_at": 1,
+            "delivered_at": 1,
+            "revenue": {"$ifNull": ["$total_debt", 0]},
+            "expense": {"$ifNull": [{"$first": "$exp.total"}, 0]}
+        }},
+        {"$sort": {"truck_id": 1, "started_at": 1}}
+    ], allowDiskUse=True))
+
+def _ts(values):
+    """datetimes -> float seconds (NaN when missing)."""
+    return np.array([v.timestamp() if isinstance(v, datetime) else np.nan for v in values], dtype=float)
+
+def _profit_rows(trips, key, label):
+    groups = {}
+    for t in trips:
+        k = t.get(key) or "—"
+        g = groups.setdefault(k, {label: k, "trips": 0, "revenue": 0.0, "expense": 0.0})
+        g["trips"] += 1
+        g["revenue"] += float(t.get("revenue") or 0)
+        g["expense"] += float(t.get("expense") or 0)
+    rows = []
+    for g in groups.values():
+        g["revenue"] = round(g["revenue"], 2)
+        g["expense"] = round(g["expense"], 2)
+        g["net"] = round(g["revenue"] - g["expense"], 2)
+        rows.append(g)
+    rows.sort(key=lambda g: g["net"], reverse=True)
+    return rows
+
+# ---------- Report ----------
+def compute_report(now=None):
+    """
+    Per truck: trip counts, average / p90 start->delivery hours, idle days between
+    trips (previous delivery -> next start) and revenue minus expenses.
+    Per destination: revenue minus expenses. Durations use one NumPy pass per truck.
+    """
+    now = now or datetime.utcnow()
+    trips = _trips()
+
+    trucks = []
+    by_truck = {}
+    for t in trips:
+        by_truck.setdefault(t.get("truck_id"), []).append(t)
+
+    for truck_id, rows in by_truck.items():
+        started = _ts(r.get("started_at") for r in rows)
+        delivered = _ts(r.get("delivered_at") for r in rows)
+
+        done = ~np.isnan(started) & ~np.isnan(delivered)
+        durations = _hours(delivered[done] - started[done])
+
+        # Idle gap: previous trip's delivery -> this trip's start (rows are sorted by start)
+        gaps = (started[1:] - delivered[:-1]) / 86400.0
+        gaps = gaps[~np.isnan(gaps) & (gaps >= 0)]
+
+        last_delivery = np.nanmax(delivered) if (~np.isnan(delivered)).any() else np.nan
+        revenue = float(sum(float(r.get("revenue") or 0) for r in rows))
+        expense = float(sum(float(r.get("expense") or 0) for r in rows))
+
+        trucks.append({
+            "truck_id": truck_id,
+            "truck_number": rows[-1].get("truck_number") or "—",
+            "trips": len(rows),
+            "completed": int(done.sum()),
+            "avg_hours": _r(durations.mean()) if durations.size else None,
+            "p90_hours": _r(np.percentile(durations, 90)) if durations.size else None,
+            "avg_idle_days": _r(gaps.mean()) if gaps.size else None,
+            "total_idle_days": _r(gaps.sum()) if gaps.size else 0.0,
+            "days_since_delivery": _r((now.timestamp() - last_delivery) / 86400.0),
+            "revenue": round(revenue, 2),
+            "expense": round(expense, 2),
+            "net": round(revenue - expense, 2)
+        })
+    trucks.sort(key=lambda r: r["trips"], reverse=True)
+
+    return {
+        "generated_at": now.strftime("%Y-%m-%d %H:%M"),
+        "trucks": trucks,
+        "destinations": _profit_rows(trips, "destination", "destination"),
+        "totals": {
+            "trips": len(trips),
+            "revenue": round(sum(r["revenue"] for r in trucks), 2),
+            "expense": round(sum(r["expense"] for r in trucks), 2),
+            "net": round(sum(r["net"] for r in trucks), 2)
+        }
+    }
+
+def get_report(refresh=False):
+    """
+    Today's report. Cached in-process and in truck_analytics so each day's report is
+    computed once across workers; refresh=True recomputes it.
+    """
+    key = date.today().isoformat()
+    if not refresh:
+        with _memo_lock:
+            if key in _memo:
+                return _memo[key]
+        doc = analytics_col.find_one({"_id": key})
+        if doc:
+            report = doc["report"]
+            with _memo_lock:
+                _memo.clear()
+                _memo[key] = report
+            return report
+
+    report = compute_report()
+    analytics_col.replace_one({"_id": key}, {"report": report, "created_at": datetime.utcnow()}, upsert=True)
+    with _memo_lock:
+        _memo.clear()
+        _memo[key] = report
+    return report
@@ -1,8 +1,9 @@
 from flask import Blueprint, render_template, request
 from db import db
 from bson import ObjectId
-from collections import defaultdict
-import math
+import math, re
+
+from truck_ledger import client_totals_col, is_synced
 
 truck_debtors_bp = Blueprint("truck_debtors", __name__)
 
@@ -11,71 +12,147 @@ truck_orders_col = db["truck_orders"]
 truck_expenses_col = db["truck_expenses"]
 truck_payments_col = db["truck_payments"]
 
-def get_filtered_debtors(search_term="", unpaid_only=False):
-    orders = list(truck_orders_col.find())
-    client_data = defaultdict(lambda: {
-        "total_debt": 0,
-        "orders": [],
-        "client_name": "",
-        "client_phone": ""
-    })
-
-    for order in orders:
-        client_key = str(order.get("client_id"))
-        client_data[client_key]["client_name"] = order.get("client_name", "")
-        client_data[client_key]["client_phone"] = order.get("client_phone", "")
-        client_data[client_key]["orders"].append(order)
-        client_data[client_key]["total_debt"] += float(order.get("total_debt", 0))
-
-    payments = truck_payments_col.find({"status": "confirmed"})
-    payments_map = defaultdict(float)
-    for p in payments:
-        payments_map[str(p.get("client_id"))] += float(p.get("amount", 0))
-
-    expenses = truck_expenses_col.find()
-    expenses_map = defaultdict(float)
-    for e in expenses:
-        expenses_map[e.get("order_id")] += float(e.get("amount", 0))
-
-    result = []
-    for client_key, data in client_data.items():
-        total_expense = sum(expenses_map.get(str(o["_id"]), 0) for o in data["orders"])
-        total_debt = data["total_debt"]
-        total_paid = payments_map.get(client_key, 0)
-        amount_left = total_debt - total_paid
-        settled_amount = total_debt - total_expense
-
-        if (
-            (not search_term or search_term in data["client_name"].lower() or search_term in data["client_phone"])
-            and (not unpaid_only or amount_left > 0)
-        ):
-            result.append({
-                "client_name": data["client_name"],
-                "client_phone": data["client_phone"],
-                "total_debt": total_debt,
-                "total_paid": total_paid,
-                "amount_left": amount_left,
-                "total_expense": total_expense,
-                "settled_amount": settled_amount,
-                "order_count": len(data["orders"])
-            })
-
-    result.sort(key=lambda x: x["amount_left"], reverse=True)
-    return result
+PER_PAGE = 10
 
-@truck_debtors_bp.route("/truck_debtors")
-def view_truck_debtors():
-    page = int(request.args.get("page", 1))
-    per_page = 10
+# Indexes behind the debtors pipeline's lookups
+truck_orders_col.create_index("client_id")
+truck_expenses_col.create_index("order_id")
+truck_payments_col.create_index([("client_id", 1), ("status", 1)])
+
+def _num(expr):
+    return {"$convert": {"input": expr, "to": "double", "onError": 0.0, "onNull": 0.0}}
+
+def _search_match(search_term):
+    rx = re.escape(search_term)
+    return {"$or": [
+        {"client_name": {"$regex": rx, "$options": "i"}},
+        {"client_phone": {"$regex": rx}}
+    ]}
+
+def _page_facet(page, per_page):
+    return {"$facet": {
+        "rows": [
+            {"$sort": {"amount_left": -1, "client_name": 1}},
+            {"$skip": (page - 1) * per_page},
+            {"$limit": per_page}
+        ],
+        "total": [{"$count": "n"}]
+    }}
+
+def _totals_pipeline(search_term, unpaid_only, page, per_page):
+    """Over truck_client_totals (one row per client, kept by truck_ledger): search before anything else."""
+    match = {"order_count": {"$gt": 0}}
+    if search_term:
+        match.update(_search_match(search_term))
+    pipeline = [
+        {"$match": match},
+        {"$project": {
+            "_id": 0,
+            "client_name": {"$ifNull": ["$client_name", ""]},
+            "client_phone": {"$ifNull": ["$client_phone", ""]},
+            "total_debt": {"$ifNull": ["$total_debt", 0]},
+            "total_expense": {"$ifNull": ["$total_expense", 0]},
+            "order_count": 1,
+            "total_paid": {"$ifNull": ["$total_paid", 0]},
+            "amount_left": {"$subtract": [{"$ifNull": ["$total_debt", 0]}, {"$ifNull": ["$total_paid", 0]}]},
+            "settled_amount": {"$subtract": [{"$ifNull": ["$total_debt", 0]}, {"$ifNull": ["$total_expense", 0]}]}
+        }}
+    ]
+    if unpaid_only:
+        pipeline.append({"$match": {"amount_left": {"$gt": 0}}})
+    pipeline.append(_page_facet(page, per_page))
+    return pipeline
+
+def _source_pipeline(search_term, unpaid_only, page, per_page):
+    """
+    Over truck_orders (until truck_ledger.rebuild_ledger_totals has run once): per-order
+    expenses and per-client confirmed payments are joined via indexed $lookups.
+    """
+    post_match = _search_match(search_term) if search_term else {}
+    if unpaid_only:
+        post_match["amount_left"] = {"$gt": 0}
+
+    pipeline = [
+        {"$sort": {"_id": 1}},  # $last below = name/phone on the client's latest order
+        {"$addFields": {"order_key": {"$toString": "$_id"}}},
+        {"$lookup": {
+            "from": truck_expenses_col.name,
+            "localField": "order_key",
+            "foreignField": "order_id",
+            "pipeline": [{"$group": {"_id": None, "total": {"$sum": _num("$amount")}}}],
+            "as": "exp"
+        }},
+        {"$group": {
+            "_id": {"$toString": "$client_id"},
+            "client_name": {"$last": {"$ifNull": ["$client_name", ""]}},
+            "client_phone": {"$last": {"$ifNull": ["$client_phone", ""]}},
+            "total_debt": {"$sum": _num("$total_debt")},
+            "total_expense": {"$sum": {"$ifNull": [{"$first": "$exp.total"}, 0]}},
+            "order_count": {"$sum": 1}
+        }},
+        # truck_payments.client_id may be stored as ObjectId or string
+        {"$addFields": {"client_keys": [
+            "$_id", {"$convert": {"input": "$_id", "to": "objectId", "onError": None, "onNull": None}}
+        ]}},
+        {"$lookup": {
+            "from": truck_payments_col.name,
+            "localField": "client_keys",
+            "foreignField": "client_id",
+            "pipeline": [
+                {"$match": {"status": "confirmed"}},
+                {"$group": {"_id": None, "total": {"$sum": _num("$amount")}}}
+            ],
+            "as": "paid"
+        }},
+        {"$project": {
+            "_id": 0,
+            "client_name": 1,
+            "client_phone": 1,
+            "total_debt": 1,
+            "total_expense": 1,
+            "order_count": 1,
+            "total_paid": {"$ifNull": [{"$first": "$paid.total"}, 0]},
+            "amount_left": {"$subtract": ["$total_debt", {"$ifNull": [{"$first": "$paid.total"}, 0]}]},
+            "settled_amount": {"$subtract": ["$total_debt", "$total_expense"]}
+        }}
+    ]
+    if post_match:
+        pipeline.append({"$match": post_match})
+    pipeline.append(_page_facet(page, per_page))
+    return pipeline
+
+def get_filtered_debtors(search_term="", unpaid_only=False, page=1, per_page=PER_PAGE):
+    """
+    One page of truck debtors sorted by amount left, with search, unpaid filter and
+    skip/limit run in the database. Reads the per-client ledger totals once they
+    are synced. Returns (rows, total_count).
+    """
+    if is_synced():
+        res = next(client_totals_col.aggregate(_totals_pipeline(search_term, unpaid_only, page, per_page)),
+                   {"rows": [], "total": []})
+    else:
+        res = next(truck_orders_col.aggregate(_source_pipeline(search_term, unpaid_only, page, per_page),
+                                              allowDiskUse=True), {"rows": [], "total": []})
+    total = res["total"][0]["n"] if res["total"] else 0
+    return res["rows"], total
+
+def _page_args():
+    try:
+        page = max(int(request.args.get("page", 1)), 1)
+    except ValueError:
+        page = 1
     search_term = request.args.get("search", "").lower().strip()
     unpaid_only = request.args.get("unpaid_only", "false").lower() == "true"
+    return page, search_term, unpaid_only
 
-    debtors = get_filtered_debtors(search_term, unpaid_only)
-    total_pages = math.ceil(len(debtors) / per_page)
-    paginated = debtors[(page - 1) * per_page: page * per_page]
+@truck_debtors_bp.route("/truck_debtors")
+def view_truck_debtors():
+    page, search_term, unpaid_only = _page_args()
+    debtors, total = get_filtered_debtors(search_term, unpaid_only, page)
+    total_pages = max(math.ceil(total / PER_PAGE), 1)
 
     return render_template("partials/truck_debtors.html",
-        debtors=paginated,
+        debtors=debtors,
         current_page=page,
         total_pages=total_pages,
         search=search_term,
@@ -85,14 +162,13 @@ def view_truck_debtors():
 
 @truck_debtors_bp.route("/truck_debtors/ajax")
 def ajax_truck_debtors():
-    search_term = request.args.get("search", "").lower().strip()
-    unpaid_only = request.args.get("unpaid_only", "false").lower() == "true"
-    debtors = get_filtered_debtors(search_term, unpaid_only)
+    page, search_term, unpaid_only = _page_args()
+    debtors, total = get_filtered_debtors(search_term, unpaid_only, page)
 
     return render_template("partials/truck_debtors.html",
         debtors=debtors,
-        current_page=1,
-        total_pages=1,
+        current_page=page,
+        total_pages=max(math.ceil(total / PER_PAGE), 1),
         search=search_term,
         unpaid_only=unpaid_only,
         partial=True  # flag for rendering just the table
@@ -0,0 +1,152 @@
+from pymongo import ReplaceOne, UpdateOne
+from collections import defaultdict
+from datetime import datetime
+
+from db import db
+
+# 📦 Collections
+truck_orders_col = db["truck_orders"]
+truck_expenses_col = db["truck_expenses"]
+truck_payments_col = db["truck_payments"]
+ledger_totals_col = db["truck_ledger_totals"]  # one fleet-wide document
+client_totals_col = db["truck_client_totals"]  # one document per client (_id = str(client_id))
+
+FLEET_ID = "fleet"
+TOTAL_FIELDS = ("total_debt", "total_expense", "total_paid", "order_count")
+
+# ---------- Helpers ----------
+def _to_f(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _num(field):
+    """Aggregation twin of _to_f: non-numeric values count as 0 instead of being skipped or failing."""
+    return {"$convert": {"input": field, "to": "double", "onError": 0.0, "onNull": 0.0}}
+
+def _zero():
+    return {k: 0 for k in TOTAL_FIELDS}
+
+def _bump(client_key, inc, client_set=None):
+    """$inc the fleet document and one client's totals (both upserted)."""
+    ledger_totals_col.update_one({"_id": FLEET_ID}, {"$inc": inc}, upsert=True)
+    update = {"$inc": inc}
+    if client_set:
+        update["$set"] = client_set
+    client_totals_col.update_one({"_id": client_key}, update, upsert=True)
+
+# ---------- Incremental updates ----------
+def record_order(order):
+    """A new truck order: its debt counts against the client straight away."""
+    _bump(
+        str(order.get("client_id")),
+        {"total_debt": _to_f(order.get("total_debt")), "order_count": 1},
+        {"client_name": order.get("client_name", ""), "client_phone": order.get("client_phone", "")}
+    )
+
+def record_expense(order, amount):
+    _bump(str(order.get("client_id")), {"total_expense": _to_f(amount)})
+
+def record_confirmed_payment(payment):
+    """Call once per payment, when it moves to confirmed."""
+    _bump(str(payment.get("client_id")), {"total_paid": _to_f(payment.get("amount"))})
+
+def record_confirmed_payments(payments):
+    """Batched record_confirmed_payment: one $inc per client plus one on the fleet document."""
+    per_client = defaultdict(float)
+    for p in payments:
+        per_client[str(p.get("client_id"))] += _to_f(p.get("amount"))
+    if not per_client:
+        return
+    client_totals_col.bulk_write([
+        UpdateOne({"_id": key}, {"$inc": {"total_paid": amt}}, upsert=True)
+        for key, amt in per_client.items()
+    ], ordered=False)
+    ledger_totals_col.update_one({"_id": FLEET_ID}, {"$inc": {"total_paid": sum(per_client.values())}}, upsert=True)
+
+# ---------- Reads ----------
+def _totals_from_source():
+    """Full recompute: ({client_key: totals}, fleet_totals)."""
+    clients = defaultdict(_zero)
+
+    for r in truck_orders_col.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {"$toString": "$client_id"},
+            "total_debt": {"$sum": _num("$total_debt")},
+            "order_count": {"$sum": 1},
+            "client_name": {"$last": "$client_name"},
+            "client_phone": {"$last": "$client_phone"}
+        }}
+    ]):
+        clients[r["_id"]].update(
+            total_debt=_to_f(r["total_debt"]), order_count=r["order_count"],
+            client_name=r.get("client_name") or "", client_phone=r.get("client_phone") or ""
+        )
+
+    order_client = {str(o["_id"]): str(o.get("client_id")) for o in truck_orders_col.find({}, {"client_id": 1})}
+    fleet_expense = 0.0
+    for r in truck_expenses_col.aggregate([{"$group": {"_id": "$order_id", "total": {"$sum": _num("$amount")}}}]):
+        amt = _to_f(r["total"])
+        fleet_expense += amt
+        if r["_id"] in order_client:
+            clients[order_client[r["_id"]]]["total_expense"] += amt
+
+    for r in truck_payments_col.aggregate([
+        {"$match": {"status": "confirmed"}},
+        {"$group": {"_id": {"$toString": "$client_id"}, "total": {"$sum": _num("$amount")}}}
+    ]):
+        clients[r["_id"]]["total_paid"] += _to_f(r["total"])
+
+    fleet = {
+        "total_debt": sum(c["total_debt"] for c in clients.values()),
+        "total_expense": fleet_expense,
+        "total_paid": sum(c["total_paid"] for c in clients.values()),
+        "order_count": sum(c["order_count"] for c in clients.values())
+    }
+    return dict(clients), fleet
+
+def _synced():
+    doc = ledger_totals_col.find_one({"_id": FLEET_ID})
+    return doc if doc and doc.get("synced_at") else None
+
+def is_synced():
+    """True once rebuild_ledger_totals has run (the per-client totals can be read directly)."""
+    return _synced() is not None
+
+def ledger_totals(client_keys):
+    """
+    (fleet_totals, {client_key: totals}) for the given clients: one read of the fleet
+    document and one $in query. Falls back to a full recompute until
+    rebuild_ledger_totals has run once.
+    """
+    keys = [str(k) for k in client_keys]
+    doc = _synced()
+    if not doc:
+        clients, fleet = _totals_from_source()
+        return fleet, {k: {f: clients.get(k, {}).get(f, 0) for f in TOTAL_FIELDS} for k in keys}
+
+    fleet = {k: _to_f(doc.get(k)) for k in TOTAL_FIELDS}
+    out = {k: _zero() for k in keys}
+    for d in client_totals_col.find({"_id": {"$in": keys}}):
+        out[d["_id"]] = {k: _to_f(d.get(k)) for k in TOTAL_FIELDS}
+    return fleet, out
+
+# ---------- Rebuild ----------
+def rebuild_ledger_totals():
+    """Recompute every total from source and mark the fleet document as synced. Returns client count."""
+    clients, fleet = _totals_from_source()
+    now = datetime.utcnow()
+    if clients:
+        client_totals_col.bulk_write(
+            [ReplaceOne({"_id": key}, dict(totals, updated_at=now), upsert=True) for key, totals in clients.items()],
+            ordered=False
+        )
+    client_totals_col.delete_many({"_id": {"$nin": list(clients)}})
+    ledger_totals_col.replace_one({"_id": FLEET_ID}, dict(fleet, synced_at=now), upsert=True)
+    return len(clients)
+
+
+if __name__ == "__main__":
+    print(f"✅ Rebuilt truck ledger totals for {rebuild_ledger_totals()} clients.")